@@ -6,4 +6,10 @@ class CoreConfig(AppConfig):
     name = "core"
     verbose_name = "Сервисные функции"
 
+    def ready(self) -> None:
+        from django.db.backends.signals import connection_created
 
+        from . import db, signals
+
+        signals.connect()
+        connection_created.connect(db.configure_sqlite, dispatch_uid="core_configure_sqlite")
@@ -0,0 +1,289 @@
+"""Онлайн-бэкап и восстановление SQLite через backup API.
+
+Копия снимается ``sqlite3.Connection.backup`` порциями по ``pages`` страниц с паузой между
+ними: блокировка источника держится только на время одной порции, писатели не ждут всю копию.
+Если источник меняется другим соединением, SQLite начинает копирование заново; после
+``max_restarts`` перезапусков оставшееся копируется одним шагом, чтобы бэкап гарантированно
+завершился под постоянной записью.
+
+Готовая копия проверяется ``PRAGMA integrity_check`` и потоком сжимается в zstd (если
+установлен ``zstandard``) или gzip. Файл пишется во временный ``.part`` и переименовывается —
+в папке бэкапов не бывает недописанных архивов.
+
+PostgreSQL копируется ``pg_dump --format=custom`` (сжатый формат, восстанавливается
+``pg_restore``); утилиты должны быть в PATH.
+"""
+
+from __future__ import annotations
+
+import gzip
+import os
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:  # необязательная зависимость
+    zstandard = None
+
+# Порция по умолчанию: 1024 страницы по 4 КБ — 4 МБ за шаг.
+DEFAULT_PAGES = 1024
+DEFAULT_SLEEP = 0.005
+DEFAULT_MAX_RESTARTS = 3
+
+COMPRESSIONS = ("zstd", "gzip", "none")
+SUFFIXES = {"zstd": ".zst", "gzip": ".gz", "none": ""}
+_COPY_BUFFER = 1024 * 1024
+
+
+class BackupError(Exception):
+    pass
+
+
+class _Restarted(Exception):
+    pass
+
+
+@dataclass
+class BackupResult:
+    path: Path
+    pages: int
+    restarts: int
+    copy_seconds: float
+    total_seconds: float
+    size: int
+
+
+def default_compression() -> str:
+    return "zstd" if zstandard is not None else "gzip"
+
+
+def _check_compression(compression: str) -> None:
+    if compression not in COMPRESSIONS:
+        raise BackupError(f"Неизвестное сжатие: {compression}")
+    if compression == "zstd" and zstandard is None:
+        raise BackupError("Для zstd установите пакет zstandard (или выберите --compress gzip).")
+
+
+def compression_of(path: Path) -> str:
+    for compression, suffix in SUFFIXES.items():
+        if suffix and path.name.endswith(suffix):
+            return compression
+    return "none"
+
+
+def integrity_check(path: Path) -> None:
+    con = sqlite3.connect(path)
+    try:
+        problems = [row[0] for row in con.execute("PRAGMA integrity_check")]
+    except sqlite3.DatabaseError as exc:
+        raise BackupError(f"{path}: {exc}")
+    finally:
+        con.close()
+    if problems != ["ok"]:
+        raise BackupError(f"{path}: integrity_check: " + "; ".join(problems[:5]))
+
+
+def copy_database(
+    src: Path | str,
+    dst: Path | str,
+    *,
+    pages: int = DEFAULT_PAGES,
+    sleep: float = DEFAULT_SLEEP,
+    max_restarts: int = DEFAULT_MAX_RESTARTS,
+) -> tuple[int, int]:
+    """Снять согласованную копию ``src`` в файл ``dst``. Возвращает (страниц, перезапусков)."""
+    restarts = 0
+    total = 0
+    last_remaining: int | None = None
+
+    def progress(status: int, remaining: int, count: int) -> None:
+        nonlocal restarts, last_remaining, total
+        total = count
+        # Осталось больше, чем после прошлого шага, — источник изменился, копирование началось заново.
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > max_restarts:
+                raise _Restarted
+        last_remaining = remaining
+
+    source = sqlite3.connect(src)
+    try:
+        target = sqlite3.connect(dst)
+        try:
+            try:
+                source.backup(target, pages=pages, progress=progress, sleep=sleep)
+            except _Restarted:
+                # Порциями не успеть — копируем одним шагом (одна короткая блокировка чтения).
+                source.backup(target, pages=-1)
+            if not total:
+                total = target.execute("PRAGMA page_count").fetchone()[0]
+        finally:
+            target.close()
+    finally:
+        source.close()
+    return total, restarts
+
+
+def _open_compressed_writer(path: Path, compression: str):
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=3, threads=-1).stream_writer(open(path, "wb"), closefd=True)
+    if compression == "gzip":
+        return gzip.open(path, "wb", compresslevel=6)
+    return open(path, "wb")
+
+
+def _open_compressed_reader(path: Path, compression: str):
+    if compression == "zstd":
+        if zstandard is None:
+            raise BackupError("Для восстановления из .zst установите пакет zstandard.")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    if compression == "gzip":
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def backup_sqlite(
+    src: Path | str,
+    backups_dir: Path,
+    *,
+    compression: str | None = None,
+    pages: int = DEFAULT_PAGES,
+    sleep: float = DEFAULT_SLEEP,
+    max_restarts: int = DEFAULT_MAX_RESTARTS,
+    name: str | None = None,
+) -> BackupResult:
+    """Копия БД ``src`` в ``backups_dir/db_<время>.sqlite3[.zst|.gz]``, проверенная integrity_check."""
+    compression = compression or default_compression()
+    _check_compression(compression)
+    backups_dir.mkdir(parents=True, exist_ok=True)
+    name = name or f"db_{time.strftime('%Y%m%d_%H%M%S')}.sqlite3"
+    final = backups_dir / (name + SUFFIXES[compression])
+    part = final.with_name(final.name + ".part")
+
+    started = time.monotonic()
+    # Несжатая копия — рядом с бэкапами, а не в /tmp: там может не хватить места под большую БД.
+    fd, raw_name = tempfile.mkstemp(prefix=".db_", suffix=".sqlite3", dir=backups_dir)
+    os.close(fd)
+    raw = Path(raw_name)
+    try:
+        page_count, restarts = copy_database(src, raw, pages=pages, sleep=sleep, max_restarts=max_restarts)
+        copy_seconds = time.monotonic() - started
+        integrity_check(raw)
+        if compression == "none":
+            os.replace(raw, part)
+        else:
+            with open(raw, "rb") as fin, _open_compressed_writer(part, compression) as fout:
+                shutil.copyfileobj(fin, fout, _COPY_BUFFER)
+        os.replace(part, final)
+    finally:
+        raw.unlink(missing_ok=True)
+        part.unlink(missing_ok=True)
+    return BackupResult(
+        path=final,
+        pages=page_count,
+        restarts=restarts,
+        copy_seconds=copy_seconds,
+        total_seconds=time.monotonic() - started,
+        size=final.stat().st_size,
+    )
+
+
+def purge_backups(backups_dir: Path, retention_days: int) -> int:
+    cutoff = time.time() - retention_days * 24 * 60 * 60
+    removed = 0
+    for path in [*backups_dir.glob("db_*.sqlite3*"), *backups_dir.glob("db_*.dump")]:
+        if path.name.endswith(".part"):
+            continue
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink(missing_ok=True)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def restore_sqlite(archive: Path, target: Path | str, *, before_replace: Callable[[], None] | None = None) -> int:
+    """Восстановить ``target`` из бэкапа (сжатого или нет). Возвращает число страниц.
+
+    Архив распаковывается во временный файл рядом с ``target`` и проверяется integrity_check;
+    затем его содержимое записывается в ``target`` через backup API — так безопасно заменить
+    БД, открытую другими соединениями (в отличие от перезаписи файла).
+    """
+    target = Path(target)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, raw_name = tempfile.mkstemp(prefix=".restore_", suffix=".sqlite3", dir=target.parent)
+    os.close(fd)
+    raw = Path(raw_name)
+    try:
+        with _open_compressed_reader(archive, compression_of(archive)) as fin, open(raw, "wb") as fout:
+            shutil.copyfileobj(fin, fout, _COPY_BUFFER)
+        integrity_check(raw)
+        if before_replace is not None:
+            before_replace()
+        source = sqlite3.connect(raw)
+        try:
+            live = sqlite3.connect(target, timeout=30)
+            try:
+                source.backup(live)
+                pages = live.execute("PRAGMA page_count").fetchone()[0]
+            finally:
+                live.close()
+        finally:
+            source.close()
+    finally:
+        raw.unlink(missing_ok=True)
+    return pages
+
+
+def _pg_env(db: dict) -> dict[str, str]:
+    """Параметры подключения — через переменные окружения libpq, чтобы пароль не попал в список процессов."""
+    env = dict(os.environ)
+    values = {
+        "PGHOST": db.get("HOST"),
+        "PGPORT": db.get("PORT"),
+        "PGUSER": db.get("USER"),
+        "PGPASSWORD": db.get("PASSWORD"),
+        "PGDATABASE": db.get("NAME"),
+        "PGSSLMODE": db.get("OPTIONS", {}).get("sslmode"),
+    }
+    env.update({k: str(v) for k, v in values.items() if v})
+    return env
+
+
+def _run(cmd: list[str], db: dict) -> None:
+    try:
+        subprocess.run(cmd, env=_pg_env(db), check=True, capture_output=True, text=True)
+    except FileNotFoundError:
+        raise BackupError(f"Не найдена утилита {cmd[0]} — установите клиент PostgreSQL и добавьте его в PATH.")
+    except subprocess.CalledProcessError as exc:
+        raise BackupError(f"{cmd[0]}: {exc.stderr.strip() or exc.returncode}")
+
+
+def backup_postgres(db: dict, backups_dir: Path, *, name: str | None = None) -> BackupResult:
+    """Дамп БД PostgreSQL в ``backups_dir/db_<время>.dump`` (формат custom, уже сжатый)."""
+    backups_dir.mkdir(parents=True, exist_ok=True)
+    final = backups_dir / (name or f"db_{time.strftime('%Y%m%d_%H%M%S')}.dump")
+    part = final.with_name(final.name + ".part")
+    started = time.monotonic()
+    try:
+        _run(["pg_dump", "--format=custom", "--no-owner", f"--file={part}"], db)
+        # pg_restore --list читает оглавление целиком — проверка, что архив не обрезан.
+        _run(["pg_restore", "--list", str(part)], db)
+        os.replace(part, final)
+    finally:
+        part.unlink(missing_ok=True)
+    seconds = time.monotonic() - started
+    return BackupResult(path=final, pages=0, restarts=0, copy_seconds=seconds, total_seconds=seconds, size=final.stat().st_size)
+
+
+def restore_postgres(archive: Path, db: dict) -> None:
+    """Восстановить БД из дампа pg_dump одной транзакцией: при ошибке данные остаются прежними."""
+    _run(["pg_restore", "--clean", "--if-exists", "--no-owner", "--single-transaction", f"--dbname={db['NAME']}", str(archive)], db)
@@ -0,0 +1,133 @@
+"""Кэш редко меняющихся данных поверх Django cache framework.
+
+Ключи версионируются по пространствам имён (``defects``, ``projects``, ``users``): сигналы
+``post_save``/``post_delete`` (``core/signals.py``) увеличивают версию, и старые значения
+просто перестают читаться. Счётчики попаданий/промахов хранятся в том же кэше,
+чтобы их было видно из всех процессов (команда ``cache_stats``).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import time
+from collections.abc import Callable, Iterable
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import replicas
+
+DEFECTS = "defects"
+PROJECTS = "projects"
+# Логины пользователей (исполнители, авторы на карточке дефекта); вход в систему версию не меняет.
+USERS = "users"
+# Архив меняется только командой archive_defects — его значения не сбрасываются правками дефектов.
+ARCHIVE = "archive"
+NAMESPACES = (DEFECTS, PROJECTS, USERS, ARCHIVE)
+
+# Все кэшируемые значения — для статистики.
+DASHBOARD_STATUS = "dashboard_status"
+DASHBOARD_OVERDUE = "dashboard_overdue"
+PROJECT_CHOICES = "project_choices"
+DEFECT_FACETS = "defect_facets"
+ARCHIVE_FACETS = "archive_facets"
+CACHED_NAMES = [DASHBOARD_STATUS, DASHBOARD_OVERDUE, PROJECT_CHOICES, DEFECT_FACETS, ARCHIVE_FACETS]
+
+DEFAULT_TIMEOUT = 60 * 60
+
+_MISSING = object()
+
+
+def _version_key(namespace: str) -> str:
+    return f"version:{namespace}"
+
+
+def _stat_key(name: str, kind: str) -> str:
+    return f"stats:{name}:{kind}"
+
+
+def versions(namespaces: Iterable[str]) -> dict[str, int]:
+    namespaces = list(namespaces)
+    found = cache.get_many([_version_key(ns) for ns in namespaces])
+    result = {}
+    for ns in namespaces:
+        version = found.get(_version_key(ns))
+        if version is None:
+            # Начальная версия от времени: после потери ключа не совпадёт со старыми записями.
+            cache.add(_version_key(ns), time.time_ns(), None)
+            version = cache.get(_version_key(ns))
+        result[ns] = version
+    return result
+
+
+def _bump_now(namespace: str) -> None:
+    try:
+        cache.incr(_version_key(namespace))
+    except ValueError:
+        cache.set(_version_key(namespace), time.time_ns(), None)
+
+
+def bump(namespace: str) -> None:
+    """Инвалидировать пространство имён.
+
+    Сразу — чтобы текущий процесс увидел изменения, и ещё раз после коммита — чтобы
+    параллельный запрос не успел закэшировать незакоммиченное состояние под новой версией.
+    """
+    _bump_now(namespace)
+    transaction.on_commit(lambda: _bump_now(namespace))
+
+
+def _count(name: str, kind: str) -> None:
+    key = _stat_key(name, kind)
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def get_or_build(
+    name: str,
+    namespaces: Iterable[str],
+    build: Callable[[], Any],
+    timeout: int = DEFAULT_TIMEOUT,
+    variant: str = "",
+) -> Any:
+    """Значение из кэша или ``build()``; ``variant`` различает значения одного имени (например, по фильтрам)."""
+    suffix = ":".join(f"{ns}{v}" for ns, v in versions(namespaces).items())
+    key = f"{name}:{suffix}"
+    alias = replicas.current()
+    if alias is not None:
+        # Реплика могла ещё не догнать версию из ключа: её значения лежат отдельно, и читатель
+        # основной БД (например, сразу после своей правки) их не получит.
+        key = f"{alias}:{key}"
+    if variant:
+        # Вариант может содержать произвольный текст (поисковый запрос) — в ключ идёт его хэш.
+        key += ":" + hashlib.sha1(variant.encode("utf-8")).hexdigest()
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        _count(name, "misses")
+        value = build()
+        if alias is not None:
+            # Значение с реплики живёт не дольше допустимого отставания, а не до следующего изменения.
+            timeout = min(timeout, settings.REPLICA_STICKY_SECONDS)
+        cache.set(key, value, timeout)
+    else:
+        _count(name, "hits")
+    return value
+
+
+def stats(names: Iterable[str] = CACHED_NAMES) -> dict[str, dict[str, int]]:
+    names = list(names)
+    keys = [_stat_key(n, kind) for n in names for kind in ("hits", "misses")]
+    found = cache.get_many(keys)
+    return {
+        n: {kind: found.get(_stat_key(n, kind), 0) for kind in ("hits", "misses")}
+        for n in names
+    }
+
+
+def reset_stats(names: Iterable[str] = CACHED_NAMES) -> None:
+    cache.delete_many([_stat_key(n, kind) for n in names for kind in ("hits", "misses")])
@@ -0,0 +1,57 @@
+"""Профиль соединений SQLite.
+
+PRAGMA выставляются при открытии каждого соединения (сигнал ``connection_created``):
+WAL — читатели не ждут писателя и наоборот; ``synchronous=NORMAL`` — в WAL безопасно и без fsync
+на каждый коммит; ``busy_timeout`` — писатель ждёт освобождения блокировки, а не падает сразу
+с «database is locked»; ``mmap_size``/``cache_size``/``temp_store`` — чтение из памяти.
+
+Профиль выбирается настройкой ``SQLITE_PROFILE`` (``DJANGO_SQLITE_PROFILE``), отдельные
+значения переопределяются словарём ``SQLITE_PRAGMAS``.
+"""
+
+from __future__ import annotations
+
+from django.conf import settings
+
+from .replicas import REPLICA
+
+SQLITE_PROFILES: dict[str, dict[str, object]] = {
+    "wal": {
+        "journal_mode": "wal",
+        "synchronous": "normal",
+        "busy_timeout": 5000,
+        "mmap_size": 256 * 1024 * 1024,
+        # Отрицательное значение — в килобайтах: 64 МБ страничного кэша на соединение.
+        "cache_size": -64000,
+        "temp_store": "memory",
+    },
+    # Как было до профиля: журнал отката, настройки SQLite по умолчанию.
+    "legacy": {},
+}
+
+
+def sqlite_pragmas(profile: str | None = None) -> dict[str, object]:
+    name = profile or getattr(settings, "SQLITE_PROFILE", "wal")
+    if name not in SQLITE_PROFILES:
+        raise ValueError(f"Неизвестный профиль SQLite: {name}")
+    pragmas = dict(SQLITE_PROFILES[name])
+    if profile is None:
+        pragmas.update(getattr(settings, "SQLITE_PRAGMAS", {}))
+    return pragmas
+
+
+def apply_pragmas(cursor, pragmas: dict[str, object]) -> None:
+    for name, value in pragmas.items():
+        # Имена и значения — из настроек, не от пользователя; параметры в PRAGMA не подставляются.
+        cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def configure_sqlite(sender, connection, **kwargs) -> None:
+    if connection.vendor != "sqlite":
+        return
+    pragmas = sqlite_pragmas()
+    if connection.alias == REPLICA:
+        # Реплику пишет только sync_replica (своим соединением); приложению — только чтение.
+        pragmas["query_only"] = 1
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, pragmas)
@@ -0,0 +1,128 @@
+"""Отдача защищённых файлов после проверки прав в Django.
+
+Если перед приложением стоит nginx/Apache, Django только проверяет права и отвечает
+заголовком ``X-Accel-Redirect``/``X-Sendfile`` — файл (с докачкой и перемоткой) отдаёт
+фронт-сервер, воркер сразу освобождается. Без фронт-сервера файл отдаётся ``FileResponse``
+с поддержкой одного диапазона ``Range: bytes=a-b`` (206/416) и ``If-Range``.
+
+Настройки: ``ATTACHMENT_SENDFILE_HEADER`` — ``""``, ``"X-Accel-Redirect"`` или ``"X-Sendfile"``;
+``ATTACHMENT_ACCEL_PREFIX`` — internal-location nginx, отображённый на ``MEDIA_ROOT``.
+"""
+
+from __future__ import annotations
+
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header
+
+# Что безопасно показывать в браузере; остальное (в том числе HTML и SVG) — только скачиванием.
+INLINE_TYPES = ("image/jpeg", "image/png", "image/gif", "image/webp", "application/pdf")
+INLINE_PREFIXES = ("video/", "audio/")
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class _RangeFile:
+    """Файл, из которого читается не больше ``length`` байт начиная с ``start``."""
+
+    def __init__(self, fh, start: int, length: int):
+        fh.seek(start)
+        self.fh = fh
+        self.remaining = length
+
+    def read(self, size: int = -1) -> bytes:
+        if self.remaining <= 0:
+            return b""
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        data = self.fh.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self) -> None:
+        self.fh.close()
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """(начало, конец включительно) для ``bytes=a-b``; None — заголовок не поддерживается.
+
+    Несколько диапазонов сразу не поддерживаются — на них отвечаем целым файлом (это допустимо).
+    ValueError — диапазон за пределами файла (416).
+    """
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-500 — последние 500 байт.
+        length = int(last)
+        if length == 0 or size == 0:
+            # У пустого файла нет ни одного байта, который можно отдать диапазоном.
+            raise ValueError("empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("range not satisfiable")
+    return start, end
+
+
+def _disposition(content_type: str, filename: str) -> str:
+    inline = content_type in INLINE_TYPES or content_type.startswith(INLINE_PREFIXES)
+    return content_disposition_header(not inline, filename)
+
+
+def serve_file(
+    request: HttpRequest, *, name: str, path: str, size: int, content_type: str, filename: str, etag: str
+) -> HttpResponse:
+    """Ответ с файлом хранилища: ``name`` — имя в хранилище, ``path`` — путь на диске.
+
+    ``etag`` должен меняться вместе с содержимым (для вложений — SHA-256).
+    """
+    etag = f'"{etag}"'
+    header = getattr(settings, "ATTACHMENT_SENDFILE_HEADER", "")
+    if header:
+        response = HttpResponse(content_type=content_type)
+        if header.lower() == "x-accel-redirect":
+            prefix = getattr(settings, "ATTACHMENT_ACCEL_PREFIX", "/protected-media/")
+            response[header] = prefix.rstrip("/") + "/" + quote(name)
+        else:
+            response[header] = path
+    else:
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = _file_response(request, path, size, content_type, etag)
+    response["ETag"] = etag
+    response["Content-Disposition"] = _disposition(content_type, filename)
+    response["X-Content-Type-Options"] = "nosniff"
+    # Содержимое по этому адресу не меняется, но доступ может быть отозван — только личный кэш.
+    patch_cache_control(response, private=True, max_age=24 * 60 * 60)
+    return response
+
+
+def _file_response(request: HttpRequest, path: str, size: int, content_type: str, etag: str) -> HttpResponse:
+    span = None
+    range_header = request.headers.get("Range", "")
+    # If-Range: диапазон — только если у клиента та же версия файла, иначе весь файл заново.
+    if range_header and request.headers.get("If-Range", etag) == etag:
+        try:
+            span = parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416, content_type=content_type)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+    fh = open(path, "rb")
+    if span is None:
+        response = FileResponse(fh, content_type=content_type)
+    else:
+        start, end = span
+        response = FileResponse(_RangeFile(fh, start, end - start + 1), status=206, content_type=content_type)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = str(end - start + 1)
+    response["Accept-Ranges"] = "bytes"
+    return response
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from defects.archive import ARCHIVE_BATCH, archive_defects
+
+DEFAULT_OLDER_THAN_DAYS = 365
+
+
+class Command(BaseCommand):
+    help = (
+        "Перенести в архив закрытые и отменённые дефекты, не менявшиеся дольше заданного срока, "
+        "вместе с комментариями, историей и вложениями. Каждая порция — отдельная транзакция."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=DEFAULT_OLDER_THAN_DAYS,
+            help=f"Не менялись столько дней (по умолчанию {DEFAULT_OLDER_THAN_DAYS}).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=ARCHIVE_BATCH,
+            help=f"Дефектов в одной транзакции (по умолчанию {ARCHIVE_BATCH}).",
+        )
+        parser.add_argument("--limit", type=int, default=None, help="Перенести не больше N дефектов за запуск.")
+
+    def handle(self, *args, **options):
+        if options["older_than"] < 1:
+            raise CommandError("--older-than должен быть не меньше 1 дня.")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size должен быть положительным.")
+        if options["limit"] is not None and options["limit"] < 1:
+            raise CommandError("--limit должен быть положительным.")
+
+        cutoff = timezone.now() - timedelta(days=options["older_than"])
+        moved = archive_defects(cutoff, batch_size=options["batch_size"], limit=options["limit"])
+        self.stdout.write(self.style.SUCCESS(f"Перенесено в архив дефектов: {moved}."))
@@ -1,15 +1,29 @@
 from __future__ import annotations
 
-import shutil
-from datetime import datetime, timedelta
 from pathlib import Path
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+
+from core.backup import (
+    COMPRESSIONS,
+    DEFAULT_MAX_RESTARTS,
+    DEFAULT_PAGES,
+    DEFAULT_SLEEP,
+    BackupError,
+    backup_postgres,
+    backup_sqlite,
+    default_compression,
+    purge_backups,
+)
 
 
 class Command(BaseCommand):
-    help = "Создать резервную копию БД (для SQLite — копирование файла)."
+    help = (
+        "Создать резервную копию БД: SQLite — онлайн-копия через backup API со сжатием и проверкой, "
+        "PostgreSQL — pg_dump в формате custom."
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -18,39 +32,73 @@ class Command(BaseCommand):
             default=14,
             help="Сколько дней хранить бэкапы (по умолчанию 14).",
         )
+        parser.add_argument(
+            "--compress",
+            choices=COMPRESSIONS,
+            default=default_compression(),
+            help="Сжатие: zstd (если установлен zstandard), gzip или none.",
+        )
+        parser.add_argument(
+            "--pages",
+            type=int,
+            default=DEFAULT_PAGES,
+            help=f"Страниц за один шаг копирования (по умолчанию {DEFAULT_PAGES}; -1 — всё за один шаг).",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=DEFAULT_SLEEP,
+            help=f"Пауза между шагами, сек (по умолчанию {DEFAULT_SLEEP}) — в это время пишут другие процессы.",
+        )
+        parser.add_argument(
+            "--max-restarts",
+            type=int,
+            default=DEFAULT_MAX_RESTARTS,
+            help="После стольких перезапусков из-за записи докопировать одним шагом.",
+        )
+        parser.add_argument("--output-dir", default=None, help="Папка бэкапов (по умолчанию backups/ в проекте).")
 
     def handle(self, *args, **options):
         db = settings.DATABASES["default"]
         engine = db.get("ENGINE", "")
-
-        backups_dir = Path(settings.BASE_DIR) / "backups"
-        backups_dir.mkdir(exist_ok=True)
-
-        if engine.endswith("sqlite3"):
-            src = Path(db["NAME"])
-            if not src.exists():
-                self.stderr.write(self.style.ERROR(f"SQLite файл не найден: {src}"))
-                return 1
-            ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-            dst = backups_dir / f"db_{ts}.sqlite3"
-            shutil.copy2(src, dst)
-            self.stdout.write(self.style.SUCCESS(f"Backup created: {dst}"))
-        else:
-            self.stderr.write(
-                self.style.ERROR("Для не-SQLite БД добавьте внешний бэкап (pg_dump / mysqldump).")
-            )
-            return 2
-
-        retention_days = int(options["retention_days"])
-        cutoff = datetime.now() - timedelta(days=retention_days)
-        for p in backups_dir.glob("db_*.sqlite3"):
+        backups_dir = Path(options["output_dir"] or Path(settings.BASE_DIR) / "backups")
+        if engine.endswith("postgresql"):
             try:
-                mtime = datetime.fromtimestamp(p.stat().st_mtime)
-                if mtime < cutoff:
-                    p.unlink(missing_ok=True)
-            except OSError:
-                pass
+                result = backup_postgres(db, backups_dir)
+            except BackupError as exc:
+                raise CommandError(str(exc))
+            self.stdout.write(
+                self.style.SUCCESS(f"Backup created: {result.path} ({filesizeformat(result.size)}, {result.total_seconds:.1f} с)")
+            )
+            self._purge(backups_dir, options)
+            return
+        if not engine.endswith("sqlite3"):
+            raise CommandError("Для этой БД добавьте внешний бэкап (например, mysqldump).")
+        src = Path(db["NAME"])
+        if not src.exists():
+            raise CommandError(f"SQLite файл не найден: {src}")
 
-        return 0
+        try:
+            result = backup_sqlite(
+                src,
+                backups_dir,
+                compression=options["compress"],
+                pages=options["pages"],
+                sleep=options["sleep"],
+                max_restarts=options["max_restarts"],
+            )
+        except BackupError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Backup created: {result.path} ({filesizeformat(result.size)}, {result.pages} страниц, "
+                f"копия {result.copy_seconds:.1f} с, всего {result.total_seconds:.1f} с, перезапусков {result.restarts})"
+            )
+        )
 
+        self._purge(backups_dir, options)
 
+    def _purge(self, backups_dir: Path, options) -> None:
+        removed = purge_backups(backups_dir, int(options["retention_days"]))
+        if removed:
+            self.stdout.write(f"Удалено старых бэкапов: {removed}")
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from core.backup import COMPRESSIONS, DEFAULT_MAX_RESTARTS, DEFAULT_PAGES, DEFAULT_SLEEP, backup_sqlite, default_compression
+
+# Строка синтетической БД: ~1 КБ случайных данных и ~3 КБ нулей — сжимается примерно как реальные данные.
+_ROW_SQL = "randomblob(1024) || zeroblob(3072)"
+_ROW_BYTES = 4096
+
+
+def _make_database(path: Path, size_mb: int, journal_mode: str) -> None:
+    con = sqlite3.connect(path)
+    con.execute(f"PRAGMA journal_mode={journal_mode}")
+    con.execute("PRAGMA synchronous=OFF")
+    con.execute("CREATE TABLE IF NOT EXISTS filler (id INTEGER PRIMARY KEY, data BLOB)")
+    con.execute("CREATE TABLE IF NOT EXISTS writes (id INTEGER PRIMARY KEY, at REAL, data BLOB)")
+    rows = size_mb * 1024 * 1024 // _ROW_BYTES
+    batch = 10_000
+    for start in range(0, rows, batch):
+        con.execute(
+            f"WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n LIMIT ?) "
+            f"INSERT INTO filler (data) SELECT {_ROW_SQL} FROM n",
+            (min(batch, rows - start),),
+        )
+        con.commit()
+    con.close()
+
+
+class _Writer(threading.Thread):
+    """Пишет маленькие транзакции в отдельном соединении и замеряет время каждой."""
+
+    def __init__(self, path: Path, interval: float):
+        super().__init__(daemon=True)
+        self.path = path
+        self.interval = interval
+        self.latencies: list[float] = []
+        self.errors = 0
+        self.stop = threading.Event()
+
+    def run(self) -> None:
+        con = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        con.execute("PRAGMA synchronous=NORMAL")
+        while not self.stop.is_set():
+            started = time.perf_counter()
+            try:
+                con.execute("BEGIN IMMEDIATE")
+                con.execute("INSERT INTO writes (at, data) VALUES (?, randomblob(200))", (time.time(),))
+                con.execute("COMMIT")
+            except sqlite3.OperationalError:
+                self.errors += 1
+                if con.in_transaction:
+                    con.execute("ROLLBACK")
+            self.latencies.append(time.perf_counter() - started)
+            time.sleep(self.interval)
+        con.close()
+
+
+class Command(BaseCommand):
+    help = "Бенчмарк backup_db: время копии и задержки параллельного писателя на синтетической БД."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size-mb", type=int, default=2048, help="Размер синтетической БД, МБ (по умолчанию 2048).")
+        parser.add_argument("--journal-mode", choices=("wal", "delete"), default="wal")
+        parser.add_argument("--pages", type=int, default=DEFAULT_PAGES)
+        parser.add_argument("--sleep", type=float, default=DEFAULT_SLEEP)
+        parser.add_argument("--max-restarts", type=int, default=DEFAULT_MAX_RESTARTS)
+        parser.add_argument("--compress", choices=COMPRESSIONS, default=default_compression())
+        parser.add_argument("--write-interval", type=float, default=0.01, help="Пауза писателя между транзакциями, сек.")
+        parser.add_argument("--no-writer", action="store_true", help="Без параллельной записи.")
+        parser.add_argument("--dir", default=None, help="Где создать БД (по умолчанию — временная папка).")
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory(dir=options["dir"]) as tmp:
+            db = Path(tmp) / "bench.sqlite3"
+            started = time.monotonic()
+            _make_database(db, options["size_mb"], options["journal_mode"])
+            self.stdout.write(
+                f"БД {filesizeformat(db.stat().st_size)} ({options['journal_mode']}) создана за {time.monotonic() - started:.1f} с"
+            )
+
+            writer = None if options["no_writer"] else _Writer(db, options["write_interval"])
+            if writer:
+                writer.start()
+                time.sleep(0.5)  # базовая задержка писателя до начала копии
+                baseline = list(writer.latencies)
+            result = backup_sqlite(
+                db,
+                Path(tmp) / "backups",
+                compression=options["compress"],
+                pages=options["pages"],
+                sleep=options["sleep"],
+                max_restarts=options["max_restarts"],
+            )
+            if writer:
+                during = writer.latencies[len(baseline) :]
+                writer.stop.set()
+                writer.join()
+
+            self.stdout.write(
+                f"Бэкап: копия {result.copy_seconds:.2f} с, всего (с проверкой и сжатием) {result.total_seconds:.2f} с, "
+                f"{result.pages} страниц, перезапусков {result.restarts}, архив {filesizeformat(result.size)} ({options['compress']})"
+            )
+            if writer and during:
+                ms = sorted(x * 1000 for x in during)
+                p99 = ms[min(len(ms) - 1, int(len(ms) * 0.99))]
+                base = statistics.median(baseline) * 1000 if baseline else 0
+                self.stdout.write(
+                    f"Писатель: {len(ms)} транзакций во время бэкапа, медиана {statistics.median(ms):.2f} мс "
+                    f"(до бэкапа {base:.2f} мс), p99 {p99:.2f} мс, максимум {ms[-1]:.2f} мс, ошибок {writer.errors}"
+                )
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import csv
+import tempfile
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from accounts.models import UserRole
+from defects.imports import DefectImporter
+from defects.models import Defect, DefectPriority, DefectStatus
+from projects.models import Project, Stage
+
+# Цель запроса на импорт: 100 000 строк — за секунды, а не минуты.
+TARGET_ROWS = 100_000
+TARGET_SECONDS = 10.0
+
+_PROJECT = "Бенчмарк импорта"
+_STAGES = ("Фундамент", "Каркас", "Кровля")
+_ASSIGNEES = ("bench_import_1", "bench_import_2")
+
+
+def _write_csv(fh, rows: int) -> None:
+    statuses = [label for _, label in DefectStatus.choices]
+    priorities = [label for _, label in DefectPriority.choices]
+    writer = csv.writer(fh)
+    writer.writerow(["Заголовок", "Описание", "Объект", "Этап", "Статус", "Приоритет", "Исполнитель", "Срок"])
+    for i in range(rows):
+        writer.writerow(
+            [
+                f"Трещина в несущей стене, секция {i}",
+                f"Обнаружена при осмотре №{i}: ширина раскрытия до 0,3 мм, требуется мониторинг маяками.",
+                _PROJECT,
+                _STAGES[i % len(_STAGES)],
+                statuses[i % len(statuses)],
+                priorities[i % len(priorities)],
+                _ASSIGNEES[i % len(_ASSIGNEES)] if i % 3 else "",
+                (date(2030, 1, 1) + timedelta(days=i % 365)).isoformat(),
+            ]
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        "Бенчмарк импорта дефектов: синтетический CSV проходит весь путь импорта (разбор, проверка, "
+        "сохранение пачками со строками списка, участниками, счётчиками и поисковым индексом) в текущей БД. "
+        "Всё выполняется в одной транзакции и откатывается — данные не остаются, но БД занята на время замера. "
+        "Запускать с DJANGO_DEBUG=0: в режиме отладки Django хранит текст каждого запроса."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows", type=int, default=TARGET_ROWS, help=f"Количество строк (по умолчанию {TARGET_ROWS:,})."
+        )
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        if rows < 1:
+            raise CommandError("--rows должен быть положительным.")
+
+        with tempfile.TemporaryFile("w+", encoding="utf-8", newline="") as fh:
+            _write_csv(fh, rows)
+            fh.seek(0)
+            with transaction.atomic():
+                user = get_user_model().objects.create_user(username="bench_import_manager", role=UserRole.MANAGER)
+                for username in _ASSIGNEES:
+                    get_user_model().objects.create_user(username=username, role=UserRole.ENGINEER)
+                project = Project.objects.create(name=_PROJECT)
+                for name in _STAGES:
+                    Stage.objects.create(project=project, name=name)
+
+                if connection.vendor == "postgresql":
+                    # Отложенные проверки внешних ключей иначе ушли бы на COMMIT, которого при откате нет.
+                    with connection.cursor() as cursor:
+                        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+                started = time.perf_counter()
+                result = DefectImporter(user).run(fh, "bench.csv")
+                elapsed = time.perf_counter() - started
+                created = Defect.objects.filter(project=project).count()
+                transaction.set_rollback(True)
+
+        if result.errors or created != rows:
+            raise CommandError(f"Импортировано {created} из {rows}, ошибок: {len(result.errors)}: {result.errors[:3]}")
+        self.stdout.write(f"rows={rows} wall time: {elapsed:.1f} s ({rows / elapsed:,.0f} rows/s)")
+        projected = elapsed * TARGET_ROWS / rows
+        verdict = "OK" if projected <= TARGET_SECONDS else "МЕДЛЕННО"
+        self.stdout.write(f"{TARGET_ROWS:,} строк: ~{projected:.1f} s (цель ≤ {TARGET_SECONDS:.0f} s) — {verdict}")
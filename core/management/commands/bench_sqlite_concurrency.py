@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from core.db import SQLITE_PROFILES, apply_pragmas
+
+STATUSES = ("new", "in_progress", "in_review", "closed")
+
+# Как соединяется приложение: профиль PRAGMA, соединение на запрос или постоянное, режим транзакций.
+SETUPS = {
+    "legacy": {"pragmas": SQLITE_PROFILES["legacy"], "persistent": False, "begin": "BEGIN"},
+    "wal": {"pragmas": SQLITE_PROFILES["wal"], "persistent": True, "begin": "BEGIN IMMEDIATE"},
+}
+
+
+def _make_database(path: Path, rows: int) -> None:
+    con = sqlite3.connect(path)
+    con.executescript(
+        """
+        CREATE TABLE defect (id INTEGER PRIMARY KEY, project_id INTEGER, status TEXT, title TEXT, updated_at REAL);
+        CREATE INDEX defect_project_status ON defect (project_id, status, updated_at);
+        CREATE TABLE history (id INTEGER PRIMARY KEY, defect_id INTEGER, action TEXT, at REAL);
+        CREATE INDEX history_defect ON history (defect_id);
+        """
+    )
+    con.executemany(
+        "INSERT INTO defect (project_id, status, title, updated_at) VALUES (?, ?, ?, ?)",
+        ((i % 50, STATUSES[i % 4], f"Дефект {i}", time.time()) for i in range(rows)),
+    )
+    con.commit()
+    con.close()
+
+
+def _connect(path: str, pragmas: dict) -> sqlite3.Connection:
+    # timeout=5 — как у Django по умолчанию; isolation_level=None — транзакциями управляем сами.
+    con = sqlite3.connect(path, timeout=5, isolation_level=None)
+    apply_pragmas(con, pragmas)
+    return con
+
+
+def _read(con: sqlite3.Connection, rnd: random.Random) -> None:
+    # Как страница списка: 25 строк по индексу объекта и статуса.
+    con.execute(
+        "SELECT id, title, status FROM defect WHERE project_id = ? AND status = ? ORDER BY updated_at DESC LIMIT 25",
+        (rnd.randrange(50), rnd.choice(STATUSES)),
+    ).fetchall()
+
+
+def _write(con: sqlite3.Connection, rnd: random.Random, begin: str, rows: int) -> None:
+    # Как change_status: прочитать дефект, сменить статус, записать историю — в одной транзакции.
+    defect_id = rnd.randrange(1, rows + 1)
+    con.execute(begin)
+    try:
+        con.execute("SELECT status FROM defect WHERE id = ?", (defect_id,)).fetchone()
+        con.execute("UPDATE defect SET status = ?, updated_at = ? WHERE id = ?", (rnd.choice(STATUSES), time.time(), defect_id))
+        con.execute("INSERT INTO history (defect_id, action, at) VALUES (?, 'status', ?)", (defect_id, time.time()))
+        con.execute("COMMIT")
+    except BaseException:
+        if con.in_transaction:
+            con.execute("ROLLBACK")
+        raise
+
+
+def _worker(path: str, setup_name: str, kind: str, seconds: float, rows: int, seed: int) -> tuple[int, int, list[float]]:
+    setup = SETUPS[setup_name]
+    rnd = random.Random(seed)
+    con = _connect(path, setup["pragmas"]) if setup["persistent"] else None
+    ops = errors = 0
+    latencies: list[float] = []
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        c = con or _connect(path, setup["pragmas"])
+        try:
+            if kind == "read":
+                _read(c, rnd)
+            else:
+                _write(c, rnd, setup["begin"], rows)
+            ops += 1
+        except sqlite3.OperationalError:
+            # «database is locked»: запрос в приложении закончился бы ошибкой 500.
+            errors += 1
+        finally:
+            if con is None:
+                c.close()
+        latencies.append(time.perf_counter() - started)
+    if con is not None:
+        con.close()
+    return ops, errors, latencies
+
+
+def _p95(values: list[float]) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * 0.95))] * 1000
+
+
+class Command(BaseCommand):
+    help = "Бенчмарк конкурентного чтения/записи SQLite: прежние соединения против профиля WAL."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=6, help="Процессов-читателей (по умолчанию 6).")
+        parser.add_argument("--writers", type=int, default=4, help="Процессов-писателей (по умолчанию 4).")
+        parser.add_argument("--seconds", type=float, default=10.0, help="Длительность прогона каждого профиля.")
+        parser.add_argument("--rows", type=int, default=50_000, help="Дефектов в синтетической БД.")
+        parser.add_argument("--setup", choices=sorted(SETUPS), action="append", help="Какие профили сравнить (по умолчанию все).")
+
+    def handle(self, *args, **options):
+        readers, writers = options["readers"], options["writers"]
+        for name in options["setup"] or ["legacy", "wal"]:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = Path(tmp) / "bench.sqlite3"
+                _make_database(path, options["rows"])
+                if "journal_mode" in SETUPS[name]["pragmas"]:
+                    # journal_mode=wal хранится в файле БД — включаем до старта, как сделало бы первое соединение.
+                    _connect(str(path), SETUPS[name]["pragmas"]).close()
+                kinds = ["read"] * readers + ["write"] * writers
+                with ProcessPoolExecutor(max_workers=len(kinds)) as pool:
+                    futures = [
+                        (kind, pool.submit(_worker, str(path), name, kind, options["seconds"], options["rows"], i))
+                        for i, kind in enumerate(kinds)
+                    ]
+                    results = {"read": [0, 0, []], "write": [0, 0, []]}
+                    for kind, future in futures:
+                        ops, errors, latencies = future.result()
+                        results[kind][0] += ops
+                        results[kind][1] += errors
+                        results[kind][2].extend(latencies)
+
+            seconds = options["seconds"]
+            (r_ops, r_err, r_lat), (w_ops, w_err, w_lat) = results["read"], results["write"]
+            self.stdout.write(
+                f"{name:>6}: чтение {r_ops / seconds:8.0f} оп/с (p95 {_p95(r_lat):6.2f} мс, ошибок {r_err}); "
+                f"запись {w_ops / seconds:7.0f} оп/с (p95 {_p95(w_lat):6.2f} мс, «database is locked» {w_err})"
+            )
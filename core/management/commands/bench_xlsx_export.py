@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from openpyxl import Workbook
+
+from defects.models import DefectPriority, DefectStatus
+from reports.excel import write_defects_xlsx
+from reports.export import export_header
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _synthetic_rows(count: int):
+    statuses = [label for _, label in DefectStatus.choices]
+    priorities = [label for _, label in DefectPriority.choices]
+    # Как в export_rows: местное время без пояса.
+    created = timezone.make_naive(timezone.now())
+    for i in range(count):
+        yield [
+            i + 1,
+            f"Дефект №{i + 1}: трещина в несущей стене",
+            f"Объект {i % 50}",
+            f"Этап {i % 7}",
+            statuses[i % len(statuses)],
+            priorities[i % len(priorities)],
+            f"engineer{i % 40}",
+            date(2030, 1, 1) + timedelta(days=i % 365),
+            created,
+        ]
+
+
+def _write_regular(rows, fileobj) -> None:
+    # Прежняя реализация: обычная книга держит все ячейки в памяти.
+    wb = Workbook()
+    ws = wb.active
+    ws.append(export_header())
+    for row in rows:
+        ws.append(row)
+    wb.save(fileobj)
+
+
+class Command(BaseCommand):
+    help = (
+        "Бенчмарк выгрузки в Excel: время и пиковая память на синтетических строках (без БД). "
+        "Каждый режим запускайте отдельным процессом — пиковый RSS не сбрасывается."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000, help="Количество строк (по умолчанию 1 000 000).")
+        parser.add_argument(
+            "--mode",
+            choices=("write-only", "regular"),
+            default="write-only",
+            help="write-only — текущая выгрузка, regular — обычная книга openpyxl для сравнения.",
+        )
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        writer = write_defects_xlsx if options["mode"] == "write-only" else _write_regular
+
+        rss_before = _peak_rss_mb()
+        # tracemalloc сильно замедляет запись, поэтому включаем его только там, где нет RSS.
+        if rss_before is None:
+            tracemalloc.start()
+        started = time.perf_counter()
+        with tempfile.TemporaryFile(suffix=".xlsx") as tmp:
+            writer(_synthetic_rows(rows), tmp)
+            size_mb = tmp.tell() / (1024 * 1024)
+        elapsed = time.perf_counter() - started
+        rss_after = _peak_rss_mb()
+
+        self.stdout.write(f"mode={options['mode']} rows={rows}")
+        self.stdout.write(f"wall time: {elapsed:.1f} s ({rows / elapsed:,.0f} rows/s)")
+        self.stdout.write(f"file size: {size_mb:.1f} MB")
+        if rss_after is not None:
+            self.stdout.write(f"peak RSS: {rss_after:.1f} MB (before: {rss_before:.1f} MB)")
+        else:
+            _, py_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.stdout.write(f"peak Python heap (tracemalloc): {py_peak / (1024 * 1024):.1f} MB")
@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from core import cache
+
+
+class Command(BaseCommand):
+    help = "Показать счётчики попаданий/промахов кэша (общие для всех процессов)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Обнулить счётчики после вывода.")
+
+    def handle(self, *args, **options):
+        for name, counts in cache.stats().items():
+            total = counts["hits"] + counts["misses"]
+            ratio = counts["hits"] / total * 100 if total else 0.0
+            self.stdout.write(f"{name}: hits={counts['hits']} misses={counts['misses']} hit rate={ratio:.1f}%")
+        if options["reset"]:
+            cache.reset_stats()
+            self.stdout.write("Счётчики обнулены.")
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import itertools
+from datetime import date, datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from django.utils import timezone
+
+from defects.filters import ALLOWED_SORTS, RELEVANCE_SORT, apply_defect_filters, resolve_sort, visible_to_engineer
+from defects.models import PRIORITY_RANKS, DefectListRow, DefectPriority, DefectStatus
+from defects.pagination import KeysetPaginator
+
+# Список и выгрузки читают денормализованную таблицу строк списка.
+TABLE = DefectListRow._meta.db_table
+
+# Значение ключа для «глубокой» страницы — тип должен совпадать с полем сортировки.
+_SAMPLE_KEYS = {
+    "created_at": timezone.make_aware(datetime(2024, 1, 1)),
+    "due_date": date(2024, 1, 1),
+    "priority_rank": PRIORITY_RANKS[DefectPriority.MEDIUM],
+    "status": DefectStatus.IN_PROGRESS.value,
+}
+
+
+def _is_table_scan(plan: str) -> bool:
+    for line in plan.splitlines():
+        if connection.vendor == "sqlite":
+            # "SCAN defects_defect" без "USING INDEX" — полный проход по таблице.
+            if f"SCAN {TABLE}" in line and "USING" not in line:
+                return True
+        elif f"Seq Scan on {TABLE}" in line:
+            return True
+    return False
+
+
+class Command(BaseCommand):
+    help = (
+        "Проверить планы запросов (EXPLAIN QUERY PLAN) для всех комбинаций фильтров/сортировок "
+        "списка дефектов и экспортов. Завершается ошибкой, если какой-то запрос сканирует таблицу."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verbose-plans", action="store_true", help="Печатать план каждого запроса.")
+
+    def combinations(self):
+        # Для плана важен только факт наличия фильтра, поэтому берём по одному значению.
+        roles = ("all", "engineer")
+        statuses = ("", DefectStatus.NEW)
+        priorities = ("", DefectPriority.HIGH)
+        projects = ("", "1")
+        overdue = ("", "1")
+        # Поиск идёт через полнотекстовый индекс, а не через таблицу — его здесь не проверяем.
+        sorts = [s for s in ALLOWED_SORTS if s != RELEVANCE_SORT]
+        combos = itertools.product(roles, statuses, priorities, projects, overdue, sorts)
+        for role, status, priority, project, late, sort in combos:
+            filters = {"status": status, "priority": priority, "project": project, "overdue": late, "q": "", "sort": sort}
+            yield role, filters
+
+    def handle(self, *args, **options):
+        failed = []
+        checked = 0
+        for role, filters in self.combinations():
+            qs = DefectListRow.objects.all()
+            if role == "engineer":
+                qs = visible_to_engineer(qs, 1)
+            qs = apply_defect_filters(qs, filters)
+            paginator = KeysetPaginator(qs, resolve_sort(filters))
+            deep = (_SAMPLE_KEYS[paginator.field], 10**6)
+            # Первая и «глубокая» страница списка (keyset) и экспорт — тот же запрос без LIMIT.
+            queries = [
+                *(("list", w) for w in paginator.windows()),
+                *(("list-next", w) for w in paginator.windows(deep)),
+                *(("list-prev", w) for w in paginator.windows(deep, backwards=True)),
+                ("export", qs),
+            ]
+            for label, query in queries:
+                plan = query.explain()
+                checked += 1
+                key = f"{label} role={role} " + " ".join(f"{k}={v}" for k, v in filters.items() if v)
+                if options["verbose_plans"]:
+                    self.stdout.write(f"{key}\n{plan}\n")
+                if _is_table_scan(plan):
+                    failed.append((key, plan))
+
+        for key, plan in failed:
+            self.stderr.write(self.style.ERROR(f"Полный скан таблицы: {key}\n{plan}"))
+        if failed:
+            raise CommandError(f"{len(failed)} из {checked} запросов сканируют {TABLE}.")
+        self.stdout.write(self.style.SUCCESS(f"OK: {checked} запросов используют индексы."))
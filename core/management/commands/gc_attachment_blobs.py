@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from defects.storage import BLOB_GRACE_SECONDS, collect_garbage
+
+
+class Command(BaseCommand):
+    help = "Удалить файлы вложений, на которые не ссылается ни одно вложение, и брошенные временные файлы."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=BLOB_GRACE_SECONDS,
+            help=f"Не трогать файлы моложе стольких секунд (по умолчанию {BLOB_GRACE_SECONDS}).",
+        )
+
+    def handle(self, *args, **options):
+        deleted, freed = collect_garbage(options["min_age"])
+        self.stdout.write(self.style.SUCCESS(f"Удалено файлов: {deleted}, освобождено {filesizeformat(freed)}."))
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import time
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from defects.imports import import_defects
+
+
+class Command(BaseCommand):
+    help = (
+        "Импортировать дефекты из CSV или XLSX. Колонки: Заголовок, Объект (обязательные), "
+        "Описание, Этап, Статус, Приоритет, Исполнитель, Срок."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Путь к файлу .csv или .xlsx.")
+        parser.add_argument("--user", required=True, help="Логин пользователя, от имени которого создаются дефекты.")
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        if not path.is_file():
+            raise CommandError(f"Файл не найден: {path}")
+        try:
+            user = get_user_model().objects.get(username=options["user"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"Пользователь {options['user']} не найден.")
+
+        started = time.perf_counter()
+        with open(path, "rb") as fh:
+            result = import_defects(fh, path.name, user)
+        elapsed = time.perf_counter() - started
+
+        for line_no, message in result.errors:
+            self.stderr.write(f"строка {line_no}: {message}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Создано дефектов: {result.created}, ошибок: {len(result.errors)}, время: {elapsed:.1f} с.")
+        )
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import csv
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from defects.models import OPEN_STATUSES, DefectListRow
+from reports.export import CHUNK_SIZE
+
+FIELDS = ("defect_id", "project_name", "assignee_name", "due_date", "status_label", "title")
+
+
+class Command(BaseCommand):
+    help = (
+        "Вывести дефекты, ставшие просроченными за последние N дней (по умолчанию — за сутки), "
+        "в формате CSV: для ночной рассылки/обработки."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=1, help="За сколько последних дней истёк срок (по умолчанию 1).")
+
+    def handle(self, *args, **options):
+        days = options["days"]
+        if days < 1:
+            raise CommandError("--days должен быть не меньше 1.")
+        today = timezone.localdate()
+        # Срок истёк в [today - days, today): дефекты, просроченные раньше, уже были в прошлых выгрузках.
+        rows = (
+            DefectListRow.objects.filter(
+                status__in=OPEN_STATUSES, due_date__gte=today - timedelta(days=days), due_date__lt=today
+            )
+            .order_by("due_date", "defect_id")
+            .values_list(*FIELDS)
+            .iterator(chunk_size=CHUNK_SIZE)
+        )
+        writer = csv.writer(self.stdout, lineterminator="\n")
+        writer.writerow(FIELDS)
+        count = 0
+        for count, row in enumerate(rows, start=1):
+            writer.writerow(row)
+        self.stderr.write(f"Новых просроченных дефектов: {count}.")
@@ -0,0 +1,13 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from defects.services import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = "Пересчитать счётчики дефектов для аналитики по данным таблицы дефектов."
+
+    def handle(self, *args, **options):
+        total = rebuild_counters()
+        self.stdout.write(self.style.SUCCESS(f"Счётчики пересчитаны, дефектов: {total}"))
@@ -0,0 +1,13 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from defects.services import rebuild_list_rows
+
+
+class Command(BaseCommand):
+    help = "Пересобрать таблицу строк списка дефектов (DefectListRow) по текущим данным."
+
+    def handle(self, *args, **options):
+        total = rebuild_list_rows()
+        self.stdout.write(self.style.SUCCESS(f"Строк списка: {total}."))
@@ -0,0 +1,13 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from defects.services import rebuild_participants
+
+
+class Command(BaseCommand):
+    help = "Пересобрать участников дефектов (автор, исполнитель) по данным таблицы дефектов."
+
+    def handle(self, *args, **options):
+        total = rebuild_participants()
+        self.stdout.write(self.style.SUCCESS(f"Участников: {total}."))
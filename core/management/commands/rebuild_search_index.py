@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from defects import search
+
+
+class Command(BaseCommand):
+    help = "Пересобрать полнотекстовый индекс дефектов (заголовок, описание, комментарии)."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            search.create_index(connection)
+            search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS("Поисковый индекс пересобран."))
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.backup import BackupError, restore_postgres, restore_sqlite
+
+
+class Command(BaseCommand):
+    help = "Восстановить БД из бэкапа backup_db: SQLite — .sqlite3[.gz|.zst], PostgreSQL — .dump (pg_restore)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Файл бэкапа.")
+        parser.add_argument(
+            "--noinput",
+            "--no-input",
+            action="store_false",
+            dest="interactive",
+            help="Не спрашивать подтверждение.",
+        )
+
+    def handle(self, *args, **options):
+        db = settings.DATABASES["default"]
+        engine = db.get("ENGINE", "")
+        if not engine.endswith(("sqlite3", "postgresql")):
+            raise CommandError("restore_db поддерживает SQLite и PostgreSQL.")
+        archive = Path(options["path"])
+        if not archive.exists():
+            raise CommandError(f"Файл бэкапа не найден: {archive}")
+        target = db["NAME"]
+
+        if options["interactive"]:
+            answer = input(f"Содержимое {target} будет заменено данными из {archive}. Продолжить? [yes/no]: ")
+            if answer.strip().lower() != "yes":
+                raise CommandError("Восстановление отменено.")
+
+        try:
+            if engine.endswith("postgresql"):
+                connections.close_all()
+                restore_postgres(archive, db)
+                self.stdout.write(self.style.SUCCESS(f"БД восстановлена из {archive}."))
+                return
+            # Соединения Django закрываются перед заменой, чтобы не держать старые страницы.
+            pages = restore_sqlite(archive, Path(target), before_replace=connections.close_all)
+        except BackupError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(f"БД восстановлена из {archive} ({pages} страниц)."))
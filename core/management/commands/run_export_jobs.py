@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from reports.jobs import claim_next_job, purge_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "Воркер фоновых выгрузок: собирает CSV/XLSX из очереди в MEDIA_ROOT/exports/."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Обработать очередь и завершиться.")
+        parser.add_argument("--interval", type=float, default=2.0, help="Пауза между опросами очереди, сек.")
+        parser.add_argument(
+            "--keep-hours",
+            type=int,
+            default=24,
+            help="Сколько часов хранить готовые файлы (по умолчанию 24).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_next_job()
+            if job is not None:
+                started = time.monotonic()
+                try:
+                    run_job(job)
+                except Exception as exc:  # задание помечено как FAILED, воркер продолжает работу
+                    self.stderr.write(self.style.ERROR(f"Выгрузка #{job.id} не удалась: {exc}"))
+                else:
+                    self.stdout.write(
+                        f"Выгрузка #{job.id}: {job.rows_done} строк за {time.monotonic() - started:.1f} с"
+                    )
+                continue
+
+            purged = purge_jobs(timezone.now() - timedelta(hours=options["keep_hours"]))
+            if purged:
+                self.stdout.write(f"Удалено старых выгрузок: {purged}")
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
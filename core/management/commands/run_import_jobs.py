@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from defects.imports import claim_next_import, purge_import_jobs, run_import_job
+
+
+class Command(BaseCommand):
+    help = "Воркер импорта дефектов: сохраняет строки файлов, загруженных на странице «Импорт»."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Обработать очередь и завершиться.")
+        parser.add_argument("--interval", type=float, default=2.0, help="Пауза между опросами очереди, сек.")
+        parser.add_argument(
+            "--keep-days",
+            type=int,
+            default=7,
+            help="Сколько дней хранить завершённые задания (по умолчанию 7).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_next_import()
+            if job is not None:
+                started = time.monotonic()
+                try:
+                    run_import_job(job)
+                except Exception as exc:  # задание помечено как FAILED, воркер продолжает работу
+                    self.stderr.write(self.style.ERROR(f"Импорт #{job.id} не удался: {exc}"))
+                else:
+                    self.stdout.write(
+                        f"Импорт #{job.id}: создано {job.rows_created}, ошибок {job.error_count} "
+                        f"за {time.monotonic() - started:.1f} с"
+                    )
+                continue
+
+            purged = purge_import_jobs(timezone.now() - timedelta(days=options["keep_days"]))
+            if purged:
+                self.stdout.write(f"Удалено старых заданий импорта: {purged}")
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
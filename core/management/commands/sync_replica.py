@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.backup import DEFAULT_MAX_RESTARTS, DEFAULT_PAGES, DEFAULT_SLEEP, copy_database
+from core.replicas import REPLICA
+
+
+class Command(BaseCommand):
+    help = (
+        "Обновить SQLite-реплику копией основной БД через backup API — для проверки чтения "
+        "с реплики без сервера PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Повторять каждые N секунд (по умолчанию — одна копия). Должно быть меньше REPLICA_STICKY_SECONDS.",
+        )
+        parser.add_argument("--pages", type=int, default=DEFAULT_PAGES, help="Страниц за один шаг копирования.")
+        parser.add_argument("--sleep", type=float, default=DEFAULT_SLEEP, help="Пауза между шагами, сек.")
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES["default"]
+        replica = settings.DATABASES.get(REPLICA)
+        if replica is None:
+            raise CommandError("Реплика не настроена: задайте DATABASE_REPLICA_URL, например sqlite:///db.replica.sqlite3.")
+        engine = "django.db.backends.sqlite3"
+        if primary["ENGINE"] != engine or replica["ENGINE"] != engine:
+            raise CommandError("Команда копирует только SQLite; реплику PostgreSQL ведёт потоковая репликация сервера.")
+        if str(primary["NAME"]) == str(replica["NAME"]):
+            raise CommandError("Реплика указывает на тот же файл, что и основная БД.")
+
+        while True:
+            started = time.monotonic()
+            # Читатели реплики (WAL) видят прежний снимок, пока копия не завершится.
+            pages, restarts = copy_database(
+                primary["NAME"],
+                replica["NAME"],
+                pages=options["pages"],
+                sleep=options["sleep"],
+                max_restarts=DEFAULT_MAX_RESTARTS,
+            )
+            self.stdout.write(
+                f"{time.strftime('%H:%M:%S')} реплика обновлена: {pages} страниц за "
+                f"{time.monotonic() - started:.2f} с, перезапусков {restarts}"
+            )
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
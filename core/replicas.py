@@ -0,0 +1,126 @@
+"""Чтение с реплики БД.
+
+Реплика (алиас ``replica``, настройка ``DATABASE_REPLICA_URL``) получает только чтения тех
+представлений, что помечены ``read_replica``: отчёты и выгрузки, список дефектов наблюдателя,
+GET-запросы API. Записи и все остальные чтения идут в основную БД (роутер ``ReplicaRouter``).
+
+Реплика отстаёт от основной БД. Чтобы пользователь сразу видел свои изменения, после его
+POST/PUT/PATCH/DELETE ``ReplicaStickinessMiddleware`` ставит cookie на ``REPLICA_STICKY_SECONDS``
+секунд — пока она есть, его запросы читают из основной БД.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpRequest
+
+REPLICA = "replica"
+STICKY_COOKIE = "db_primary"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Сессии меняются в каждом запросе (в том числе GET) — всегда из основной БД.
+PRIMARY_APPS = {"sessions"}
+
+_current: ContextVar[str | None] = ContextVar("read_replica", default=None)
+
+
+def replica_alias() -> str | None:
+    """Алиас реплики, если она настроена и чтение с неё включено."""
+    if REPLICA in settings.DATABASES and settings.REPLICA_READS:
+        return REPLICA
+    return None
+
+
+def current() -> str | None:
+    """Реплика, с которой сейчас идут чтения; None — основная БД."""
+    return _current.get()
+
+
+@contextmanager
+def reading_from(alias: str | None):
+    token = _current.set(alias)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def _streamed(alias: str, content: Iterable) -> Iterator:
+    # Потоковый ответ выполняет запросы уже после выхода из представления — каждая порция читается с реплики.
+    iterator = iter(content)
+    while True:
+        with reading_from(alias):
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+        yield chunk
+
+
+def read_replica(view=None, *, when: Callable[[HttpRequest], bool] | None = None):
+    """Чтения представления — с реплики (только GET/HEAD; ``when`` сужает круг запросов)."""
+    if view is None:
+        return lambda v: read_replica(v, when=when)
+
+    @wraps(view)
+    def wrapper(request: HttpRequest, *args, **kwargs):
+        alias = replica_alias()
+        if (
+            alias is None
+            or request.method not in SAFE_METHODS
+            or STICKY_COOKIE in request.COOKIES
+            or (when is not None and not when(request))
+        ):
+            return view(request, *args, **kwargs)
+        with reading_from(alias):
+            response = view(request, *args, **kwargs)
+        # FileResponse уже собран (file_to_stream) — запросов при отдаче нет.
+        if response.streaming and getattr(response, "file_to_stream", None) is None:
+            response.streaming_content = _streamed(alias, response.streaming_content)
+        return response
+
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        return _current.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Явно: иначе объект, прочитанный с реплики, сохранялся бы туда же (instance._state.db).
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема реплики приходит вместе с данными (репликация или sync_replica).
+        return db != REPLICA
+
+
+class ReplicaStickinessMiddleware:
+    """После изменяющего запроса — чтение из основной БД на ``REPLICA_STICKY_SECONDS`` секунд."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest):
+        response = self.get_response(request)
+        if request.method not in SAFE_METHODS and replica_alias() is not None:
+            response.set_cookie(
+                STICKY_COOKIE,
+                "1",
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite="Lax",
+                secure=settings.SESSION_COOKIE_SECURE,
+            )
+        return response
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+
+from defects.models import Defect, DefectComment
+from projects.models import Project, Stage
+
+from . import cache
+
+_NAMESPACE_BY_MODEL = {
+    Defect: cache.DEFECTS,
+    # Комментарии входят в поисковый индекс: от них зависят выдача ?q= и счётчики фильтров.
+    DefectComment: cache.DEFECTS,
+    Project: cache.PROJECTS,
+    Stage: cache.PROJECTS,
+}
+
+
+def _invalidate(sender, **kwargs) -> None:
+    cache.bump(_NAMESPACE_BY_MODEL[sender])
+
+
+def _invalidate_users(sender, created: bool, update_fields=None, **kwargs) -> None:
+    # Вход в систему сохраняет только last_login — логин не менялся.
+    if created or (update_fields is not None and "username" not in update_fields):
+        return
+    cache.bump(cache.USERS)
+
+
+def connect() -> None:
+    for model in _NAMESPACE_BY_MODEL:
+        post_save.connect(_invalidate, sender=model, dispatch_uid=f"core_cache_{model._meta.label_lower}_saved")
+        post_delete.connect(_invalidate, sender=model, dispatch_uid=f"core_cache_{model._meta.label_lower}_deleted")
+    post_save.connect(_invalidate_users, sender=settings.AUTH_USER_MODEL, dispatch_uid="core_cache_user_saved")
@@ -0,0 +1,193 @@
+import gzip
+import sqlite3
+import tempfile
+from pathlib import Path
+from unittest import skipUnless
+
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import User, UserRole
+from core import cache
+from core.replicas import REPLICA, STICKY_COOKIE, reading_from
+from defects.models import Defect
+from projects.models import Project
+
+from core.backup import BackupError, backup_sqlite, restore_sqlite
+from core.db import apply_pragmas, sqlite_pragmas
+from sistemakontrolya.database import database_from_url
+
+
+class SqliteBackupTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.db = self.dir / "db.sqlite3"
+        con = sqlite3.connect(self.db)
+        con.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT)")
+        con.executemany("INSERT INTO t (v) VALUES (?)", [(f"row {i}",) for i in range(5000)])
+        con.commit()
+        con.close()
+
+    def _rows(self) -> int:
+        con = sqlite3.connect(self.db)
+        try:
+            return con.execute("SELECT count(*) FROM t").fetchone()[0]
+        finally:
+            con.close()
+
+    def test_backup_and_restore_round_trip(self):
+        result = backup_sqlite(self.db, self.dir / "backups", compression="gzip", pages=8, sleep=0)
+        self.assertTrue(result.path.name.endswith(".sqlite3.gz"))
+        self.assertEqual([p.name for p in (self.dir / "backups").iterdir()], [result.path.name])
+
+        con = sqlite3.connect(self.db)
+        con.execute("DELETE FROM t")
+        con.commit()
+        con.close()
+        restore_sqlite(result.path, self.db)
+        self.assertEqual(self._rows(), 5000)
+
+    def test_corrupted_backup_is_not_restored(self):
+        broken = self.dir / "db_broken.sqlite3.gz"
+        with gzip.open(broken, "wb") as fh:
+            fh.write(b"SQLite format 3\x00" + b"\x00" * 4096)
+        with self.assertRaises(BackupError):
+            restore_sqlite(broken, self.db)
+        self.assertEqual(self._rows(), 5000)
+
+
+class SqliteProfileTests(TestCase):
+    @skipUnless(connection.vendor == "sqlite", "PRAGMA есть только у SQLite")
+    def test_connection_gets_profile_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute("PRAGMA temp_store")
+            self.assertEqual(cursor.fetchone()[0], 2)  # memory
+
+    @override_settings(SQLITE_PROFILE="legacy", SQLITE_PRAGMAS={"busy_timeout": 100})
+    def test_settings_override_profile(self):
+        self.assertEqual(sqlite_pragmas(), {"busy_timeout": 100})
+
+    def test_wal_profile_on_file_database(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            con = sqlite3.connect(Path(tmp) / "db.sqlite3")
+            apply_pragmas(con, sqlite_pragmas("wal"))
+            self.assertEqual(con.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            con.close()
+
+
+class DatabaseUrlTests(SimpleTestCase):
+    def test_sqlite_paths(self):
+        base = Path("/srv/app")
+        self.assertEqual(database_from_url("sqlite:///db.sqlite3", base)["NAME"], base / "db.sqlite3")
+        self.assertEqual(database_from_url("sqlite:////var/lib/db.sqlite3", base)["NAME"], Path("/var/lib/db.sqlite3"))
+        self.assertEqual(database_from_url("sqlite://:memory:", base)["NAME"], ":memory:")
+
+    def test_sqlite_legacy_restores_connection_settings(self):
+        db = database_from_url("sqlite:///db.sqlite3", Path("."))
+        self.assertEqual((db["CONN_MAX_AGE"], db["OPTIONS"]["transaction_mode"]), (600, "IMMEDIATE"))
+        legacy = database_from_url("sqlite:///db.sqlite3", Path("."), sqlite_legacy=True)
+        self.assertEqual((legacy["CONN_MAX_AGE"], legacy["OPTIONS"]), (0, {"timeout": 5}))
+        # Явные параметры URL важнее профиля.
+        legacy = database_from_url("sqlite:///db.sqlite3?conn_max_age=60", Path("."), sqlite_legacy=True)
+        self.assertEqual(legacy["CONN_MAX_AGE"], 60)
+
+    def test_postgres_uses_pool_with_health_checks(self):
+        db = database_from_url("postgres://app:p%40ss@db:5433/defects?sslmode=require&pool_max_size=20", Path("."))
+        self.assertEqual(
+            (db["ENGINE"], db["NAME"], db["USER"], db["PASSWORD"], db["HOST"], db["PORT"]),
+            ("django.db.backends.postgresql", "defects", "app", "p@ss", "db", "5433"),
+        )
+        self.assertEqual(db["OPTIONS"], {"sslmode": "require", "pool": {"min_size": 2, "max_size": 20, "timeout": 10}})
+        # С пулом Django требует CONN_MAX_AGE = 0; без пула — постоянные соединения.
+        self.assertEqual((db["CONN_MAX_AGE"], db["CONN_HEALTH_CHECKS"]), (0, True))
+        self.assertEqual(database_from_url("postgres://app@db/defects?pool=0", Path("."))["CONN_MAX_AGE"], 600)
+
+    def test_unknown_scheme(self):
+        with self.assertRaises(ValueError):
+            database_from_url("mysql://db/app", Path("."))
+
+
+@override_settings(REPLICA_READS=True)
+class ReplicaRoutingTests(TransactionTestCase):
+    # Реплика — отдельное соединение: данные из незакоммиченной транзакции TestCase она бы не увидела.
+    databases = {"default", REPLICA}
+
+    def setUp(self):
+        self.manager = User.objects.create_user(username="m", password="pass", role=UserRole.MANAGER)
+        self.engineer = User.objects.create_user(username="e", password="pass", role=UserRole.ENGINEER)
+        self.observer = User.objects.create_user(username="o", password="pass", role=UserRole.OBSERVER)
+        self.project = Project.objects.create(name="Объект 1")
+        self.defect = Defect.objects.create(project=self.project, title="t", description="d", created_by=self.engineer)
+
+    def _get(self, url, **kwargs):
+        with CaptureQueriesContext(connections[REPLICA]) as replica, CaptureQueriesContext(connection) as primary:
+            response = self.client.get(url, **kwargs)
+            if response.streaming:
+                b"".join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        return len(replica), len(primary)
+
+    def test_reports_read_from_replica(self):
+        self.client.login(username="m", password="pass")
+        for name in ("reports:dashboard", "reports:export_csv", "reports:export_xlsx"):
+            replica, _ = self._get(reverse(name))
+            self.assertGreater(replica, 0, name)
+
+    def test_streamed_export_reads_replica_after_view_returns(self):
+        self.client.login(username="m", password="pass")
+        response = self.client.get(reverse("reports:export_csv"))
+        with CaptureQueriesContext(connections[REPLICA]) as replica, CaptureQueriesContext(connection) as primary:
+            body = b"".join(response.streaming_content).decode("utf-8")
+        self.assertIn("t", body)
+        self.assertEqual((len(replica) > 0, len(primary)), (True, 0))
+
+    def test_list_reads_replica_only_for_observer(self):
+        self.client.login(username="o", password="pass")
+        replica, _ = self._get(reverse("defects:list"))
+        self.assertGreater(replica, 0)
+        self.client.login(username="e", password="pass")
+        self.assertEqual(self._get(reverse("defects:list"))[0], 0)
+
+    def test_api_reads_from_replica_and_writes_to_primary(self):
+        self.client.login(username="m", password="pass")
+        self.assertGreater(self._get(reverse("defects:api_defect", args=[self.defect.pk]))[0], 0)
+
+        self.client.cookies.pop(STICKY_COOKIE, None)
+        with CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = self.client.patch(
+                reverse("defects:api_defect", args=[self.defect.pk]), {"title": "новое"}, content_type="application/json"
+            )
+        self.assertEqual((response.status_code, len(replica)), (200, 0))
+        self.defect.refresh_from_db()
+        self.assertEqual(self.defect.title, "новое")
+
+    def test_reads_stick_to_primary_after_own_write(self):
+        self.client.login(username="m", password="pass")
+        response = self.client.post(reverse("defects:create"), {})
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        self.assertEqual(response.cookies[STICKY_COOKIE]["max-age"], 15)
+        replica, primary = self._get(reverse("reports:dashboard"))
+        self.assertEqual(replica, 0)
+        self.assertGreater(primary, 0)
+
+    @override_settings(REPLICA_READS=False)
+    def test_switch_sends_everything_to_primary(self):
+        self.client.login(username="m", password="pass")
+        self.assertEqual(self._get(reverse("reports:dashboard"))[0], 0)
+        self.assertNotIn(STICKY_COOKIE, self.client.post(reverse("defects:create"), {}).cookies)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class ReplicaCacheTests(SimpleTestCase):
+    def test_values_built_on_replica_are_not_served_to_primary_readers(self):
+        with reading_from(REPLICA):
+            self.assertEqual(cache.get_or_build("probe", [cache.DEFECTS], lambda: "replica"), "replica")
+        self.assertEqual(cache.get_or_build("probe", [cache.DEFECTS], lambda: "primary"), "primary")
+        with reading_from(REPLICA):
+            self.assertEqual(cache.get_or_build("probe", [cache.DEFECTS], lambda: "again"), "replica")
@@ -6,6 +6,8 @@ from .models import Defect, DefectAttachment, DefectComment, DefectHistory
 class DefectAttachmentInline(admin.TabularInline):
     model = DefectAttachment
     extra = 0
+    fields = ("file", "original_name", "content_type", "size", "uploaded_by", "created_at")
+    readonly_fields = ("original_name", "content_type", "size", "created_at")
 
 
 class DefectCommentInline(admin.TabularInline):
@@ -22,9 +24,11 @@ class DefectHistoryInline(admin.TabularInline):
 
 @admin.register(Defect)
 class DefectAdmin(admin.ModelAdmin):
-    list_display = ("id", "title", "project", "stage", "status", "priority", "assignee", "due_date", "created_at")
+    list_display = ("id", "title", "project", "stage", "status", "priority_display", "assignee", "due_date", "created_at")
     list_filter = ("status", "priority", "project")
     search_fields = ("title", "description")
     inlines = [DefectAttachmentInline, DefectCommentInline, DefectHistoryInline]
 
-
+    @admin.display(description="Приоритет", ordering="priority_rank")
+    def priority_display(self, obj):
+        return obj.get_priority_display()
@@ -0,0 +1,357 @@
+"""JSON API дефектов, комментариев и истории.
+
+Те же правила ролей, что и у HTML-страниц. Строки отдаются прямо из ``values()`` без создания
+моделей; ``?fields=`` выбирает поля, страницы — по курсору (``KeysetPaginator``).
+Список отдаёт ETag (по версиям кэша), карточка — ETag/Last-Modified; на повторный запрос
+без изменений — 304. ETag карточки проверяется и в If-Match при PATCH. GET-запросы читают с реплики
+(``core.replicas``), если она настроена. ``?archive=1`` добавляет в список архивные дефекты.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from functools import wraps
+
+from django.db import transaction
+from django.http import HttpRequest, HttpResponse, JsonResponse
+from django.utils import timezone
+from django.views.decorators.http import condition, require_GET, require_http_methods
+
+from accounts.models import UserRole
+from core import cache, replicas
+from core.replicas import read_replica
+
+from .archive import list_sources
+from .filters import apply_defect_filters, read_filters, resolve_sort, visible_to_engineer
+from .forms import CommentForm, DefectForm
+from .models import Defect, DefectComment, DefectHistory, DefectListRow, DefectPriority, DefectStatus
+from .pagination import KeysetPaginator
+from .services import (
+    apply_status_change,
+    defect_snapshot,
+    log_defect_action,
+    save_defect_changes,
+    save_new_defect,
+    status_change_error,
+)
+
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+
+# Поле API -> колонка. Список читается из DefectListRow, карточка — из Defect.
+LIST_FIELDS = {
+    "id": "defect_id",
+    "title": "title",
+    "project_id": "project_id",
+    "project": "project_name",
+    "stage_id": "stage_id",
+    "stage": "stage_name",
+    "status": "status",
+    "status_label": "status_label",
+    "priority": "priority",
+    "priority_label": "priority_label",
+    "assignee_id": "assignee_id",
+    "assignee": "assignee_name",
+    "due_date": "due_date",
+    "is_open": "is_open",
+    "created_at": "created_at",
+}
+DETAIL_FIELDS = {
+    "id": "id",
+    "title": "title",
+    "description": "description",
+    "project_id": "project_id",
+    "project": "project__name",
+    "stage_id": "stage_id",
+    "stage": "stage__name",
+    "status": "status",
+    "priority": "priority",
+    "assignee_id": "assignee_id",
+    "assignee": "assignee__username",
+    "created_by_id": "created_by_id",
+    "created_by": "created_by__username",
+    "due_date": "due_date",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+}
+COMMENT_FIELDS = {"id": "id", "author_id": "author_id", "author": "author__username", "body": "body", "created_at": "created_at"}
+HISTORY_FIELDS = {
+    "id": "id",
+    "actor_id": "actor_id",
+    "actor": "actor__username",
+    "action": "action",
+    "from_status": "from_status",
+    "to_status": "to_status",
+    "changes": "changes",
+    "created_at": "created_at",
+}
+
+# Поля тела POST/PATCH -> поля DefectForm.
+_FORM_FIELDS = {
+    "project_id": "project",
+    "stage_id": "stage",
+    "title": "title",
+    "description": "description",
+    "priority": "priority",
+    "assignee_id": "assignee",
+    "due_date": "due_date",
+}
+
+
+class _BadRequest(Exception):
+    pass
+
+
+def _error(message: str, status: int = 400, **extra) -> JsonResponse:
+    return JsonResponse({"error": message, **extra}, status=status)
+
+
+def api_login_required(view):
+    """Как login_required, но вместо редиректа на страницу входа — 401 в JSON."""
+
+    @wraps(view)
+    def wrapper(request: HttpRequest, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return _error("Требуется вход в систему.", status=401)
+        try:
+            return view(request, *args, **kwargs)
+        except _BadRequest as exc:
+            return _error(str(exc))
+
+    return wrapper
+
+
+def _is_engineer(user) -> bool:
+    return user.role == UserRole.ENGINEER
+
+
+def _selected(request: HttpRequest, available: dict[str, str]) -> dict[str, str]:
+    raw = request.GET.get("fields")
+    if not raw:
+        return available
+    names = [name.strip() for name in raw.split(",") if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise _BadRequest("Неизвестные поля: " + ", ".join(unknown))
+    return {name: available[name] for name in names}
+
+
+def _page_size(request: HttpRequest) -> int:
+    try:
+        size = int(request.GET.get("limit") or "")
+    except ValueError:
+        return API_PAGE_SIZE
+    return min(size, API_MAX_PAGE_SIZE) if size > 0 else API_PAGE_SIZE
+
+
+def _paginate(request: HttpRequest, qs, ordering: str, fields: dict[str, str]) -> dict:
+    """Страница строк ``values()``: в выборку добавляются pk и поле сортировки — для курсора.
+
+    ``qs`` — queryset или список (рабочие и архивные строки списка).
+    """
+    sort_field = ordering.lstrip("-")
+    columns = {*fields.values(), "pk", sort_field}
+    sources = qs if isinstance(qs, list) else [qs]
+    paginator = KeysetPaginator([s.values(*columns) for s in sources], ordering, per_page=_page_size(request))
+    page = paginator.page(request.GET.get("cursor"))
+    return {
+        "results": [{name: row[column] for name, column in fields.items()} for row in page],
+        "next_cursor": page.next_cursor or None,
+        "previous_cursor": page.previous_cursor or None,
+    }
+
+
+def _json_body(request: HttpRequest) -> dict:
+    try:
+        data = json.loads(request.body or b"{}")
+    except (ValueError, UnicodeDecodeError):
+        raise _BadRequest("Тело запроса — не JSON.")
+    if not isinstance(data, dict):
+        raise _BadRequest("Ожидается JSON-объект.")
+    return data
+
+
+def _form_errors(form) -> JsonResponse:
+    return _error("Некорректные данные.", fields={name: list(errors) for name, errors in form.errors.items()})
+
+
+def _visible_defects(user):
+    qs = Defect.objects.all()
+    return visible_to_engineer(qs, user.id) if _is_engineer(user) else qs
+
+
+def _can_work_with(user, defect: Defect) -> bool:
+    if user.role == UserRole.MANAGER:
+        return True
+    return _is_engineer(user) and user.id in (defect.assignee_id, defect.created_by_id)
+
+
+def _hash(*parts) -> str:
+    return hashlib.sha1(":".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+# --- Условные запросы -------------------------------------------------------------------
+
+
+def _list_etag(request: HttpRequest, *args, **kwargs) -> str | None:
+    if replicas.current() is not None:
+        # Версии кэша — от основной БД, строки — с реплики: валидатора нет.
+        return None
+    # Last-Modified у списка нет: удаления, переименования и новые комментарии (поиск) не меняют
+    # updated_at выборки — их ловят только версии кэша. Дата — из-за фильтра «просрочен».
+    versions = cache.versions([cache.DEFECTS, cache.PROJECTS, cache.ARCHIVE])
+    return _hash(request.user.pk, request.user.role, request.get_full_path(), timezone.localdate(), versions)
+
+
+def _defect_last_modified(request: HttpRequest, defect_id: int, *args, **kwargs):
+    # Дефект, которого пользователь не видит, — без валидаторов: представление ответит 404, а не 304/412.
+    return _visible_defects(request.user).filter(pk=defect_id).values_list("updated_at", flat=True).first()
+
+
+def _defect_etag(request: HttpRequest, defect_id: int, *args, **kwargs) -> str | None:
+    updated_at = _defect_last_modified(request, defect_id)
+    if updated_at is None:
+        return None
+    return _hash(defect_id, updated_at, request.GET.get("fields", ""), cache.versions([cache.PROJECTS, cache.USERS]))
+
+
+# --- Представления ----------------------------------------------------------------------
+
+
+@api_login_required
+@read_replica
+@require_http_methods(["GET", "HEAD", "POST"])
+def defects(request: HttpRequest) -> HttpResponse:
+    if request.method == "POST":
+        return _create_defect(request)
+    return _list_defects(request)
+
+
+@condition(etag_func=_list_etag)
+def _list_defects(request: HttpRequest) -> HttpResponse:
+    fields = _selected(request, LIST_FIELDS)
+    qs = DefectListRow.objects.all()
+    if _is_engineer(request.user):
+        qs = visible_to_engineer(qs, request.user.id)
+    filters = read_filters(request.GET)
+    qs = apply_defect_filters(qs, filters)
+    sources = list_sources(qs, filters, request.user.id if _is_engineer(request.user) else None)
+    return JsonResponse(_paginate(request, sources, resolve_sort(filters), fields))
+
+
+def _create_defect(request: HttpRequest) -> HttpResponse:
+    if request.user.role == UserRole.OBSERVER:
+        return _error("Недостаточно прав.", status=403)
+    data = _json_body(request)
+    form = DefectForm({_FORM_FIELDS[k]: v for k, v in data.items() if k in _FORM_FIELDS}, user=request.user)
+    if not form.is_valid():
+        return _form_errors(form)
+    defect: Defect = form.save(commit=False)
+    defect.created_by = request.user
+    save_new_defect(defect, request.user)
+    return _defect_response(request, defect.pk, status=201)
+
+
+def _defect_response(request: HttpRequest, defect_id: int, status: int = 200) -> HttpResponse:
+    fields = _selected(request, DETAIL_FIELDS)
+    row = _visible_defects(request.user).filter(pk=defect_id).values(*fields.values()).first()
+    if row is None:
+        return _error("Дефект не найден.", status=404)
+    payload = {name: row[column] for name, column in fields.items()}
+    labels = {"status": dict(DefectStatus.choices), "priority": dict(DefectPriority.choices)}
+    for name, choices in labels.items():
+        if name in payload:
+            payload[f"{name}_label"] = choices.get(payload[name], payload[name])
+    return JsonResponse(payload, status=status)
+
+
+@api_login_required
+@read_replica
+@require_http_methods(["GET", "HEAD", "PATCH"])
+@condition(etag_func=_defect_etag, last_modified_func=_defect_last_modified)
+def defect(request: HttpRequest, defect_id: int) -> HttpResponse:
+    if request.method == "PATCH":
+        return _update_defect(request, defect_id)
+    return _defect_response(request, defect_id)
+
+
+def _update_defect(request: HttpRequest, defect_id: int) -> HttpResponse:
+    defect = _visible_defects(request.user).filter(pk=defect_id).first()
+    if defect is None:
+        return _error("Дефект не найден.", status=404)
+    if not _can_work_with(request.user, defect):
+        return _error("Недостаточно прав.", status=403)
+    data = _json_body(request)
+
+    # Всё проверяется до записи: запрос с ошибкой не должен менять дефект даже частично.
+    changes = {_FORM_FIELDS[k]: v for k, v in data.items() if k in _FORM_FIELDS}
+    form = old = None
+    if changes:
+        # PATCH: незатронутые поля берутся из текущего дефекта, валидация — та же форма, что на странице.
+        current = {
+            "project": defect.project_id,
+            "stage": defect.stage_id or "",
+            "title": defect.title,
+            "description": defect.description,
+            "priority": defect.priority,
+            "assignee": defect.assignee_id or "",
+            "due_date": defect.due_date or "",
+        }
+        old = defect_snapshot(defect)
+        form = DefectForm({**current, **changes}, instance=defect, user=request.user)
+        if not form.is_valid():
+            return _form_errors(form)
+        defect = form.save(commit=False)
+
+    new_status = data.get("status")
+    if new_status == defect.status:
+        new_status = None
+    if new_status:
+        if new_status not in defect.allowed_next_statuses():
+            return _error("Недопустимый переход статуса.")
+        error = status_change_error(request.user, defect, new_status)
+        if error:
+            return _error(error, status=403)
+
+    with transaction.atomic():
+        if form is not None:
+            save_defect_changes(defect, old, request.user)
+        if new_status:
+            apply_status_change(defect, new_status, request.user, str(data.get("comment") or "").strip())
+    return _defect_response(request, defect.pk)
+
+
+@api_login_required
+@read_replica
+@require_http_methods(["GET", "HEAD", "POST"])
+def comments(request: HttpRequest, defect_id: int) -> HttpResponse:
+    defect = _visible_defects(request.user).filter(pk=defect_id).only("pk", "assignee_id", "created_by_id").first()
+    if defect is None:
+        return _error("Дефект не найден.", status=404)
+    if request.method == "POST":
+        if not _can_work_with(request.user, defect):
+            return _error("Недостаточно прав.", status=403)
+        form = CommentForm(_json_body(request))
+        if not form.is_valid():
+            return _form_errors(form)
+        comment = form.save(commit=False)
+        comment.defect = defect
+        comment.author = request.user
+        with transaction.atomic():
+            comment.save()
+            log_defect_action(defect=defect, actor=request.user, action="Добавлен комментарий")
+        row = DefectComment.objects.filter(pk=comment.pk).values(*COMMENT_FIELDS.values()).get()
+        return JsonResponse({name: row[column] for name, column in COMMENT_FIELDS.items()}, status=201)
+    fields = _selected(request, COMMENT_FIELDS)
+    return JsonResponse(_paginate(request, DefectComment.objects.filter(defect_id=defect_id), "id", fields))
+
+
+@api_login_required
+@read_replica
+@require_GET
+def history(request: HttpRequest, defect_id: int) -> HttpResponse:
+    if not _visible_defects(request.user).filter(pk=defect_id).exists():
+        return _error("Дефект не найден.", status=404)
+    fields = _selected(request, HISTORY_FIELDS)
+    return JsonResponse(_paginate(request, DefectHistory.objects.filter(defect_id=defect_id), "-id", fields))
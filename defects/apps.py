@@ -6,4 +6,5 @@ class DefectsConfig(AppConfig):
     name = "defects"
     verbose_name = "Дефекты"
 
-
+    def ready(self) -> None:
+        from . import signals  # noqa: F401
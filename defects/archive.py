@@ -0,0 +1,141 @@
+"""Архив закрытых и отменённых дефектов.
+
+``archive_defects`` переносит дефекты, закрытые/отменённые и не менявшиеся дольше заданного
+срока, вместе с комментариями, историей и вложениями в таблицы ``Archived*`` — порциями, каждая
+в своей транзакции. Рабочие таблицы (дефекты, строки списка, участники, счётчики) остаются
+маленькими, их индексы не растут с годами.
+
+Перенос не трогает полнотекстовый индекс (id сохраняются — строки индекса продолжают находить
+архивные дефекты) и файлы вложений (на блоб ссылается архивное вложение). Список, поиск и
+выгрузки читают архив только по явному переключателю ``archive=1``.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+from datetime import datetime
+
+from django.db import router, transaction
+from django.db.models import Model, Q, QuerySet
+from django.utils import timezone
+
+from core import cache
+
+from .filters import apply_defect_filters
+from .models import (
+    CLOSED_STATUSES,
+    ArchivedDefect,
+    ArchivedDefectAttachment,
+    ArchivedDefectComment,
+    ArchivedDefectHistory,
+    Defect,
+    DefectAttachment,
+    DefectComment,
+    DefectHistory,
+    DefectListRow,
+    DefectParticipant,
+)
+from .services import bump_counters, refresh_list_rows
+
+# Дефектов в одной транзакции переноса: транзакция короткая, блокировка записи не задерживает пользователей.
+ARCHIVE_BATCH = 500
+
+_ROW_FIELDS = [f.attname for f in DefectListRow._meta.concrete_fields]
+
+# Дочерние таблицы: откуда -> куда, в порядке удаления перед самим дефектом.
+_CHILDREN: list[tuple[type[Model], type[Model] | None]] = [
+    (DefectComment, ArchivedDefectComment),
+    (DefectHistory, ArchivedDefectHistory),
+    (DefectAttachment, ArchivedDefectAttachment),
+    (DefectParticipant, None),
+    (DefectListRow, None),
+]
+
+
+def archivable(cutoff: datetime) -> QuerySet:
+    """Дефекты, которые можно перенести: закрыты или отменены и не менялись с ``cutoff``."""
+    return Defect.objects.filter(status__in=CLOSED_STATUSES, updated_at__lt=cutoff)
+
+
+def _copy_children(source: type[Model], target: type[Model], ids: list[int]) -> None:
+    names = [f.attname for f in target._meta.concrete_fields]
+    rows = source.objects.filter(defect_id__in=ids).values(*names).order_by()
+    target.objects.bulk_create((target(**row) for row in rows.iterator()), batch_size=ARCHIVE_BATCH)
+
+
+def _raw_delete(model: type[Model], condition: Q) -> None:
+    # Без Collector: сигналы удаления убрали бы дефект из поискового индекса и освободили бы
+    # блобы вложений, а перенос сохраняет и то и другое. Счётчики и кэш обновляются явно.
+    qs = model.objects.filter(condition)
+    qs._raw_delete(router.db_for_write(model))
+
+
+@transaction.atomic
+def _archive_batch(cutoff: datetime, size: int) -> int:
+    # Строки блокируются до конца транзакции (PostgreSQL); занятые параллельной правкой пропускаются.
+    # В SQLite транзакция IMMEDIATE и так держит блокировку записи.
+    ids = list(
+        archivable(cutoff).select_for_update(skip_locked=True).order_by("pk").values_list("pk", flat=True)[:size]
+    )
+    if not ids:
+        return 0
+    missing = set(ids) - set(DefectListRow.objects.filter(defect_id__in=ids).values_list("defect_id", flat=True))
+    if missing:
+        refresh_list_rows(missing)
+
+    # Строка списка уже содержит названия и подписи; из дефекта — только описание и время изменения.
+    extra = {
+        pk: {"description": description, "updated_at": updated_at}
+        for pk, description, updated_at in Defect.objects.filter(pk__in=ids).values_list("pk", "description", "updated_at")
+    }
+    now = timezone.now()
+    rows = list(DefectListRow.objects.filter(defect_id__in=ids).values(*_ROW_FIELDS))
+    ArchivedDefect.objects.bulk_create(ArchivedDefect(**row, **extra[row["defect_id"]], archived_at=now) for row in rows)
+    for source, target in _CHILDREN:
+        if target is not None:
+            _copy_children(source, target, ids)
+
+    for source, _target in _CHILDREN:
+        _raw_delete(source, Q(defect_id__in=ids))
+    _raw_delete(Defect, Q(pk__in=ids))
+
+    # Счётчики описывают рабочую таблицу: фасеты списка без архива сходятся с ними.
+    removed = Counter((r["project_id"], r["stage_id"], r["status"], r["priority"]) for r in rows)
+    bump_counters({key: -count for key, count in removed.items()})
+    cache.bump(cache.DEFECTS)
+    cache.bump(cache.ARCHIVE)
+    return len(ids)
+
+
+def archive_defects(cutoff: datetime, *, batch_size: int = ARCHIVE_BATCH, limit: int | None = None) -> int:
+    """Перенести в архив дефекты, закрытые/отменённые раньше ``cutoff``. Возвращает их число."""
+    moved = 0
+    while limit is None or moved < limit:
+        size = batch_size if limit is None else min(batch_size, limit - moved)
+        count = _archive_batch(cutoff, size)
+        if not count:
+            break
+        moved += count
+    return moved
+
+
+def visible_archived(qs: QuerySet, user_id: int) -> QuerySet:
+    # Участников у архивных дефектов нет — инженер видит назначенные ему и созданные им.
+    return qs.filter(Q(assignee_id=user_id) | Q(created_by_id=user_id))
+
+
+def archived_rows(filters: dict[str, str], engineer_id: int | None = None) -> QuerySet:
+    """Архивные строки с теми же фильтрами и сортировкой, что у списка."""
+    qs = ArchivedDefect.objects.all()
+    if engineer_id is not None:
+        qs = visible_archived(qs, engineer_id)
+    return apply_defect_filters(qs, filters)
+
+
+def list_sources(qs: QuerySet, filters: dict[str, str], engineer_id: int | None = None) -> list[QuerySet]:
+    """Выборки для списка/выгрузки: рабочие строки и, если включён переключатель, архивные."""
+    sources = [qs]
+    if filters.get("archive"):
+        sources.append(archived_rows(filters, engineer_id))
+    return sources
+
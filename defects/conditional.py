@@ -0,0 +1,73 @@
+"""Валидаторы (ETag) для условных GET страниц дефектов.
+
+ETag считается до основных запросов: для карточки — одним запросом по дефекту и индексам
+комментариев/истории/вложений, для списка — по версиям кэша без обращения к БД. Если ничего
+не менялось, ``condition`` отвечает 304 без запросов страницы и рендера шаблона.
+
+В ETag входят пользователь и роль (от них зависят кнопки и видимость), CSRF-секрет (формы на
+странице), версии названий объектов/этапов и логинов пользователей. Пока в сессии ждут сообщения (``messages``),
+ETag не отдаётся: страница с ними должна отрендериться целиком. Список, прочитанный с реплики,
+тоже без ETag: версия кэша уже новая, а реплика могла ещё не догнать основную БД.
+"""
+
+from __future__ import annotations
+
+import hashlib
+
+from django.contrib import messages
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.http import HttpRequest
+from django.utils import timezone
+
+from core import cache, replicas
+
+from .models import Defect, DefectAttachment, DefectComment, DefectHistory
+
+
+def _hash(*parts) -> str:
+    return hashlib.sha1(":".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+def _viewer(request: HttpRequest) -> tuple | None:
+    """Часть ETag, зависящая от пользователя; None — страницу нельзя отдавать как 304."""
+    if not request.user.is_authenticated or len(messages.get_messages(request)):
+        return None
+    return (request.user.pk, request.user.role, request.META.get("CSRF_COOKIE", ""))
+
+
+def _per_defect(model, aggregate) -> Subquery:
+    return Subquery(model.objects.filter(defect=OuterRef("pk")).order_by().values("defect").annotate(v=aggregate).values("v"))
+
+
+def defect_etag(request: HttpRequest, defect_id: int, *args, **kwargs) -> str | None:
+    viewer = _viewer(request)
+    if viewer is None:
+        return None
+    # Последний id и число строк: новые записи меняют первое, удаления (админка) — второе.
+    state = (
+        Defect.objects.filter(pk=defect_id)
+        .values_list("updated_at")
+        .annotate(
+            last_comment=_per_defect(DefectComment, Max("id")),
+            comments=_per_defect(DefectComment, Count("id")),
+            last_history=_per_defect(DefectHistory, Max("id")),
+            last_attachment=_per_defect(DefectAttachment, Max("id")),
+            attachments=_per_defect(DefectAttachment, Count("id")),
+        )
+        .first()
+    )
+    if state is None:
+        # Пусть представление само ответит 404.
+        return None
+    return _hash("detail", defect_id, *viewer, *state, cache.versions([cache.PROJECTS, cache.USERS]))
+
+
+def list_etag(request: HttpRequest, *args, **kwargs) -> str | None:
+    viewer = _viewer(request)
+    if viewer is None or replicas.current() is not None:
+        return None
+    # Счётчики фильтров зависят и от дефектов вне выборки, поэтому валидатор — версия всех
+    # дефектов (меняется при любом изменении), а не только отфильтрованных строк.
+    # Дата — из-за отметки «просрочен».
+    versions = cache.versions([cache.DEFECTS, cache.PROJECTS, cache.ARCHIVE])
+    return _hash("list", *viewer, request.get_full_path(), timezone.localdate(), versions)
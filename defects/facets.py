@@ -0,0 +1,95 @@
+"""Счётчики значений фильтров (фасеты) для списка дефектов.
+
+Все три фасета (статус, приоритет, объект) считаются из одной группировки по
+``(status, priority, project_id)``: для каждого значения фасета суммируются группы,
+подходящие под остальные активные фильтры. Без поиска, фильтра просрочки и ограничения
+видимости группировка берётся из таблицы счётчиков ``DefectCounter``, иначе — из ``DefectListRow``.
+С переключателем архива добавляется группировка ``ArchivedDefect`` — она кэшируется по версии
+архива и пересчитывается только после переноса.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from core import cache
+
+from .archive import visible_archived
+from .filters import visible_to_engineer
+from .models import ArchivedDefect, DefectCounter, DefectListRow, overdue_q
+from .search import search_defects
+
+FACETS = ("status", "priority", "project")
+
+# Поиск учитывает и комментарии, а они версию кэша дефектов не меняют — держим недолго.
+FACETS_TIMEOUT = 5 * 60
+
+Group = tuple[str, str, int, int]
+
+
+def _groups(q: str, engineer_id: int | None, overdue: bool) -> list[Group]:
+    if not q and engineer_id is None and not overdue:
+        rows = DefectCounter.objects.values_list("status", "priority", "project_id").annotate(cnt=Sum("count"))
+    else:
+        qs = DefectListRow.objects.all()
+        if engineer_id is not None:
+            qs = visible_to_engineer(qs, engineer_id)
+        if q:
+            qs = search_defects(qs, q)
+        if overdue:
+            qs = qs.filter(overdue_q())
+        rows = qs.values_list("status", "priority", "project_id").annotate(cnt=Count("pk"))
+    return [row for row in rows.order_by() if row[3]]
+
+
+def _archive_groups(q: str, engineer_id: int | None) -> list[Group]:
+    qs = ArchivedDefect.objects.all()
+    if engineer_id is not None:
+        qs = visible_archived(qs, engineer_id)
+    if q:
+        qs = search_defects(qs, q)
+    return list(qs.values_list("status", "priority", "project_id").annotate(cnt=Count("pk")).order_by())
+
+
+def facet_counts(filters: dict[str, str], engineer_id: int | None = None) -> dict[str, Counter]:
+    """Сколько дефектов даст каждое значение фасета при остальных активных фильтрах.
+
+    Для инженера считаются только видимые ему дефекты. Группировка кэшируется по
+    (видимость, просрочка, поисковый запрос) и переиспользуется для любых сочетаний остальных фильтров.
+    """
+    scope = "all" if engineer_id is None else f"engineer:{engineer_id}"
+    overdue = bool(filters.get("overdue"))
+    # Просрочка зависит от даты — в ключ входит сегодняшний день.
+    overdue_key = timezone.localdate().isoformat() if overdue else ""
+    groups = cache.get_or_build(
+        cache.DEFECT_FACETS,
+        [cache.DEFECTS],
+        lambda: _groups(filters["q"], engineer_id, overdue),
+        timeout=FACETS_TIMEOUT,
+        variant=f"{scope}:{overdue_key}:{filters['q']}",
+    )
+    # Архивные дефекты закрыты — под фильтр просрочки не попадают.
+    if filters.get("archive") and not overdue:
+        groups = groups + cache.get_or_build(
+            cache.ARCHIVE_FACETS,
+            [cache.ARCHIVE],
+            lambda: _archive_groups(filters["q"], engineer_id),
+            variant=f"{scope}:{filters['q']}",
+        )
+    active = {
+        "status": filters["status"] or None,
+        "priority": filters["priority"] or None,
+        "project": int(filters["project"]) if filters["project"].isdigit() else None,
+    }
+    counts = {facet: Counter() for facet in FACETS}
+    for status, priority, project_id, cnt in groups:
+        values = {"status": status, "priority": priority, "project": project_id}
+        mismatched = [f for f in FACETS if active[f] is not None and active[f] != values[f]]
+        # Группа учитывается в фасете, если расходится с фильтрами разве что по нему самому.
+        for facet in FACETS:
+            if not mismatched or mismatched == [facet]:
+                counts[facet][values[facet]] += cnt
+    return counts
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from django.db.models import QuerySet
+
+from .models import DefectParticipant, overdue_q
+from .search import search_defects
+
+DEFAULT_SORT = "-created_at"
+# Доступна только вместе с поисковым запросом.
+RELEVANCE_SORT = "relevance"
+
+ALLOWED_SORTS: dict[str, str] = {
+    "-created_at": "-created_at",
+    "created_at": "created_at",
+    "due_date": "due_date",
+    "-due_date": "-due_date",
+    # По серьёзности (priority_rank), а не по строковому значению.
+    "priority": "priority_rank",
+    "-priority": "-priority_rank",
+    "status": "status",
+    "-status": "-status",
+    RELEVANCE_SORT: "-search_rank",
+}
+
+
+def read_filters(params) -> dict[str, str]:
+    """Достаёт параметры фильтрации из GET (QueryDict или обычный dict)."""
+    q = (params.get("q") or "").strip()
+    return {
+        "status": params.get("status") or "",
+        "priority": params.get("priority") or "",
+        "project": params.get("project") or "",
+        "overdue": "1" if params.get("overdue") else "",
+        # Включить архив (defects/archive.py) — явно, по умолчанию читаются только рабочие таблицы.
+        "archive": "1" if params.get("archive") else "",
+        "q": q,
+        "sort": params.get("sort") or (RELEVANCE_SORT if q else DEFAULT_SORT),
+    }
+
+
+def resolve_sort(filters: dict[str, str]) -> str:
+    """Поле сортировки для order_by с учётом того, что релевантность есть только при поиске."""
+    sort = filters["sort"]
+    if sort == RELEVANCE_SORT and not filters["q"]:
+        sort = DEFAULT_SORT
+    return ALLOWED_SORTS.get(sort, DEFAULT_SORT)
+
+
+def apply_defect_filters(qs: QuerySet, filters: dict[str, str]) -> QuerySet:
+    """Общая фильтрация/сортировка для списка дефектов и экспортов."""
+    if filters["status"]:
+        qs = qs.filter(status=filters["status"])
+    if filters["priority"]:
+        qs = qs.filter(priority=filters["priority"])
+    if filters["project"].isdigit():
+        qs = qs.filter(project_id=int(filters["project"]))
+    # Задания выгрузки, поставленные до появления фильтра, хранят фильтры без этого ключа.
+    if filters.get("overdue"):
+        qs = qs.filter(overdue_q())
+    if filters["q"]:
+        qs = search_defects(qs, filters["q"])
+    return qs.order_by(resolve_sort(filters))
+
+
+def visible_to_engineer(qs: QuerySet, user_id: int) -> QuerySet:
+    # Инженер видит только свои дефекты (назначенные или созданные): выборка по индексу участников,
+    # а не OR по assignee/created_by. Работает и для Defect, и для DefectListRow (pk = id дефекта).
+    return qs.filter(pk__in=DefectParticipant.objects.filter(user_id=user_id).values("defect_id"))
@@ -84,3 +84,35 @@ class StatusChangeForm(forms.Form):
         _bootstrapify(self)
 
 
+class ImportForm(forms.Form):
+    file = forms.FileField(label="Файл CSV или XLSX")
+
+    def clean_file(self):
+        f = self.cleaned_data["file"]
+        if not f.name.lower().endswith((".csv", ".xlsx")):
+            raise forms.ValidationError("Поддерживаются файлы .csv и .xlsx.")
+        return f
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        _bootstrapify(self)
+
+
+class BulkActionForm(forms.Form):
+    status = forms.ChoiceField(
+        choices=[("", "Статус: не менять"), *DefectStatus.choices], required=False, label="Новый статус"
+    )
+    assignee = forms.ModelChoiceField(
+        queryset=User.objects.none(), required=False, empty_label="Исполнитель: не менять", label="Исполнитель"
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["assignee"].queryset = User.objects.filter(is_active=True).order_by("username")
+        _bootstrapify(self)
+
+    def clean(self):
+        cleaned = super().clean()
+        if not cleaned.get("status") and not cleaned.get("assignee"):
+            raise forms.ValidationError("Выберите новый статус или исполнителя.")
+        return cleaned
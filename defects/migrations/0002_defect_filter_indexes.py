@@ -0,0 +1,48 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('defects', '0001_initial'),
+        ('projects', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='defect',
+            index=models.Index(fields=['-created_at'], name='defect_created'),
+        ),
+        migrations.AddIndex(
+            model_name='defect',
+            index=models.Index(fields=['due_date'], name='defect_due'),
+        ),
+        migrations.AddIndex(
+            model_name='defect',
+            index=models.Index(fields=['project', 'status', '-created_at'], name='defect_proj_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='defect',
+            index=models.Index(fields=['status', 'due_date'], name='defect_status_due'),
+        ),
+        migrations.AddIndex(
+            model_name='defect',
+            index=models.Index(fields=['status', '-created_at'], name='defect_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='defect',
+            index=models.Index(fields=['priority', '-created_at'], name='defect_priority_created'),
+        ),
+        migrations.AddIndex(
+            model_name='defect',
+            index=models.Index(fields=['assignee', 'status', '-created_at'], name='defect_assignee_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='defect',
+            index=models.Index(fields=['created_by', '-created_at'], name='defect_author_created'),
+        ),
+    ]
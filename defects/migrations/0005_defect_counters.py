@@ -0,0 +1,46 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:12
+
+import django.db.models.deletion
+import django.db.models.functions.comparison
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_counters(apps, schema_editor):
+    Defect = apps.get_model("defects", "Defect")
+    DefectCounter = apps.get_model("defects", "DefectCounter")
+    rows = Defect.objects.values("project_id", "stage_id", "status", "priority").annotate(cnt=Count("id")).order_by()
+    DefectCounter.objects.bulk_create(
+        DefectCounter(
+            project_id=r["project_id"], stage_id=r["stage_id"], status=r["status"], priority=r["priority"], count=r["cnt"]
+        )
+        for r in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('defects', '0004_defect_updated_index'),
+        ('projects', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DefectCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('new', 'Новая'), ('in_progress', 'В работе'), ('in_review', 'На проверке'), ('closed', 'Закрыта'), ('cancelled', 'Отменена')], max_length=20, verbose_name='Статус')),
+                ('priority', models.CharField(choices=[('low', 'Низкий'), ('medium', 'Средний'), ('high', 'Высокий'), ('critical', 'Критический')], max_length=20, verbose_name='Приоритет')),
+                ('count', models.IntegerField(default=0, verbose_name='Количество')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='projects.project', verbose_name='Объект')),
+                ('stage', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='projects.stage', verbose_name='Этап')),
+            ],
+            options={
+                'verbose_name': 'Счётчик дефектов',
+                'verbose_name_plural': 'Счётчики дефектов',
+                'constraints': [models.UniqueConstraint(models.F('project'), django.db.models.functions.comparison.Coalesce('stage', 0), models.F('status'), models.F('priority'), name='defectcounter_unique_key')],
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:17
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, Value, When
+
+RANKS = {"low": 1, "medium": 2, "high": 3, "critical": 4}
+
+
+def fill_priority_rank(apps, schema_editor):
+    Defect = apps.get_model("defects", "Defect")
+    Defect.objects.update(
+        priority_rank=Case(*(When(priority=p, then=Value(r)) for p, r in RANKS.items()), default=Value(2))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('defects', '0005_defect_counters'),
+        ('projects', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='defect',
+            name='priority_rank',
+            field=models.PositiveSmallIntegerField(default=2, editable=False, verbose_name='Серьёзность'),
+        ),
+        migrations.RunPython(fill_priority_rank, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='defect',
+            index=models.Index(fields=['priority_rank'], name='defect_priority_rank'),
+        ),
+        migrations.AddIndex(
+            model_name='defect',
+            index=models.Index(fields=['status', 'priority_rank'], name='defect_status_rank'),
+        ),
+    ]
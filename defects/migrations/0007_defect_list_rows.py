@@ -0,0 +1,86 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+STATUS_LABELS = {
+    "new": "Новая",
+    "in_progress": "В работе",
+    "in_review": "На проверке",
+    "closed": "Закрыта",
+    "cancelled": "Отменена",
+}
+PRIORITY_LABELS = {"low": "Низкий", "medium": "Средний", "high": "Высокий", "critical": "Критический"}
+
+
+def fill_list_rows(apps, schema_editor):
+    Defect = apps.get_model("defects", "Defect")
+    DefectListRow = apps.get_model("defects", "DefectListRow")
+    defects = Defect.objects.select_related("project", "stage", "assignee").order_by("pk").iterator(chunk_size=1000)
+    DefectListRow.objects.bulk_create(
+        (
+            DefectListRow(
+                defect_id=d.pk,
+                title=d.title,
+                project_id=d.project_id,
+                project_name=d.project.name,
+                stage_id=d.stage_id,
+                stage_name=d.stage.name if d.stage else "",
+                status=d.status,
+                status_label=STATUS_LABELS.get(d.status, d.status),
+                priority=d.priority,
+                priority_label=PRIORITY_LABELS.get(d.priority, d.priority),
+                priority_rank=d.priority_rank,
+                assignee_id=d.assignee_id,
+                assignee_name=d.assignee.username if d.assignee else "",
+                created_by_id=d.created_by_id,
+                due_date=d.due_date,
+                is_open=d.status not in ("closed", "cancelled"),
+                created_at=d.created_at,
+            )
+            for d in defects
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('defects', '0006_defect_priority_rank'),
+        ('projects', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DefectListRow',
+            fields=[
+                ('defect', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='list_row', serialize=False, to='defects.defect', verbose_name='Дефект')),
+                ('title', models.CharField(max_length=200, verbose_name='Заголовок')),
+                ('project_name', models.CharField(max_length=200, verbose_name='Объект')),
+                ('stage_name', models.CharField(blank=True, max_length=200, verbose_name='Этап')),
+                ('status', models.CharField(choices=[('new', 'Новая'), ('in_progress', 'В работе'), ('in_review', 'На проверке'), ('closed', 'Закрыта'), ('cancelled', 'Отменена')], max_length=20, verbose_name='Статус')),
+                ('status_label', models.CharField(max_length=50)),
+                ('priority', models.CharField(choices=[('low', 'Низкий'), ('medium', 'Средний'), ('high', 'Высокий'), ('critical', 'Критический')], max_length=20, verbose_name='Приоритет')),
+                ('priority_label', models.CharField(max_length=50)),
+                ('priority_rank', models.PositiveSmallIntegerField(verbose_name='Серьёзность')),
+                ('assignee_name', models.CharField(blank=True, max_length=150, verbose_name='Исполнитель')),
+                ('due_date', models.DateField(blank=True, null=True, verbose_name='Срок устранения')),
+                ('is_open', models.BooleanField(verbose_name='Открыт')),
+                ('created_at', models.DateTimeField(verbose_name='Создано')),
+                ('assignee', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('created_by', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('project', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='projects.project')),
+                ('stage', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='projects.stage')),
+            ],
+            options={
+                'verbose_name': 'Строка списка дефектов',
+                'verbose_name_plural': 'Строки списка дефектов',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['-created_at'], name='dlr_created'), models.Index(fields=['due_date'], name='dlr_due'), models.Index(fields=['project', 'status', '-created_at'], name='dlr_proj_status_created'), models.Index(fields=['status', 'due_date'], name='dlr_status_due'), models.Index(fields=['status', '-created_at'], name='dlr_status_created'), models.Index(fields=['priority', '-created_at'], name='dlr_priority_created'), models.Index(fields=['priority_rank'], name='dlr_priority_rank'), models.Index(fields=['status', 'priority_rank'], name='dlr_status_rank'), models.Index(fields=['assignee', 'status', '-created_at'], name='dlr_assignee_status_created'), models.Index(fields=['created_by', '-created_at'], name='dlr_author_created')],
+            },
+        ),
+        migrations.RunPython(fill_list_rows, migrations.RunPython.noop),
+    ]
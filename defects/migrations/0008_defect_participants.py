@@ -0,0 +1,47 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_participants(apps, schema_editor):
+    Defect = apps.get_model("defects", "Defect")
+    DefectParticipant = apps.get_model("defects", "DefectParticipant")
+    batch = []
+    rows = Defect.objects.values_list("pk", "created_by_id", "assignee_id").iterator(chunk_size=1000)
+    for pk, author_id, assignee_id in rows:
+        batch.append(DefectParticipant(defect_id=pk, user_id=author_id, role="author"))
+        if assignee_id:
+            batch.append(DefectParticipant(defect_id=pk, user_id=assignee_id, role="assignee"))
+        if len(batch) >= 1000:
+            DefectParticipant.objects.bulk_create(batch)
+            batch = []
+    DefectParticipant.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('defects', '0007_defect_list_rows'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DefectParticipant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('author', 'Автор'), ('assignee', 'Исполнитель')], max_length=20, verbose_name='Роль')),
+                ('defect', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='participants', to='defects.defect', verbose_name='Дефект')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Участник дефекта',
+                'verbose_name_plural': 'Участники дефектов',
+                'indexes': [models.Index(fields=['user', 'defect'], name='participant_user_defect')],
+                'constraints': [models.UniqueConstraint(fields=('defect', 'user', 'role'), name='defectparticipant_unique')],
+            },
+        ),
+        migrations.RunPython(fill_participants, migrations.RunPython.noop),
+    ]
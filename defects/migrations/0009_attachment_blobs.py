@@ -0,0 +1,76 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:40
+
+import hashlib
+import mimetypes
+import os
+
+import defects.storage
+from django.db import migrations, models
+
+
+def move_to_blobs(apps, schema_editor):
+    """Перенести файлы из defects/<id>/<имя> в хранилище по хэшу; одинаковые — в один блоб."""
+    DefectAttachment = apps.get_model("defects", "DefectAttachment")
+    storage = defects.storage.attachment_storage
+    old_names = set()
+    for att in DefectAttachment.objects.iterator():
+        old_name = att.file.name
+        att.original_name = os.path.basename(old_name)[:255]
+        att.content_type = mimetypes.guess_type(att.original_name)[0] or "application/octet-stream"
+        if not storage.exists(old_name):
+            # Файл потерян ещё до миграции — оставляем запись как есть, хэш пустой.
+            att.save(update_fields=["original_name", "content_type"])
+            continue
+        digest = hashlib.sha256()
+        with storage.open(old_name, "rb") as fh:
+            for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+                digest.update(chunk)
+        name = defects.storage.blob_name(digest.hexdigest())
+        if not storage.exists(name):
+            with storage.open(old_name, "rb") as fh:
+                storage.save(name, fh)
+        att.file.name = name
+        att.sha256 = digest.hexdigest()
+        att.size = storage.size(name)
+        att.save(update_fields=["file", "sha256", "size", "original_name", "content_type"])
+        old_names.add(old_name)
+    for old_name in old_names:
+        storage.delete(old_name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('defects', '0008_defect_participants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='defectattachment',
+            name='content_type',
+            field=models.CharField(default='application/octet-stream', max_length=100, verbose_name='Тип'),
+        ),
+        migrations.AddField(
+            model_name='defectattachment',
+            name='original_name',
+            field=models.CharField(default='', max_length=255, verbose_name='Имя файла'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='defectattachment',
+            name='sha256',
+            field=models.CharField(db_index=True, default='', max_length=64, verbose_name='SHA-256'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='defectattachment',
+            name='size',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='Размер'),
+        ),
+        migrations.AlterField(
+            model_name='defectattachment',
+            name='file',
+            field=models.FileField(storage=defects.storage.get_attachment_storage, upload_to='', verbose_name='Файл'),
+        ),
+        migrations.RunPython(move_to_blobs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,132 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:21
+
+import defects.storage
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('defects', '0009_attachment_blobs'),
+        ('projects', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedDefect',
+            fields=[
+                ('defect_id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='Дефект')),
+                ('title', models.CharField(max_length=200, verbose_name='Заголовок')),
+                ('description', models.TextField(verbose_name='Описание')),
+                ('project_name', models.CharField(max_length=200, verbose_name='Объект')),
+                ('stage_name', models.CharField(blank=True, max_length=200, verbose_name='Этап')),
+                ('status', models.CharField(choices=[('new', 'Новая'), ('in_progress', 'В работе'), ('in_review', 'На проверке'), ('closed', 'Закрыта'), ('cancelled', 'Отменена')], max_length=20, verbose_name='Статус')),
+                ('status_label', models.CharField(max_length=50)),
+                ('priority', models.CharField(choices=[('low', 'Низкий'), ('medium', 'Средний'), ('high', 'Высокий'), ('critical', 'Критический')], max_length=20, verbose_name='Приоритет')),
+                ('priority_label', models.CharField(max_length=50)),
+                ('priority_rank', models.PositiveSmallIntegerField(verbose_name='Серьёзность')),
+                ('assignee_name', models.CharField(blank=True, max_length=150, verbose_name='Исполнитель')),
+                ('due_date', models.DateField(blank=True, null=True, verbose_name='Срок устранения')),
+                ('is_open', models.BooleanField(default=False, verbose_name='Открыт')),
+                ('created_at', models.DateTimeField(verbose_name='Создано')),
+                ('updated_at', models.DateTimeField(verbose_name='Обновлено')),
+                ('archived_at', models.DateTimeField(verbose_name='В архиве с')),
+                ('assignee', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('created_by', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('project', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='projects.project', verbose_name='Объект')),
+                ('stage', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='projects.stage', verbose_name='Этап')),
+            ],
+            options={
+                'verbose_name': 'Архивный дефект',
+                'verbose_name_plural': 'Архив дефектов',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedDefectAttachment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('file', models.FileField(storage=defects.storage.get_attachment_storage, upload_to='', verbose_name='Файл')),
+                ('sha256', models.CharField(db_index=True, max_length=64, verbose_name='SHA-256')),
+                ('size', models.PositiveBigIntegerField(default=0, verbose_name='Размер')),
+                ('content_type', models.CharField(default='application/octet-stream', max_length=100, verbose_name='Тип')),
+                ('original_name', models.CharField(max_length=255, verbose_name='Имя файла')),
+                ('created_at', models.DateTimeField(verbose_name='Загружен')),
+                ('defect', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attachments', to='defects.archiveddefect', verbose_name='Дефект')),
+                ('uploaded_by', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Загрузил')),
+            ],
+            options={
+                'verbose_name': 'Архивное вложение',
+                'verbose_name_plural': 'Архивные вложения',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedDefectComment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('body', models.TextField(verbose_name='Комментарий')),
+                ('created_at', models.DateTimeField(verbose_name='Создан')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('defect', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='defects.archiveddefect', verbose_name='Дефект')),
+            ],
+            options={
+                'verbose_name': 'Архивный комментарий',
+                'verbose_name_plural': 'Архивные комментарии',
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedDefectHistory',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('action', models.CharField(max_length=200, verbose_name='Действие')),
+                ('from_status', models.CharField(blank=True, choices=[('new', 'Новая'), ('in_progress', 'В работе'), ('in_review', 'На проверке'), ('closed', 'Закрыта'), ('cancelled', 'Отменена')], max_length=20, null=True)),
+                ('to_status', models.CharField(blank=True, choices=[('new', 'Новая'), ('in_progress', 'В работе'), ('in_review', 'На проверке'), ('closed', 'Закрыта'), ('cancelled', 'Отменена')], max_length=20, null=True)),
+                ('changes', models.JSONField(blank=True, null=True, verbose_name='Изменения')),
+                ('created_at', models.DateTimeField(verbose_name='Время')),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('defect', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='history', to='defects.archiveddefect', verbose_name='Дефект')),
+            ],
+            options={
+                'verbose_name': 'Архивная история дефекта',
+                'verbose_name_plural': 'Архивная история дефектов',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archiveddefect',
+            index=models.Index(fields=['-created_at'], name='arch_created'),
+        ),
+        migrations.AddIndex(
+            model_name='archiveddefect',
+            index=models.Index(fields=['due_date'], name='arch_due'),
+        ),
+        migrations.AddIndex(
+            model_name='archiveddefect',
+            index=models.Index(fields=['project', 'status', '-created_at'], name='arch_proj_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='archiveddefect',
+            index=models.Index(fields=['status', '-created_at'], name='arch_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='archiveddefect',
+            index=models.Index(fields=['priority', '-created_at'], name='arch_priority_created'),
+        ),
+        migrations.AddIndex(
+            model_name='archiveddefect',
+            index=models.Index(fields=['priority_rank'], name='arch_priority_rank'),
+        ),
+        migrations.AddIndex(
+            model_name='archiveddefect',
+            index=models.Index(fields=['assignee', '-created_at'], name='arch_assignee_created'),
+        ),
+        migrations.AddIndex(
+            model_name='archiveddefect',
+            index=models.Index(fields=['created_by', '-created_at'], name='arch_author_created'),
+        ),
+    ]
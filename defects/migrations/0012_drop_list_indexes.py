@@ -0,0 +1,53 @@
+# Generated by Django 5.1.4 on 2026-10-18 14:06
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('defects', '0011_import_jobs'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='defect',
+            name='defect_created',
+        ),
+        migrations.RemoveIndex(
+            model_name='defect',
+            name='defect_due',
+        ),
+        migrations.RemoveIndex(
+            model_name='defect',
+            name='defect_proj_status_created',
+        ),
+        migrations.RemoveIndex(
+            model_name='defect',
+            name='defect_status_due',
+        ),
+        migrations.RemoveIndex(
+            model_name='defect',
+            name='defect_status_created',
+        ),
+        migrations.RemoveIndex(
+            model_name='defect',
+            name='defect_priority_created',
+        ),
+        migrations.RemoveIndex(
+            model_name='defect',
+            name='defect_assignee_status_created',
+        ),
+        migrations.RemoveIndex(
+            model_name='defect',
+            name='defect_author_created',
+        ),
+        migrations.RemoveIndex(
+            model_name='defect',
+            name='defect_priority_rank',
+        ),
+        migrations.RemoveIndex(
+            model_name='defect',
+            name='defect_status_rank',
+        ),
+    ]
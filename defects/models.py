@@ -1,11 +1,17 @@
 from __future__ import annotations
 
+import mimetypes
+import os
+
 from django.conf import settings
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 from projects.models import Project, Stage
 
+from .storage import blob_digest, get_attachment_storage
+
 
 class DefectPriority(models.TextChoices):
     LOW = "low", "Низкий"
@@ -14,6 +20,15 @@ class DefectPriority(models.TextChoices):
     CRITICAL = "critical", "Критический"
 
 
+# Порядок серьёзности для сортировки: строковые значения сортируются по алфавиту.
+PRIORITY_RANKS: dict[str, int] = {
+    DefectPriority.LOW: 1,
+    DefectPriority.MEDIUM: 2,
+    DefectPriority.HIGH: 3,
+    DefectPriority.CRITICAL: 4,
+}
+
+
 class DefectStatus(models.TextChoices):
     NEW = "new", "Новая"
     IN_PROGRESS = "in_progress", "В работе"
@@ -22,6 +37,21 @@ class DefectStatus(models.TextChoices):
     CANCELLED = "cancelled", "Отменена"
 
 
+# Статусы, в которых дефект считается закрытым (не может быть просрочен).
+CLOSED_STATUSES = (DefectStatus.CLOSED, DefectStatus.CANCELLED)
+# Явный список открытых статусов: IN по (status, due_date) идёт по индексу, NOT IN — нет.
+OPEN_STATUSES = tuple(s for s in DefectStatus if s not in CLOSED_STATUSES)
+
+
+def overdue_q(today=None) -> models.Q:
+    """Условие «просрочен»: срок прошёл, дефект не закрыт и не отменён."""
+    return models.Q(status__in=OPEN_STATUSES, due_date__lt=today or timezone.localdate())
+
+
+# Поля ключа DefectCounter — в порядке defects.services.CounterKey.
+COUNTER_FIELDS = ("project_id", "stage_id", "status", "priority")
+
+
 class Defect(models.Model):
     project = models.ForeignKey(Project, on_delete=models.PROTECT, related_name="defects", verbose_name="Объект")
     stage = models.ForeignKey(
@@ -40,6 +70,12 @@ class Defect(models.Model):
         default=DefectPriority.MEDIUM,
         verbose_name="Приоритет",
     )
+    # Числовая серьёзность приоритета (PRIORITY_RANKS), заполняется в save().
+    priority_rank = models.PositiveSmallIntegerField(
+        default=PRIORITY_RANKS[DefectPriority.MEDIUM],
+        editable=False,
+        verbose_name="Серьёзность",
+    )
     status = models.CharField(
         max_length=20,
         choices=DefectStatus.choices,
@@ -68,12 +104,46 @@ class Defect(models.Model):
         verbose_name = "Дефект"
         verbose_name_plural = "Дефекты"
         ordering = ["-created_at"]
+        # Список, фильтры и выгрузки читают DefectListRow со своими индексами (см. команду
+        # check_defect_query_plans); лишние индексы дефекта только замедляли бы запись и импорт.
+        indexes = [
+            # Кандидаты в архив: не менялись с даты отсечки (defects/archive.py).
+            models.Index(fields=["updated_at"], name="defect_updated"),
+        ]
 
     def __str__(self) -> str:
         return f"#{self.id} {self.title}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_counter_key()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        # Догрузка отложенного поля (fields) не перечитывает уже изменённые в памяти значения.
+        if fields is None:
+            self._remember_counter_key()
+
+    def _remember_counter_key(self) -> None:
+        # Ключ счётчика в БД: по нему сигнал сохранения узнаёт, из какого счётчика убрать дефект.
+        # Для частично загруженного дефекта (only()) ключ прочитает сам сигнал.
+        loaded = self.__dict__
+        if all(name in loaded for name in COUNTER_FIELDS):
+            self._saved_counter_key = tuple(loaded[name] for name in COUNTER_FIELDS)
+        else:
+            self.__dict__.pop("_saved_counter_key", None)
+
+    def save(self, *args, **kwargs):
+        self.priority_rank = PRIORITY_RANKS.get(self.priority, self.priority_rank)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "priority" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "priority_rank"}
+        super().save(*args, **kwargs)
+
     def is_overdue(self) -> bool:
-        return bool(self.due_date) and self.status not in (DefectStatus.CLOSED, DefectStatus.CANCELLED) and (
+        return bool(self.due_date) and self.status not in CLOSED_STATUSES and (
             self.due_date < timezone.localdate()
         )
 
@@ -101,13 +171,19 @@ class DefectComment(models.Model):
 
 
 def defect_attachment_path(instance: "DefectAttachment", filename: str) -> str:
+    # Прежняя раскладка файлов; нужна старым миграциям.
     return f"defects/{instance.defect_id}/{filename}"
 
 
 class DefectAttachment(models.Model):
     defect = models.ForeignKey(Defect, on_delete=models.CASCADE, related_name="attachments", verbose_name="Дефект")
     uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, verbose_name="Загрузил")
-    file = models.FileField(upload_to=defect_attachment_path, verbose_name="Файл")
+    # Имя в хранилище — хэш содержимого (defects/storage.py); один файл на все одинаковые загрузки.
+    file = models.FileField(storage=get_attachment_storage, verbose_name="Файл")
+    sha256 = models.CharField(max_length=64, db_index=True, verbose_name="SHA-256")
+    size = models.PositiveBigIntegerField(default=0, verbose_name="Размер")
+    content_type = models.CharField(max_length=100, default="application/octet-stream", verbose_name="Тип")
+    original_name = models.CharField(max_length=255, verbose_name="Имя файла")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Загружен")
 
     class Meta:
@@ -115,6 +191,21 @@ class DefectAttachment(models.Model):
         verbose_name_plural = "Вложения"
         ordering = ["-created_at"]
 
+    def __str__(self) -> str:
+        return self.original_name
+
+    def save(self, *args, **kwargs):
+        upload = self.file
+        if upload and not upload._committed:
+            # Размер, тип и хэш — при загрузке, чтобы списки вложений не обращались к файловой системе.
+            # Тип — по расширению: заявленный браузером content_type не проверяется.
+            self.original_name = self.original_name or os.path.basename(upload.name)[:255]
+            self.size = upload.size
+            self.content_type = mimetypes.guess_type(self.original_name)[0] or "application/octet-stream"
+            upload.save(upload.name, upload.file, save=False)
+            self.sha256 = blob_digest(upload.name)
+        super().save(*args, **kwargs)
+
 
 class DefectHistory(models.Model):
     defect = models.ForeignKey(Defect, on_delete=models.CASCADE, related_name="history", verbose_name="Дефект")
@@ -137,3 +228,267 @@ class DefectHistory(models.Model):
         ordering = ["-created_at"]
 
 
+class DefectCounter(models.Model):
+    """Счётчик дефектов по (объект, этап, статус, приоритет) для аналитики без сканирования дефектов.
+
+    Обновляется сигналом сохранения/удаления дефекта (``defects.signals``), массовые операции
+    без сигналов вызывают ``defects.services.bump_counters`` сами; пересобирается командой
+    ``rebuild_defect_counters``.
+    """
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="+", verbose_name="Объект")
+    stage = models.ForeignKey(Stage, on_delete=models.CASCADE, related_name="+", null=True, blank=True, verbose_name="Этап")
+    status = models.CharField(max_length=20, choices=DefectStatus.choices, verbose_name="Статус")
+    priority = models.CharField(max_length=20, choices=DefectPriority.choices, verbose_name="Приоритет")
+    count = models.IntegerField(default=0, verbose_name="Количество")
+
+    class Meta:
+        verbose_name = "Счётчик дефектов"
+        verbose_name_plural = "Счётчики дефектов"
+        constraints = [
+            # Этап может быть пустым, а NULL в уникальном индексе не совпадает сам с собой.
+            models.UniqueConstraint(
+                "project", Coalesce("stage", 0), "status", "priority", name="defectcounter_unique_key"
+            ),
+        ]
+
+
+class DefectListRow(models.Model):
+    """Плоская строка списка дефектов: всё, что показывают список и выгрузки, без JOIN-ов.
+
+    Обновляется в транзакции изменения дефекта и при переименовании объекта, этапа или
+    пользователя (``defects/signals.py``); пересобирается командой ``rebuild_defect_list_rows``.
+    """
+
+    defect = models.OneToOneField(
+        Defect, on_delete=models.CASCADE, primary_key=True, related_name="list_row", verbose_name="Дефект"
+    )
+    title = models.CharField(max_length=200, verbose_name="Заголовок")
+    # Индексы по project/assignee/created_by — составные ниже, отдельные не нужны.
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="+", db_index=False)
+    project_name = models.CharField(max_length=200, verbose_name="Объект")
+    stage = models.ForeignKey(Stage, on_delete=models.CASCADE, related_name="+", null=True, blank=True)
+    stage_name = models.CharField(max_length=200, blank=True, verbose_name="Этап")
+    status = models.CharField(max_length=20, choices=DefectStatus.choices, verbose_name="Статус")
+    status_label = models.CharField(max_length=50)
+    priority = models.CharField(max_length=20, choices=DefectPriority.choices, verbose_name="Приоритет")
+    priority_label = models.CharField(max_length=50)
+    priority_rank = models.PositiveSmallIntegerField(verbose_name="Серьёзность")
+    assignee = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+", null=True, blank=True, db_index=False
+    )
+    assignee_name = models.CharField(max_length=150, blank=True, verbose_name="Исполнитель")
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+", db_index=False)
+    due_date = models.DateField(null=True, blank=True, verbose_name="Срок устранения")
+    # Просрочка зависит от текущей даты, поэтому хранится только «открыт ли дефект».
+    is_open = models.BooleanField(verbose_name="Открыт")
+    created_at = models.DateTimeField(verbose_name="Создано")
+
+    class Meta:
+        verbose_name = "Строка списка дефектов"
+        verbose_name_plural = "Строки списка дефектов"
+        ordering = ["-created_at"]
+        # Те же индексы, что у Defect: фильтры и сортировки списка работают по этой таблице.
+        indexes = [
+            models.Index(fields=["-created_at"], name="dlr_created"),
+            models.Index(fields=["due_date"], name="dlr_due"),
+            models.Index(fields=["project", "status", "-created_at"], name="dlr_proj_status_created"),
+            models.Index(fields=["status", "due_date"], name="dlr_status_due"),
+            models.Index(fields=["status", "-created_at"], name="dlr_status_created"),
+            models.Index(fields=["priority", "-created_at"], name="dlr_priority_created"),
+            models.Index(fields=["priority_rank"], name="dlr_priority_rank"),
+            models.Index(fields=["status", "priority_rank"], name="dlr_status_rank"),
+            models.Index(fields=["assignee", "status", "-created_at"], name="dlr_assignee_status_created"),
+            models.Index(fields=["created_by", "-created_at"], name="dlr_author_created"),
+        ]
+
+    # Строки списка бывают и из архива (ArchivedDefect) — шаблон ведёт их на архивную карточку.
+    archived = False
+
+    def __str__(self) -> str:
+        return f"#{self.defect_id} {self.title}"
+
+    def is_overdue(self) -> bool:
+        return self.is_open and bool(self.due_date) and self.due_date < timezone.localdate()
+
+
+class ParticipantRole(models.TextChoices):
+    AUTHOR = "author", "Автор"
+    ASSIGNEE = "assignee", "Исполнитель"
+
+
+class DefectParticipant(models.Model):
+    """Связь дефекта с пользователем (автор, исполнитель).
+
+    «Мои дефекты» инженера — одна выборка по индексу (user, defect) вместо OR по двум
+    внешним ключам. Ведётся сигналом сохранения дефекта (``defects/signals.py``).
+    """
+
+    # Отдельные индексы по FK не нужны: их покрывают уникальный ключ и (user, defect).
+    defect = models.ForeignKey(
+        Defect, on_delete=models.CASCADE, related_name="participants", db_index=False, verbose_name="Дефект"
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+", db_index=False, verbose_name="Пользователь"
+    )
+    role = models.CharField(max_length=20, choices=ParticipantRole.choices, verbose_name="Роль")
+
+    class Meta:
+        verbose_name = "Участник дефекта"
+        verbose_name_plural = "Участники дефектов"
+        constraints = [
+            models.UniqueConstraint(fields=["defect", "user", "role"], name="defectparticipant_unique"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "defect"], name="participant_user_defect"),
+        ]
+
+
+class ArchivedDefect(models.Model):
+    """Закрытый или отменённый дефект, перенесённый из рабочих таблиц командой ``archive_defects``.
+
+    Колонки — как у ``DefectListRow`` (список, поиск и выгрузки читают архив теми же запросами)
+    плюс описание. id дефекта, комментариев, истории и вложений сохраняются: строки
+    полнотекстового индекса и ссылки остаются действительными.
+    """
+
+    defect_id = models.BigIntegerField(primary_key=True, verbose_name="Дефект")
+    title = models.CharField(max_length=200, verbose_name="Заголовок")
+    description = models.TextField(verbose_name="Описание")
+    project = models.ForeignKey(Project, on_delete=models.PROTECT, related_name="+", db_index=False, verbose_name="Объект")
+    project_name = models.CharField(max_length=200, verbose_name="Объект")
+    stage = models.ForeignKey(Stage, on_delete=models.PROTECT, related_name="+", null=True, blank=True, verbose_name="Этап")
+    stage_name = models.CharField(max_length=200, blank=True, verbose_name="Этап")
+    status = models.CharField(max_length=20, choices=DefectStatus.choices, verbose_name="Статус")
+    status_label = models.CharField(max_length=50)
+    priority = models.CharField(max_length=20, choices=DefectPriority.choices, verbose_name="Приоритет")
+    priority_label = models.CharField(max_length=50)
+    priority_rank = models.PositiveSmallIntegerField(verbose_name="Серьёзность")
+    assignee = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name="+", null=True, blank=True, db_index=False
+    )
+    assignee_name = models.CharField(max_length=150, blank=True, verbose_name="Исполнитель")
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name="+", db_index=False)
+    due_date = models.DateField(null=True, blank=True, verbose_name="Срок устранения")
+    # Всегда False: в архив попадают только закрытые и отменённые; поле — для общих запросов со списком.
+    is_open = models.BooleanField(default=False, verbose_name="Открыт")
+    created_at = models.DateTimeField(verbose_name="Создано")
+    updated_at = models.DateTimeField(verbose_name="Обновлено")
+    archived_at = models.DateTimeField(verbose_name="В архиве с")
+
+    class Meta:
+        verbose_name = "Архивный дефект"
+        verbose_name_plural = "Архив дефектов"
+        ordering = ["-created_at"]
+        # Фильтры и сортировки списка с архивом — по индексу, как у DefectListRow (статус тут только закрытый).
+        indexes = [
+            models.Index(fields=["-created_at"], name="arch_created"),
+            models.Index(fields=["due_date"], name="arch_due"),
+            models.Index(fields=["project", "status", "-created_at"], name="arch_proj_status_created"),
+            models.Index(fields=["status", "-created_at"], name="arch_status_created"),
+            models.Index(fields=["priority", "-created_at"], name="arch_priority_created"),
+            models.Index(fields=["priority_rank"], name="arch_priority_rank"),
+            models.Index(fields=["assignee", "-created_at"], name="arch_assignee_created"),
+            models.Index(fields=["created_by", "-created_at"], name="arch_author_created"),
+        ]
+
+    archived = True
+
+    def __str__(self) -> str:
+        return f"#{self.defect_id} {self.title}"
+
+    def is_overdue(self) -> bool:
+        return False
+
+
+class ArchivedDefectComment(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    defect = models.ForeignKey(ArchivedDefect, on_delete=models.CASCADE, related_name="comments", verbose_name="Дефект")
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name="+", verbose_name="Автор")
+    body = models.TextField(verbose_name="Комментарий")
+    created_at = models.DateTimeField(verbose_name="Создан")
+
+    class Meta:
+        verbose_name = "Архивный комментарий"
+        verbose_name_plural = "Архивные комментарии"
+        ordering = ["created_at"]
+
+
+class ArchivedDefectHistory(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    defect = models.ForeignKey(ArchivedDefect, on_delete=models.CASCADE, related_name="history", verbose_name="Дефект")
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name="+", null=True, blank=True, verbose_name="Пользователь"
+    )
+    action = models.CharField(max_length=200, verbose_name="Действие")
+    from_status = models.CharField(max_length=20, choices=DefectStatus.choices, null=True, blank=True)
+    to_status = models.CharField(max_length=20, choices=DefectStatus.choices, null=True, blank=True)
+    changes = models.JSONField(null=True, blank=True, verbose_name="Изменения")
+    created_at = models.DateTimeField(verbose_name="Время")
+
+    class Meta:
+        verbose_name = "Архивная история дефекта"
+        verbose_name_plural = "Архивная история дефектов"
+        ordering = ["-created_at"]
+
+
+class ArchivedDefectAttachment(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    defect = models.ForeignKey(ArchivedDefect, on_delete=models.CASCADE, related_name="attachments", verbose_name="Дефект")
+    uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name="+", verbose_name="Загрузил")
+    # Тот же блоб, что у исходного вложения: пока на него ссылается архив, сборщик мусора его не удалит.
+    file = models.FileField(storage=get_attachment_storage, verbose_name="Файл")
+    sha256 = models.CharField(max_length=64, db_index=True, verbose_name="SHA-256")
+    size = models.PositiveBigIntegerField(default=0, verbose_name="Размер")
+    content_type = models.CharField(max_length=100, default="application/octet-stream", verbose_name="Тип")
+    original_name = models.CharField(max_length=255, verbose_name="Имя файла")
+    created_at = models.DateTimeField(verbose_name="Загружен")
+
+    class Meta:
+        verbose_name = "Архивное вложение"
+        verbose_name_plural = "Архивные вложения"
+        ordering = ["-created_at"]
+
+    def __str__(self) -> str:
+        return self.original_name
+
+
+class ImportJobStatus(models.TextChoices):
+    PENDING = "pending", "В очереди"
+    RUNNING = "running", "Выполняется"
+    DONE = "done", "Готово"
+    FAILED = "failed", "Ошибка"
+
+
+class ImportJob(models.Model):
+    """Загруженный файл импорта: строки сохраняет воркер ``run_import_jobs``, а не веб-запрос."""
+
+    uploaded_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="import_jobs", verbose_name="Загрузил"
+    )
+    file = models.FileField(upload_to="imports/", blank=True, verbose_name="Файл")
+    original_name = models.CharField(max_length=255, verbose_name="Имя файла")
+    status = models.CharField(
+        max_length=20, choices=ImportJobStatus.choices, default=ImportJobStatus.PENDING, verbose_name="Статус"
+    )
+    rows_created = models.PositiveIntegerField(default=0, verbose_name="Создано дефектов")
+    error_count = models.PositiveIntegerField(default=0, verbose_name="Ошибок в строках")
+    # Первые ошибки строк: [[номер строки, текст], ...]; полный список выводит команда import_defects.
+    errors = models.JSONField(default=list, blank=True, verbose_name="Ошибки строк")
+    error = models.TextField(blank=True, verbose_name="Ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Начато")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Завершено")
+
+    class Meta:
+        verbose_name = "Задание импорта"
+        verbose_name_plural = "Задания импорта"
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["status", "created_at"], name="importjob_queue")]
+
+    def __str__(self) -> str:
+        return f"Импорт #{self.id} ({self.original_name}, {self.get_status_display()})"
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (ImportJobStatus.DONE, ImportJobStatus.FAILED)
@@ -0,0 +1,177 @@
+"""Keyset-пагинация (по курсору) для списка дефектов.
+
+Страница выбирается условием ``(поле сортировки, id) > (значение, id)`` по индексу, без
+``COUNT(*)`` и ``OFFSET`` — стоимость страницы не зависит от её номера. Курсор — подписанный
+непрозрачный токен с ключом последней/первой строки страницы и сортировкой, для которой он
+выдан; курсор другой сортировки (или с неподходящим значением) открывает первую страницу.
+
+NULL считается меньше любого значения (как в индексах SQLite): при сортировке по
+возрастанию строки без значения идут первыми, по убыванию — последними.
+
+Выборок может быть несколько (рабочие и архивные строки): каждая читается своим диапазоном
+по индексу, страница — слияние их первых строк. id в выборках не должны пересекаться.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any
+
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q, QuerySet
+
+PAGE_SIZE = 25
+
+_SALT = "defects.pagination"
+
+
+@dataclass
+class KeysetPage:
+    object_list: list = field(default_factory=list)
+    has_next: bool = False
+    has_previous: bool = False
+    next_cursor: str = ""
+    previous_cursor: str = ""
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self) -> int:
+        return len(self.object_list)
+
+
+def _encode(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+def make_cursor(value: Any, pk: int, backwards: bool = False, ordering: str = "") -> str:
+    return signing.dumps({"v": _encode(value), "id": pk, "b": backwards, "s": ordering}, salt=_SALT, compress=True)
+
+
+def read_cursor(token: str, ordering: str = "") -> tuple[Any, int, bool] | None:
+    """Ключ из курсора; None — курсор испорчен или выдан для другой сортировки."""
+    try:
+        data = signing.loads(token, salt=_SALT)
+        if data.get("s", "") != ordering:
+            return None
+        return data["v"], int(data["id"]), bool(data["b"])
+    except (signing.BadSignature, AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+class KeysetPaginator:
+    def __init__(self, qs: QuerySet | list[QuerySet], ordering: str, per_page: int = PAGE_SIZE):
+        self.sources = list(qs) if isinstance(qs, (list, tuple)) else [qs]
+        self.qs = self.sources[0]
+        self.ordering = ordering
+        self.desc = ordering.startswith("-")
+        self.field = ordering.lstrip("-")
+        self.per_page = per_page
+        try:
+            self.model_field = self.qs.model._meta.get_field(self.field)
+        except FieldDoesNotExist:
+            # Аннотация (например, search_rank) — NULL не бывает.
+            self.model_field = None
+        self.nullable = self.model_field is not None and self.model_field.null
+
+    def _read_position(self, token: str) -> tuple[Any, int, bool] | None:
+        cursor = read_cursor(token, self.ordering)
+        if cursor is None:
+            return None
+        value, pk, backwards = cursor
+        try:
+            if self.model_field is not None:
+                value = self.model_field.to_python(value)
+            elif not isinstance(value, (int, float)):
+                return None
+        except ValidationError:
+            return None
+        return value, pk, backwards
+
+    def _order(self, desc: bool) -> list:
+        expr = F(self.field)
+        if self.nullable:
+            # NULL — наименьшее значение в обоих направлениях (совпадает с порядком в индексе SQLite).
+            ordering = expr.desc(nulls_last=True) if desc else expr.asc(nulls_first=True)
+        else:
+            ordering = expr.desc() if desc else expr.asc()
+        return [ordering, "-pk" if desc else "pk"]
+
+    def _segments(self, value: Any, pk: int, desc: bool) -> list[Q]:
+        """Условия для строк строго после (value, pk) в порядке сортировки ``desc``.
+
+        Строки с NULL и со значением лежат в разных концах индекса, поэтому переход между
+        ними — отдельный запрос, а не OR: каждый сегмент остаётся диапазоном по индексу.
+        """
+        f = self.field
+        op = "lt" if desc else "gt"
+        if value is None:
+            segments = [Q(**{f"{f}__isnull": True, f"pk__{op}": pk})]
+            if not desc:
+                segments.append(Q(**{f"{f}__isnull": False}))
+            return segments
+        # Первое условие даёт индексу границу диапазона, второе разрешает равные значения по id.
+        segments = [Q(**{f"{f}__{op}e": value}) & (Q(**{f"{f}__{op}": value}) | Q(**{f: value, f"pk__{op}": pk}))]
+        if desc and self.nullable:
+            segments.append(Q(**{f"{f}__isnull": True}))
+        return segments
+
+    def windows(self, position: tuple[Any, int] | None = None, backwards: bool = False) -> list[QuerySet]:
+        """Запросы страницы: строки после ``position`` (или перед ним, если ``backwards``)."""
+        desc = self.desc != backwards
+        conditions = [Q()] if position is None else self._segments(position[0], position[1], desc)
+        ordering = self._order(desc)
+        return [
+            source.filter(cond).order_by(*ordering)[: self.per_page + 1] for cond in conditions for source in self.sources
+        ]
+
+    def _key(self, obj) -> tuple:
+        value, pk = (obj[self.field], obj["pk"]) if isinstance(obj, dict) else (getattr(obj, self.field), obj.pk)
+        # NULL — наименьшее значение, как в _order().
+        return value is not None, value, pk
+
+    def _fetch(self, position: tuple[Any, int] | None, backwards: bool) -> list:
+        rows: list = []
+        windows = self.windows(position, backwards)
+        step = len(self.sources)
+        # Окна одного сегмента (по одному на выборку) сливаются в общем порядке сортировки.
+        for start in range(0, len(windows), step):
+            need = self.per_page + 1 - len(rows)
+            segment = [row for query in windows[start : start + step] for row in query[:need]]
+            if step > 1:
+                segment.sort(key=self._key, reverse=self.desc != backwards)
+            rows.extend(segment[:need])
+            if len(rows) > self.per_page:
+                break
+        return rows
+
+    def _cursor_for(self, obj, backwards: bool) -> str:
+        # Строки могут быть моделями или словарями из values() (в них должны быть поле сортировки и "pk").
+        if isinstance(obj, dict):
+            return make_cursor(obj[self.field], obj["pk"], backwards, self.ordering)
+        return make_cursor(getattr(obj, self.field), obj.pk, backwards, self.ordering)
+
+    def page(self, token: str | None) -> KeysetPage:
+        cursor = self._read_position(token) if token else None
+        if cursor is None:
+            backwards = False
+            rows = self._fetch(None, backwards)
+        else:
+            value, pk, backwards = cursor
+            rows = self._fetch((value, pk), backwards)
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, cursor is not None
+
+        page = KeysetPage(object_list=rows, has_next=has_next and bool(rows), has_previous=has_previous and bool(rows))
+        if page.has_next:
+            page.next_cursor = self._cursor_for(rows[-1], backwards=False)
+        if page.has_previous:
+            page.previous_cursor = self._cursor_for(rows[0], backwards=True)
+        return page
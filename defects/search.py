@@ -0,0 +1,186 @@
+"""Полнотекстовый поиск по дефектам.
+
+Один интерфейс, два движка:
+- SQLite — виртуальная таблица FTS5 ``defects_defect_fts`` (rowid = id дефекта), в которую
+  пишется текст, уже приведённый к основам русским стеммером (``defects.stemmer``);
+- PostgreSQL — таблица ``defects_defect_search`` с ``tsvector`` (конфигурация ``russian``) и GIN-индексом.
+
+В индекс попадают заголовок, описание и комментарии — рабочих и архивных дефектов (перенос
+в архив сохраняет id, строки индекса остаются). Индекс обновляется сигналами
+(``defects/signals.py``), полностью пересобирается командой ``rebuild_search_index``.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from collections.abc import Iterable
+
+from django.db import connection as default_connection
+from django.db import connections
+from django.db.models import FloatField, QuerySet
+from django.db.models.expressions import RawSQL
+
+from .stemmer import tokenize, words
+
+FTS_TABLE = "defects_defect_fts"
+PG_TABLE = "defects_defect_search"
+
+# Вес заголовка относительно описания/комментариев при ранжировании.
+TITLE_WEIGHT = 10.0
+
+# Сколько документов записывать в tsvector-таблицу одной командой.
+PG_DOCS_BATCH = 5000
+
+
+def create_index(connection) -> None:
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {PG_TABLE} (defect_id bigint PRIMARY KEY, document tsvector NOT NULL)"
+            )
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {PG_TABLE}_gin ON {PG_TABLE} USING gin (document)")
+        else:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                "USING fts5(title, body, tokenize='unicode61 remove_diacritics 2')"
+            )
+
+
+def drop_index(connection) -> None:
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {PG_TABLE if connection.vendor == 'postgresql' else FTS_TABLE}")
+
+
+def _in(column: str, ids: list[int] | None) -> tuple[str, list[int]]:
+    if ids is None:
+        return "", []
+    return f" WHERE {column} IN ({', '.join(['%s'] * len(ids))})", list(ids)
+
+
+# (таблица дефектов, её id, таблица комментариев): рабочие и архивные — id не пересекаются.
+_SOURCES = (
+    ("defects_defect", "id", "defects_defectcomment"),
+    ("defects_archiveddefect", "defect_id", "defects_archiveddefectcomment"),
+)
+
+
+def _documents(cursor, ids: list[int] | None) -> list[tuple[int, str, str]]:
+    docs = []
+    # Архив не меняется: точечная переиндексация (ids) читает только рабочие таблицы, пересборка — все.
+    # Миграции до 0010 пересобирают индекс, когда архивных таблиц ещё нет.
+    existing = set(cursor.db.introspection.table_names(cursor))
+    for defects_table, id_column, comments_table in _SOURCES if ids is None else _SOURCES[:1]:
+        if defects_table not in existing:
+            continue
+        where, params = _in(id_column, ids)
+        cursor.execute(f"SELECT {id_column}, title, description FROM {defects_table}{where}", params)
+        defects = cursor.fetchall()
+
+        comments: dict[int, list[str]] = defaultdict(list)
+        where, params = _in("defect_id", ids)
+        cursor.execute(f"SELECT defect_id, body FROM {comments_table}{where} ORDER BY id", params)
+        for defect_id, body in cursor.fetchall():
+            comments[defect_id].append(body)
+
+        docs.extend((pk, title, "\n".join([description, *comments[pk]])) for pk, title, description in defects)
+    return docs
+
+
+def _store(cursor, docs: list[tuple[int, str, str]], replace_ids: list[int] | None = None) -> None:
+    if cursor.db.vendor == "postgresql":
+        # Команда на пачку документов: массивы колонок через unnest вместо запроса на строку.
+        for start in range(0, len(docs), PG_DOCS_BATCH):
+            cursor.execute(
+                f"INSERT INTO {PG_TABLE} (defect_id, document) "
+                "SELECT id, setweight(to_tsvector('russian', title), 'A') || setweight(to_tsvector('russian', body), 'B') "
+                "FROM unnest(%s::bigint[], %s::text[], %s::text[]) AS doc (id, title, body) "
+                "ON CONFLICT (defect_id) DO UPDATE SET document = EXCLUDED.document",
+                [list(column) for column in zip(*docs[start : start + PG_DOCS_BATCH])],
+            )
+    else:
+        if replace_ids:
+            where, params = _in("rowid", replace_ids)
+            cursor.execute(f"DELETE FROM {FTS_TABLE}{where}", params)
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, body) VALUES (%s, %s, %s)",
+            [(pk, " ".join(tokenize(title)), " ".join(tokenize(body))) for pk, title, body in docs],
+        )
+
+
+def _write(connection, ids: list[int] | None) -> None:
+    with connection.cursor() as cursor:
+        _store(cursor, _documents(cursor, ids), ids)
+
+
+def index_defects(ids: Iterable[int], connection=None) -> None:
+    """Переиндексировать указанные дефекты (заголовок, описание, комментарии)."""
+    ids = list(ids)
+    if ids:
+        _write(connection or default_connection, ids)
+
+
+def index_new_defects(docs: list[tuple[int, str, str]], connection=None) -> None:
+    """Добавить в индекс только что созданные дефекты: (id, заголовок, описание).
+
+    Текст уже в памяти, комментариев ещё нет — таблицы дефектов не перечитываются.
+    """
+    if docs:
+        with (connection or default_connection).cursor() as cursor:
+            _store(cursor, docs)
+
+
+def remove_defects(ids: Iterable[int], connection=None) -> None:
+    ids = list(ids)
+    if not ids:
+        return
+    connection = connection or default_connection
+    table, column = (PG_TABLE, "defect_id") if connection.vendor == "postgresql" else (FTS_TABLE, "rowid")
+    where, params = _in(column, ids)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table}{where}", params)
+
+
+def rebuild_index(connection=None) -> None:
+    connection = connection or default_connection
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {PG_TABLE if connection.vendor == 'postgresql' else FTS_TABLE}")
+    _write(connection, None)
+
+
+# Оба движка ищут одинаково: каждое слово запроса — префикс основы, слова объединяются через AND.
+
+
+def _fts_query(q: str) -> str:
+    return " ".join(f'"{token}"*' for token in tokenize(q))
+
+
+def _tsquery(q: str) -> str:
+    # В словах нет операторов to_tsquery — экранировать нечего; основу выделяет русский стеммер
+    # PostgreSQL, :* — префиксное совпадение.
+    return " & ".join(f"{word}:*" for word in words(q))
+
+
+def search_defects(qs: QuerySet, q: str) -> QuerySet:
+    """Отфильтровать queryset по поисковому запросу и добавить аннотацию ``search_rank``.
+
+    Таблица индекса присоединяется к выборке один раз (по id дефекта): совпадение проверяется
+    одним MATCH/``@@``, ранг читается из той же строки индекса, а не подзапросом на каждую строку.
+    """
+    meta = qs.model._meta
+    row_id = f"{meta.db_table}.{meta.pk.column}"
+    if connections[qs.db].vendor == "postgresql":
+        query = _tsquery(q)
+        table, join = PG_TABLE, f"{PG_TABLE}.defect_id = {row_id}"
+        match = f"{PG_TABLE}.document @@ to_tsquery('russian', %s)"
+        rank, rank_params = f"ts_rank({PG_TABLE}.document, to_tsquery('russian', %s))", [query]
+    else:
+        query = _fts_query(q)
+        table, join = FTS_TABLE, f"{FTS_TABLE}.rowid = {row_id}"
+        match = f"{FTS_TABLE} MATCH %s"
+        # bm25() тем меньше, чем документ релевантнее — меняем знак.
+        rank, rank_params = f"-bm25({FTS_TABLE}, {TITLE_WEIGHT}, 1.0)", []
+    if not query:
+        return qs.none()
+    return qs.extra(tables=[table], where=[join, match], params=[query]).annotate(
+        search_rank=RawSQL(rank, rank_params, output_field=FloatField())
+    )
@@ -1,10 +1,29 @@
 from __future__ import annotations
 
+from collections.abc import Iterable, Iterator
 from typing import Any
 
-from django.db import transaction
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
 
-from .models import Defect, DefectHistory
+from accounts.models import UserRole
+from core import cache
+
+from .models import (
+    CLOSED_STATUSES,
+    COUNTER_FIELDS,
+    Defect,
+    DefectCounter,
+    DefectHistory,
+    DefectListRow,
+    DefectParticipant,
+    DefectPriority,
+    DefectStatus,
+    ParticipantRole,
+)
+
+CounterKey = tuple[int, int | None, str, str]
 
 
 @transaction.atomic
@@ -27,3 +46,337 @@ def log_defect_action(
     )
 
 
+def defect_snapshot(defect: Defect) -> dict[str, Any]:
+    """Поля, изменения которых пишутся в историю при редактировании."""
+    return {
+        "title": defect.title,
+        "description": defect.description,
+        "priority": defect.priority,
+        "assignee_id": defect.assignee_id,
+        "due_date": str(defect.due_date) if defect.due_date else None,
+    }
+
+
+def save_new_defect(defect: Defect, actor) -> None:
+    with transaction.atomic():
+        defect.save()
+        log_defect_action(defect=defect, actor=actor, action="Создан дефект", from_status=None, to_status=defect.status)
+
+
+def save_defect_changes(defect: Defect, old: dict[str, Any], actor) -> None:
+    """Сохранить отредактированный дефект; ``old`` — ``defect_snapshot`` до изменений."""
+    new = defect_snapshot(defect)
+    changes = {k: {"from": old[k], "to": new[k]} for k in old.keys() if old[k] != new[k]}
+    with transaction.atomic():
+        defect.save()
+        if changes:
+            log_defect_action(defect=defect, actor=actor, action="Изменены поля дефекта", changes=changes)
+
+
+def status_change_error(user, defect: Defect, new_status: str) -> str | None:
+    """Причина, по которой пользователь не может перевести дефект в ``new_status``, или None."""
+    if user.role == UserRole.ENGINEER and defect.assignee_id != user.id:
+        return "Инженер может менять статус только у назначенных ему дефектов."
+    if new_status not in defect.allowed_next_statuses():
+        return "Недопустимый переход статуса."
+    # Менеджер может закрывать/отменять. Инженер — только рабочие статусы.
+    if user.role != UserRole.MANAGER and new_status in CLOSED_STATUSES:
+        return "Недостаточно прав для закрытия/отмены."
+    return None
+
+
+def apply_status_change(defect: Defect, new_status: str, actor, comment: str = "") -> None:
+    from_status = defect.status
+    defect.status = new_status
+    with transaction.atomic():
+        defect.save(update_fields=["status", "updated_at"])
+        log_defect_action(defect=defect, actor=actor, action="Изменён статус", from_status=from_status, to_status=new_status)
+        if comment:
+            defect.comments.create(author=actor, body=comment)
+
+
+def counter_key(defect: Defect) -> CounterKey:
+    return tuple(getattr(defect, name) for name in COUNTER_FIELDS)
+
+
+# Строк счётчиков в одном upsert: по 5 параметров на строку — в пределах 999 параметров SQLite.
+COUNTERS_BATCH = 150
+
+
+def bump_counters(deltas: dict[CounterKey, int]) -> None:
+    """Изменить счётчики дефектов; вызывать внутри транзакции, в которой меняется дефект.
+
+    Один INSERT … ON CONFLICT на пачку ключей: недостающая строка счётчика создаётся, существующая
+    увеличивается в том же запросе — без гонки между UPDATE и INSERT у параллельных запросов.
+    """
+    rows = [(*key, delta) for key, delta in deltas.items() if delta]
+    table = DefectCounter._meta.db_table
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), COUNTERS_BATCH):
+            batch = rows[start : start + COUNTERS_BATCH]
+            cursor.execute(
+                f"INSERT INTO {table} (project_id, stage_id, status, priority, count) "
+                f"VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(batch))} "
+                # Цель конфликта — уникальный индекс defectcounter_unique_key (этап NULL -> 0).
+                "ON CONFLICT (project_id, COALESCE(stage_id, 0), status, priority) "
+                f"DO UPDATE SET count = {table}.count + excluded.count",
+                [value for row in batch for value in row],
+            )
+
+
+def move_counter(old: CounterKey | None, new: CounterKey | None) -> None:
+    deltas: dict[CounterKey, int] = {}
+    if old is not None:
+        deltas[old] = deltas.get(old, 0) - 1
+    if new is not None:
+        deltas[new] = deltas.get(new, 0) + 1
+    bump_counters(deltas)
+
+
+@transaction.atomic
+def rebuild_counters() -> int:
+    DefectCounter.objects.all().delete()
+    rows = (
+        Defect.objects.values("project_id", "stage_id", "status", "priority")
+        .annotate(cnt=Count("id"))
+        .order_by()
+    )
+    DefectCounter.objects.bulk_create(
+        DefectCounter(
+            project_id=r["project_id"], stage_id=r["stage_id"], status=r["status"], priority=r["priority"], count=r["cnt"]
+        )
+        for r in rows
+    )
+    return DefectCounter.objects.aggregate(total=Sum("count"))["total"] or 0
+
+
+# Сколько дефектов за раз переносить в DefectListRow при пересборке.
+LIST_ROWS_CHUNK = 1000
+
+_LIST_ROW_FIELDS = [f.name for f in DefectListRow._meta.concrete_fields if not f.primary_key]
+
+
+def build_list_row(
+    defect: Defect, *, project_name: str, stage_name: str, assignee_name: str, status_labels: dict, priority_labels: dict
+) -> DefectListRow:
+    return DefectListRow(
+        defect_id=defect.pk,
+        title=defect.title,
+        project_id=defect.project_id,
+        project_name=project_name,
+        stage_id=defect.stage_id,
+        stage_name=stage_name,
+        status=defect.status,
+        status_label=status_labels.get(defect.status, defect.status),
+        priority=defect.priority,
+        priority_label=priority_labels.get(defect.priority, defect.priority),
+        priority_rank=defect.priority_rank,
+        assignee_id=defect.assignee_id,
+        assignee_name=assignee_name,
+        created_by_id=defect.created_by_id,
+        due_date=defect.due_date,
+        is_open=defect.status not in CLOSED_STATUSES,
+        created_at=defect.created_at,
+    )
+
+
+def refresh_list_rows(ids: Iterable[int]) -> None:
+    """Пересобрать строки списка для указанных дефектов одним запросом чтения и одним upsert."""
+    ids = list(ids)
+    if not ids:
+        return
+    status_labels = dict(DefectStatus.choices)
+    priority_labels = dict(DefectPriority.choices)
+    defects = Defect.objects.filter(pk__in=ids).select_related("project", "stage", "assignee").only(
+        "title", "project_id", "project__name", "stage_id", "stage__name", "status", "priority",
+        "priority_rank", "assignee_id", "assignee__username", "created_by_id", "due_date", "created_at",
+    )
+    rows = [
+        build_list_row(
+            d,
+            project_name=d.project.name,
+            stage_name=d.stage.name if d.stage else "",
+            assignee_name=d.assignee.username if d.assignee else "",
+            status_labels=status_labels,
+            priority_labels=priority_labels,
+        )
+        for d in defects
+    ]
+    DefectListRow.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["defect"],
+        update_fields=_LIST_ROW_FIELDS,
+    )
+
+
+# Сколько id передавать в одном IN (...): вместе с остальными параметрами запроса — в пределах
+# 999 параметров, которые Django допускает для SQLite.
+SQL_IDS_BATCH = 900
+
+
+def ids_conditions(column: str, ids: list[int]) -> Iterator[tuple[str, list]]:
+    """Условие «``column`` из ``ids``» для сырого SQL — (SQL, параметры) на каждую пачку.
+
+    PostgreSQL получает весь список одним параметром-массивом: psycopg подставляет параметры
+    на клиенте, и тысячи ``%s`` в IN (...) раздувают текст запроса. SQLite — IN (...) по ``SQL_IDS_BATCH``.
+    """
+    if connection.vendor == "postgresql":
+        yield f"{column} = ANY(%s::bigint[])", [ids]
+        return
+    for start in range(0, len(ids), SQL_IDS_BATCH):
+        batch = ids[start : start + SQL_IDS_BATCH]
+        yield f"{column} IN ({', '.join(['%s'] * len(batch))})", batch
+
+
+def _labels_sql(column: str, labels: dict[str, str]) -> tuple[str, list[str]]:
+    whens = " ".join("WHEN %s THEN %s" for _ in labels)
+    return f"CASE {column} {whens} ELSE {column} END", [value for pair in labels.items() for value in pair]
+
+
+def insert_list_rows(ids: list[int]) -> None:
+    """Строки списка для только что созданных дефектов — INSERT … SELECT в самой БД.
+
+    Те же значения, что у ``build_list_row``, но без чтения дефектов в Python (массовый импорт).
+    Строк для этих id ещё быть не должно.
+    """
+    meta = Defect._meta
+    related = {name: meta.get_field(name).related_model._meta.db_table for name in ("project", "stage", "assignee")}
+    status_label, status_params = _labels_sql("d.status", dict(DefectStatus.choices))
+    priority_label, priority_params = _labels_sql("d.priority", dict(DefectPriority.choices))
+    closed = ", ".join(["%s"] * len(CLOSED_STATUSES))
+    with connection.cursor() as cursor:
+        for where, params in ids_conditions("d.id", ids):
+            cursor.execute(
+                f"INSERT INTO {DefectListRow._meta.db_table} (defect_id, title, project_id, project_name, stage_id, "
+                "stage_name, status, status_label, priority, priority_label, priority_rank, assignee_id, assignee_name, "
+                "created_by_id, due_date, is_open, created_at) "
+                "SELECT d.id, d.title, d.project_id, p.name, d.stage_id, COALESCE(s.name, ''), "
+                f"d.status, {status_label}, d.priority, {priority_label}, d.priority_rank, "
+                f"d.assignee_id, COALESCE(u.username, ''), d.created_by_id, d.due_date, d.status NOT IN ({closed}), d.created_at "
+                f"FROM {meta.db_table} d JOIN {related['project']} p ON p.id = d.project_id "
+                f"LEFT JOIN {related['stage']} s ON s.id = d.stage_id "
+                f"LEFT JOIN {related['assignee']} u ON u.id = d.assignee_id "
+                f"WHERE {where}",
+                [*status_params, *priority_params, *(s.value for s in CLOSED_STATUSES), *params],
+            )
+
+
+@transaction.atomic
+def rebuild_list_rows() -> int:
+    DefectListRow.objects.all().delete()
+    ids = list(Defect.objects.order_by("pk").values_list("pk", flat=True))
+    for start in range(0, len(ids), LIST_ROWS_CHUNK):
+        refresh_list_rows(ids[start : start + LIST_ROWS_CHUNK])
+    return len(ids)
+
+
+def _participants(defect: Defect) -> set[tuple[int, str]]:
+    pairs = {(defect.created_by_id, ParticipantRole.AUTHOR.value)}
+    if defect.assignee_id:
+        pairs.add((defect.assignee_id, ParticipantRole.ASSIGNEE.value))
+    return pairs
+
+
+def sync_participants(defect: Defect) -> None:
+    """Привести участников дефекта в соответствие с автором и исполнителем."""
+    wanted = _participants(defect)
+    current = set(DefectParticipant.objects.filter(defect_id=defect.pk).values_list("user_id", "role"))
+    for user_id, role in current - wanted:
+        DefectParticipant.objects.filter(defect_id=defect.pk, user_id=user_id, role=role).delete()
+    DefectParticipant.objects.bulk_create(
+        [DefectParticipant(defect_id=defect.pk, user_id=user_id, role=role) for user_id, role in wanted - current],
+        ignore_conflicts=True,
+    )
+
+
+@transaction.atomic
+def rebuild_participants() -> int:
+    DefectParticipant.objects.all().delete()
+    rows = Defect.objects.order_by().values_list("pk", "created_by_id", "assignee_id").iterator(chunk_size=LIST_ROWS_CHUNK)
+    batch: list[DefectParticipant] = []
+    total = 0
+    for pk, author_id, assignee_id in rows:
+        batch.append(DefectParticipant(defect_id=pk, user_id=author_id, role=ParticipantRole.AUTHOR))
+        if assignee_id:
+            batch.append(DefectParticipant(defect_id=pk, user_id=assignee_id, role=ParticipantRole.ASSIGNEE))
+        # Пишем порциями, чтобы не держать в памяти участников всех дефектов.
+        if len(batch) >= LIST_ROWS_CHUNK:
+            DefectParticipant.objects.bulk_create(batch)
+            total += len(batch)
+            batch = []
+    DefectParticipant.objects.bulk_create(batch)
+    return total + len(batch)
+
+
+# Сколько дефектов можно изменить одним массовым действием.
+BULK_LIMIT = 500
+
+
+def bulk_update_defects(ids: Iterable[int], *, actor, status: str = "", assignee=None) -> tuple[int, list[int]]:
+    """Массово сменить статус и/или исполнителя.
+
+    Переходы проверяются для всей выборки: если хоть один недопустим, ничего не меняется и
+    возвращаются id таких дефектов. Иначе — один UPDATE на изменение, история через
+    ``bulk_create``, счётчики, строки списка и участники — в одной транзакции.
+    Возвращает (число изменённых дефектов, id с недопустимым переходом).
+    """
+    with transaction.atomic():
+        defects = list(
+            Defect.objects.select_for_update()
+            .filter(pk__in=list(ids))
+            .only("pk", "project_id", "stage_id", "status", "priority", "assignee_id")
+        )
+        if status:
+            invalid = [d.pk for d in defects if d.status != status and status not in d.allowed_next_statuses()]
+            if invalid:
+                return 0, sorted(invalid)
+
+        now = timezone.now()
+        history: list[DefectHistory] = []
+        deltas: dict[CounterKey, int] = {}
+        changed: set[int] = set()
+
+        moving = [d for d in defects if status and d.status != status]
+        if moving:
+            Defect.objects.filter(pk__in=[d.pk for d in moving]).update(status=status, updated_at=now)
+            for d in moving:
+                old_key = counter_key(d)
+                deltas[old_key] = deltas.get(old_key, 0) - 1
+                new_key = (d.project_id, d.stage_id, status, d.priority)
+                deltas[new_key] = deltas.get(new_key, 0) + 1
+                history.append(
+                    DefectHistory(
+                        defect_id=d.pk, actor=actor, action="Изменён статус", from_status=d.status, to_status=status
+                    )
+                )
+                changed.add(d.pk)
+
+        reassigned = [d for d in defects if assignee is not None and d.assignee_id != assignee.pk]
+        if reassigned:
+            reassigned_ids = [d.pk for d in reassigned]
+            Defect.objects.filter(pk__in=reassigned_ids).update(assignee=assignee, updated_at=now)
+            DefectParticipant.objects.filter(defect_id__in=reassigned_ids, role=ParticipantRole.ASSIGNEE).delete()
+            DefectParticipant.objects.bulk_create(
+                [DefectParticipant(defect_id=pk, user_id=assignee.pk, role=ParticipantRole.ASSIGNEE) for pk in reassigned_ids]
+            )
+            for d in reassigned:
+                history.append(
+                    DefectHistory(
+                        defect_id=d.pk,
+                        actor=actor,
+                        action="Изменены поля дефекта",
+                        changes={"assignee_id": {"from": d.assignee_id, "to": assignee.pk}},
+                    )
+                )
+                changed.add(d.pk)
+
+        if not changed:
+            return 0, []
+        # created_at у истории (auto_now_add) bulk_create проставляет сам.
+        DefectHistory.objects.bulk_create(history)
+        bump_counters(deltas)
+        refresh_list_rows(changed)
+        # UPDATE не шлёт сигналов — кэш дефектов инвалидируем явно.
+        cache.bump(cache.DEFECTS)
+    return len(changed), []
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core import cache
+from projects.models import Project, Stage
+
+from . import search
+from .models import COUNTER_FIELDS, ArchivedDefect, Defect, DefectAttachment, DefectComment, DefectListRow
+from .services import counter_key, move_counter, refresh_list_rows, sync_participants
+from .storage import release_blob
+
+_INDEXED_FIELDS = {"title", "description"}
+
+
+@receiver(post_save, sender=Defect, dispatch_uid="defects_search_defect_saved")
+def _index_defect(sender, instance: Defect, created: bool, update_fields=None, **kwargs) -> None:
+    # Смена статуса сохраняет только status/updated_at — текст не менялся, индекс не трогаем.
+    if update_fields is not None and not (_INDEXED_FIELDS & set(update_fields)):
+        return
+    search.index_defects([instance.pk])
+
+
+@receiver(post_delete, sender=Defect, dispatch_uid="defects_search_defect_deleted")
+def _unindex_defect(sender, instance: Defect, **kwargs) -> None:
+    search.remove_defects([instance.pk])
+
+
+@receiver(pre_save, sender=Defect, dispatch_uid="defects_counter_defect_saving")
+def _read_counter_key(sender, instance: Defect, **kwargs) -> None:
+    if instance._state.adding:
+        instance._counter_key_before = None
+    elif "_saved_counter_key" in instance.__dict__:
+        instance._counter_key_before = instance._saved_counter_key
+    else:
+        # Дефект загружен не целиком (only()) или создан вручную с pk — ключ берём из БД.
+        instance._counter_key_before = Defect.objects.filter(pk=instance.pk).values_list(*COUNTER_FIELDS).first()
+
+
+@receiver(post_save, sender=Defect, dispatch_uid="defects_counter_defect_saved")
+def _count_defect(sender, instance: Defect, **kwargs) -> None:
+    # Любое сохранение (страницы, API, админка, shell) переносит дефект между счётчиками.
+    # Массовые UPDATE/bulk_create сигналов не шлют — там счётчики меняются явно (bump_counters).
+    new = counter_key(instance)
+    if instance._counter_key_before != new:
+        move_counter(instance._counter_key_before, new)
+    instance._saved_counter_key = new
+
+
+@receiver(post_delete, sender=Defect, dispatch_uid="defects_counter_defect_deleted")
+def _uncount_defect(sender, instance: Defect, **kwargs) -> None:
+    move_counter(counter_key(instance), None)
+
+
+@receiver(post_save, sender=DefectComment, dispatch_uid="defects_search_comment_saved")
+@receiver(post_delete, sender=DefectComment, dispatch_uid="defects_search_comment_deleted")
+def _index_comment(sender, instance: DefectComment, **kwargs) -> None:
+    search.index_defects([instance.defect_id])
+
+
+@receiver(post_delete, sender=DefectAttachment, dispatch_uid="defects_attachment_deleted")
+def _release_attachment_blob(sender, instance: DefectAttachment, **kwargs) -> None:
+    # Блоб может быть общим для нескольких вложений — удаляется, только когда ссылок не осталось.
+    if instance.file.name:
+        release_blob(instance.file.name)
+
+
+@receiver(post_save, sender=Defect, dispatch_uid="defects_list_row_defect_saved")
+def _refresh_list_row(sender, instance: Defect, **kwargs) -> None:
+    # Строка удаляется каскадом вместе с дефектом; здесь — только создание/обновление.
+    refresh_list_rows([instance.pk])
+
+
+_PARTICIPANT_FIELDS = {"assignee", "created_by"}
+
+
+@receiver(post_save, sender=Defect, dispatch_uid="defects_participants_defect_saved")
+def _sync_participants(sender, instance: Defect, update_fields=None, **kwargs) -> None:
+    if update_fields is not None and not (_PARTICIPANT_FIELDS & set(update_fields)):
+        return
+    sync_participants(instance)
+
+
+@receiver(post_save, sender=Project, dispatch_uid="defects_list_row_project_saved")
+def _rename_project(sender, instance: Project, created: bool, **kwargs) -> None:
+    if not created:
+        for model in (DefectListRow, ArchivedDefect):
+            model.objects.filter(project_id=instance.pk).exclude(project_name=instance.name).update(
+                project_name=instance.name
+            )
+
+
+@receiver(post_save, sender=Stage, dispatch_uid="defects_list_row_stage_saved")
+def _rename_stage(sender, instance: Stage, created: bool, **kwargs) -> None:
+    if not created:
+        for model in (DefectListRow, ArchivedDefect):
+            model.objects.filter(stage_id=instance.pk).exclude(stage_name=instance.name).update(
+                stage_name=instance.name
+            )
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL, dispatch_uid="defects_list_row_user_saved")
+def _rename_user(sender, instance, created: bool, update_fields=None, **kwargs) -> None:
+    # Вход в систему сохраняет только last_login — имя не менялось.
+    if created or (update_fields is not None and "username" not in update_fields):
+        return
+    if DefectListRow.objects.filter(assignee_id=instance.pk).exclude(assignee_name=instance.username).update(
+        assignee_name=instance.username
+    ):
+        # Строки списка изменились без сохранения дефектов — сбрасываем кэш и ETag списка.
+        cache.bump(cache.DEFECTS)
+    if ArchivedDefect.objects.filter(assignee_id=instance.pk).exclude(assignee_name=instance.username).update(
+        assignee_name=instance.username
+    ):
+        cache.bump(cache.ARCHIVE)
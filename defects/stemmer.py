@@ -0,0 +1,143 @@
+"""Стеммер русского языка (алгоритм Snowball, https://snowballstem.org/algorithms/russian/stemmer.html).
+
+Нужен для полнотекстового поиска на SQLite: у FTS5 нет русского стеммера, поэтому
+в индекс и в запрос попадают уже приведённые к основе слова.
+"""
+
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+
+_VOWELS = "аеиоуыэюя"
+
+# (окончания, требуют ли перед собой «а»/«я»)
+_PERFECTIVE_GERUND = (("в", "вши", "вшись"), ("ив", "ивши", "ившись", "ыв", "ывши", "ывшись"))
+_ADJECTIVE = (
+    (),
+    (
+        "ее", "ие", "ые", "ое", "ими", "ыми", "ей", "ий", "ый", "ой", "ем", "им", "ым", "ом",
+        "его", "ого", "ему", "ому", "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею",
+    ),
+)
+_PARTICIPLE = (("ем", "нн", "вш", "ющ", "щ"), ("ивш", "ывш", "ующ"))
+_REFLEXIVE = ((), ("ся", "сь"))
+_VERB = (
+    ("ла", "на", "ете", "йте", "ли", "й", "л", "ем", "н", "ло", "но", "ет", "ют", "ны", "ть", "ешь", "нно"),
+    (
+        "ила", "ыла", "ена", "ейте", "уйте", "ите", "или", "ыли", "ей", "уй", "ил", "ыл", "им", "ым", "ен",
+        "ило", "ыло", "ено", "ят", "ует", "уют", "ит", "ыт", "ены", "ить", "ыть", "ишь", "ую", "ю",
+    ),
+)
+_NOUN = (
+    (),
+    (
+        "а", "ев", "ов", "ие", "ье", "е", "иями", "ями", "ами", "еи", "ии", "и", "ией", "ей", "ой", "ий", "й",
+        "иям", "ям", "ием", "ем", "ам", "ом", "о", "у", "ах", "иях", "ях", "ы", "ь", "ию", "ью", "ю", "ия",
+        "ья", "я",
+    ),
+)
+_SUPERLATIVE = ("ейше", "ейш")
+_DERIVATIONAL = ("ость", "ост")
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_CYRILLIC_RE = re.compile(r"[а-я]")
+
+
+def _prepare(groups: tuple[tuple[str, ...], tuple[str, ...]]) -> list[tuple[str, bool]]:
+    items = [(e, True) for e in groups[0]] + [(e, False) for e in groups[1]]
+    return sorted(items, key=lambda item: len(item[0]), reverse=True)
+
+
+_PERFECTIVE_GERUND_E = _prepare(_PERFECTIVE_GERUND)
+_ADJECTIVE_E = _prepare(_ADJECTIVE)
+_PARTICIPLE_E = _prepare(_PARTICIPLE)
+_REFLEXIVE_E = _prepare(_REFLEXIVE)
+_VERB_E = _prepare(_VERB)
+_NOUN_E = _prepare(_NOUN)
+
+
+def _regions(word: str) -> tuple[int, int]:
+    rv = r1 = r2 = len(word)
+    for i, ch in enumerate(word):
+        if ch in _VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def _strip(word: str, rv: int, endings: list[tuple[str, bool]]) -> str | None:
+    """Удаляет самое длинное подходящее окончание из зоны RV; None — если окончания нет."""
+    for ending, after_a in endings:
+        if not word.endswith(ending) or len(word) - len(ending) < rv:
+            continue
+        cut = len(word) - len(ending)
+        if after_a and (cut - 1 < rv or word[cut - 1] not in "ая"):
+            # Как в Snowball: подошло самое длинное окончание, но условие не выполнено.
+            return None
+        return word[:cut]
+    return None
+
+
+# Словарь проекта невелик и слова повторяются — основа каждого слова считается один раз.
+@lru_cache(maxsize=100_000)
+def stem(word: str) -> str:
+    word = word.lower().replace("ё", "е")
+    if not _CYRILLIC_RE.search(word):
+        return word
+    rv, r2 = _regions(word)
+
+    # Шаг 1
+    stripped = _strip(word, rv, _PERFECTIVE_GERUND_E)
+    if stripped is None:
+        word = _strip(word, rv, _REFLEXIVE_E) or word
+        stripped = _strip(word, rv, _ADJECTIVE_E)
+        if stripped is not None:
+            stripped = _strip(stripped, rv, _PARTICIPLE_E) or stripped
+        else:
+            stripped = _strip(word, rv, _VERB_E)
+            if stripped is None:
+                stripped = _strip(word, rv, _NOUN_E)
+    if stripped is not None:
+        word = stripped
+
+    # Шаг 2
+    if word.endswith("и") and len(word) - 1 >= rv:
+        word = word[:-1]
+
+    # Шаг 3
+    for ending in _DERIVATIONAL:
+        if word.endswith(ending) and len(word) - len(ending) >= r2:
+            word = word[: -len(ending)]
+            break
+
+    # Шаг 4
+    superlative = False
+    for ending in _SUPERLATIVE:
+        if word.endswith(ending) and len(word) - len(ending) >= rv:
+            word = word[: -len(ending)]
+            superlative = True
+            break
+    if word.endswith("нн") and len(word) - 2 >= rv:
+        word = word[:-1]
+    elif not superlative and word.endswith("ь") and len(word) - 1 >= rv:
+        word = word[:-1]
+    return word
+
+
+def words(text: str) -> list[str]:
+    """Слова текста (буквы, цифры и «_») без приведения к основе."""
+    return _WORD_RE.findall(text or "")
+
+
+def tokenize(text: str) -> list[str]:
+    """Разбивает текст на слова и приводит их к основе (регистр не важен, в т.ч. для кириллицы)."""
+    return [stem(w) for w in words(text)]
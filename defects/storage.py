@@ -0,0 +1,127 @@
+"""Хранилище вложений с адресацией по содержимому.
+
+Файл хэшируется (SHA-256) прямо при записи на диск и хранится один раз под своим хэшем:
+``blobs/ab/cd/abcd…``. Одна и та же фотография у нескольких дефектов — один файл; имя, под
+которым её загрузили, хранится в ``DefectAttachment.original_name``. Блоб удаляется, когда на
+него не остаётся ссылок ни из вложений, ни из архивных вложений (``release_blob``).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+import time
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+
+BLOB_DIR = "blobs"
+# Блоб, записанный или переиспользованный недавно, может принадлежать ещё не закоммиченному
+# вложению — такие не удаляются сразу, их подберёт команда gc_attachment_blobs.
+BLOB_GRACE_SECONDS = 60 * 60
+
+
+def blob_name(digest: str) -> str:
+    return f"{BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}"
+
+
+def blob_digest(name: str) -> str:
+    return name.rsplit("/", 1)[-1]
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage, у которого имя файла — хэш содержимого, а не имя загрузки."""
+
+    def get_available_name(self, name, max_length=None):
+        # Имя всё равно заменяется хэшем — суффиксы «_AbC123» и проверка существования не нужны.
+        return name
+
+    def _save(self, name, content):
+        tmp_dir = self.path(f"{BLOB_DIR}/tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        # Временный файл — в том же каталоге хранилища, чтобы os.replace был атомарным переименованием.
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    fh.write(chunk)
+            name = blob_name(digest.hexdigest())
+            path = self.path(name)
+            if os.path.exists(path):
+                os.unlink(tmp_path)
+                os.utime(path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(tmp_path, self.file_permissions_mode)
+                os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return name
+
+
+attachment_storage = ContentAddressedStorage()
+
+
+def get_attachment_storage() -> ContentAddressedStorage:
+    # Вызываемый объект, а не экземпляр: в миграции попадает ссылка на функцию, а не путь к MEDIA_ROOT.
+    return attachment_storage
+
+
+def _attachment_models() -> tuple:
+    # Ссылки на блоб — из рабочих и архивных вложений.
+    from .models import ArchivedDefectAttachment, DefectAttachment
+
+    return DefectAttachment, ArchivedDefectAttachment
+
+
+def release_blob(name: str) -> None:
+    """Удалить блоб после коммита, если на него больше не ссылается ни одно вложение."""
+    def delete() -> None:
+        digest = blob_digest(name)
+        if any(model.objects.filter(sha256=digest).exists() for model in _attachment_models()):
+            return
+        try:
+            if time.time() - os.path.getmtime(attachment_storage.path(name)) < BLOB_GRACE_SECONDS:
+                return
+        except FileNotFoundError:
+            return
+        attachment_storage.delete(name)
+
+    transaction.on_commit(delete)
+
+
+def collect_garbage(min_age: float = BLOB_GRACE_SECONDS) -> tuple[int, int]:
+    """Удалить блобы без ссылок и брошенные временные файлы старше ``min_age`` секунд.
+
+    Возвращает (число удалённых файлов, освобождено байт).
+    """
+    root = attachment_storage.path(BLOB_DIR)
+    if not os.path.isdir(root):
+        return 0, 0
+    referenced = set()
+    for model in _attachment_models():
+        referenced.update(model.objects.values_list("sha256", flat=True).distinct())
+    deadline = time.time() - min_age
+    deleted = freed = 0
+    for dirpath, _dirnames, filenames in os.walk(root):
+        in_tmp = os.path.basename(dirpath) == "tmp"
+        for filename in filenames:
+            if not in_tmp and filename in referenced:
+                continue
+            path = os.path.join(dirpath, filename)
+            try:
+                stat = os.stat(path)
+                if stat.st_mtime > deadline:
+                    continue
+                os.unlink(path)
+            except FileNotFoundError:
+                continue
+            deleted += 1
+            freed += stat.st_size
+    return deleted, freed
@@ -1,10 +1,45 @@
-from django.test import TestCase
+import hashlib
+import os
+import tempfile
+from unittest import mock, skipUnless
+from io import StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from openpyxl import Workbook
+from django.utils import timezone
+
+from datetime import date, timedelta
 
 from accounts.models import User, UserRole
 from projects.models import Project, Stage
 
-from .models import Defect, DefectPriority, DefectStatus
+from .archive import archive_defects
+from .facets import facet_counts
+from .filters import ALLOWED_SORTS, RELEVANCE_SORT, read_filters
+from .models import (
+    ArchivedDefect,
+    ArchivedDefectAttachment,
+    Defect,
+    DefectAttachment,
+    DefectComment,
+    DefectCounter,
+    DefectHistory,
+    DefectListRow,
+    DefectParticipant,
+    DefectPriority,
+    DefectStatus,
+    ImportJob,
+    ImportJobStatus,
+    ParticipantRole,
+)
+from .pagination import KeysetPaginator
+from .search import search_defects
+from .services import rebuild_participants
+from .storage import collect_garbage
 
 
 class DefectUnitTests(TestCase):
@@ -29,6 +64,28 @@ class DefectUnitTests(TestCase):
         self.assertIn(DefectStatus.CANCELLED, d.allowed_next_statuses())
         self.assertNotIn(DefectStatus.CLOSED, d.allowed_next_statuses())
 
+    @skipUnless(connection.vendor == "sqlite", "на пустой таблице PostgreSQL законно выбирает Seq Scan")
+    def test_filter_sort_combinations_use_indexes(self):
+        out = StringIO()
+        call_command("check_defect_query_plans", stdout=out)
+        self.assertIn("OK", out.getvalue())
+
+    def test_priority_sort_follows_severity(self):
+        for priority in (DefectPriority.MEDIUM, DefectPriority.CRITICAL, DefectPriority.LOW, DefectPriority.HIGH):
+            Defect.objects.create(project=self.project, title=priority, description="d", priority=priority, created_by=self.manager)
+        d = Defect.objects.get(priority=DefectPriority.LOW)
+        d.priority = DefectPriority.CRITICAL
+        d.save(update_fields=["priority"])
+        d.refresh_from_db()
+        self.assertEqual(d.priority_rank, 4)
+
+        self.client.login(username="m", password="pass")
+        resp = self.client.get(reverse("defects:list"), {"sort": "-priority"})
+        self.assertEqual(
+            [x.priority for x in resp.context["page_obj"]],
+            [DefectPriority.CRITICAL, DefectPriority.CRITICAL, DefectPriority.HIGH, DefectPriority.MEDIUM],
+        )
+
     def test_observer_cannot_create_defect(self):
         self.client.login(username="o", password="pass")
         resp = self.client.get(reverse("defects:create"))
@@ -55,6 +112,233 @@ class DefectUnitTests(TestCase):
         self.assertIsNone(d.due_date)
 
 
+class DefectSearchTests(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username="m", password="pass", role=UserRole.MANAGER)
+        self.project = Project.objects.create(name="Объект 1")
+
+    def _defect(self, title, description="-"):
+        return Defect.objects.create(
+            project=self.project, title=title, description=description, created_by=self.manager
+        )
+
+    def test_search_stems_russian_words_and_ignores_case(self):
+        self._defect("Трещины в стене", "Глубокая трещина у окна")
+        self._defect("Протечка кровли")
+        self.client.login(username="m", password="pass")
+        resp = self.client.get(reverse("defects:list"), {"q": "ТРЕЩИНА"})
+        self.assertContains(resp, "Трещины в стене")
+        self.assertNotContains(resp, "Протечка кровли")
+
+    def test_search_ranks_title_matches_first_and_indexes_comments(self):
+        in_body = self._defect("Плитка", "отслоение штукатурки")
+        in_title = self._defect("Отслоение штукатурки", "в коридоре")
+        self.client.login(username="m", password="pass")
+        resp = self.client.get(reverse("defects:list"), {"q": "штукатурка"})
+        self.assertEqual([d.pk for d in resp.context["defects"]], [in_title.id, in_body.id])
+
+        self.client.post(reverse("defects:comment", args=[in_body.id]), data={"body": "Нужен герметик"})
+        resp = self.client.get(reverse("defects:list"), {"q": "герметика"})
+        self.assertEqual([d.pk for d in resp.context["defects"]], [in_body.id])
+
+    def test_search_matches_word_prefixes_with_one_index_lookup(self):
+        crack = self._defect("Трещина в стене")
+        self._defect("Протечка кровли")
+        qs = search_defects(DefectListRow.objects.all(), "трещ стен").order_by("-search_rank")
+        self.assertEqual([row.pk for row in qs], [crack.id])
+        # Совпадение и ранг — из одного соединения с индексом, без подзапроса на каждую строку.
+        sql = str(qs.query)
+        self.assertEqual(sql.count("MATCH") + sql.count("@@"), 1)
+
+
+class DefectPaginationTests(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username="m", password="pass", role=UserRole.MANAGER)
+        self.project = Project.objects.create(name="Объект 1")
+        priorities = list(DefectPriority.values)
+        statuses = list(DefectStatus.values)
+        for i in range(23):
+            Defect.objects.create(
+                project=self.project,
+                title=f"D{i}",
+                description="-",
+                priority=priorities[i % len(priorities)],
+                status=statuses[i % len(statuses)],
+                due_date=None if i % 3 == 0 else date(2030, 1, 1) + timedelta(days=i % 5),
+                created_by=self.manager,
+            )
+
+    def test_keyset_pages_cover_every_sort_in_both_directions(self):
+        for sort, ordering in ALLOWED_SORTS.items():
+            if sort == RELEVANCE_SORT:
+                continue
+            with self.subTest(sort=sort):
+                paginator = KeysetPaginator(Defect.objects.all(), ordering, per_page=5)
+                expected = [d.id for d in Defect.objects.order_by(*paginator._order(paginator.desc))]
+
+                pages, page = [], paginator.page(None)
+                pages.append([d.id for d in page])
+                while page.has_next:
+                    page = paginator.page(page.next_cursor)
+                    pages.append([d.id for d in page])
+                self.assertEqual([pk for p in pages for pk in p], expected)
+
+                backwards = [[d.id for d in page]]
+                while page.has_previous:
+                    page = paginator.page(page.previous_cursor)
+                    backwards.append([d.id for d in page])
+                self.assertEqual(backwards[::-1], pages)
+
+    def test_list_ignores_tampered_cursor(self):
+        self.client.login(username="m", password="pass")
+        resp = self.client.get(reverse("defects:list"), {"cursor": "garbage"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.context["defects"]), 23)
+
+    def test_cursor_of_another_sort_restarts_from_first_page(self):
+        cursor = KeysetPaginator(Defect.objects.all(), "-created_at", per_page=5).page(None).next_cursor
+        self.client.login(username="m", password="pass")
+        for sort in ("due_date", "-due_date", "priority"):
+            with self.subTest(sort=sort):
+                resp = self.client.get(reverse("defects:list"), {"sort": sort, "cursor": cursor})
+                self.assertEqual(resp.status_code, 200)
+                self.assertFalse(resp.context["page_obj"].has_previous)
+                resp = self.client.get(reverse("defects:api_defects"), {"sort": sort, "cursor": cursor})
+                self.assertEqual(resp.status_code, 200)
+                self.assertIsNone(resp.json()["previous_cursor"])
+
+
+class DefectFacetTests(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username="m", password="pass", role=UserRole.MANAGER)
+        self.engineer = User.objects.create_user(username="e", password="pass", role=UserRole.ENGINEER)
+        self.p1 = Project.objects.create(name="Объект 1")
+        self.p2 = Project.objects.create(name="Объект 2")
+        rows = [
+            (self.p1, DefectStatus.NEW, DefectPriority.HIGH, self.engineer),
+            (self.p1, DefectStatus.NEW, DefectPriority.LOW, None),
+            (self.p1, DefectStatus.CLOSED, DefectPriority.HIGH, None),
+            (self.p2, DefectStatus.NEW, DefectPriority.HIGH, self.engineer),
+        ]
+        for project, status, priority, assignee in rows:
+            Defect.objects.create(
+                project=project, title="Трещина", description="d", status=status, priority=priority,
+                assignee=assignee, created_by=self.manager,
+            )
+
+    def test_facets_count_other_active_filters(self):
+        filters = read_filters({"status": DefectStatus.NEW, "project": str(self.p1.id)})
+        for engineer_id, q in ((None, ""), (None, "трещины"), (self.engineer.id, "")):
+            with self.subTest(engineer_id=engineer_id, q=q):
+                facets = facet_counts({**filters, "q": q}, engineer_id)
+                if engineer_id is None:
+                    self.assertEqual(facets["status"], {DefectStatus.NEW: 2, DefectStatus.CLOSED: 1})
+                    self.assertEqual(facets["priority"], {DefectPriority.HIGH: 1, DefectPriority.LOW: 1})
+                    self.assertEqual(facets["project"], {self.p1.id: 2, self.p2.id: 1})
+                else:
+                    self.assertEqual(facets["status"], {DefectStatus.NEW: 1})
+                    self.assertEqual(facets["project"], {self.p1.id: 1, self.p2.id: 1})
+
+    def test_facets_are_cached_until_defects_change(self):
+        filters = read_filters({})
+        facet_counts(filters)
+        with self.assertNumQueries(0):
+            facet_counts(filters)
+        Defect.objects.filter(status=DefectStatus.CLOSED).first().save()
+        with self.assertNumQueries(1):
+            facet_counts(filters)
+
+
+class DefectDetailQueryTests(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username="m", password="pass", role=UserRole.MANAGER)
+        self.project = Project.objects.create(name="Объект 1")
+        self.defect = Defect.objects.create(project=self.project, title="Д", description="О", created_by=self.manager)
+        self.client.login(username="m", password="pass")
+
+    def _add_thread(self, size):
+        users = [User.objects.create_user(username=f"u{len(User.objects.all())}{i}") for i in range(3)]
+        DefectComment.objects.bulk_create(
+            DefectComment(defect=self.defect, author=users[i % 3], body=f"c{i}") for i in range(size)
+        )
+        DefectHistory.objects.bulk_create(
+            DefectHistory(defect=self.defect, actor=users[i % 3], action=f"h{i}") for i in range(size)
+        )
+
+    def test_detail_query_count_does_not_depend_on_thread_length(self):
+        url = reverse("defects:detail", args=[self.defect.id])
+        self._add_thread(5)
+        # сессия, пользователь, ETag, дефект, комментарии, история, вложения
+        with self.assertNumQueries(7):
+            self.client.get(url)
+        self._add_thread(200)
+        with self.assertNumQueries(7):
+            resp = self.client.get(url)
+        self.assertEqual(len(resp.context["comments"]["items"]), 20)
+        self.assertEqual(len(resp.context["history"]["items"]), 20)
+        self.assertIsNotNone(resp.context["comments"]["before"])
+
+    def test_unchanged_detail_answers_304_without_rendering(self):
+        url = reverse("defects:detail", args=[self.defect.id])
+        self.client.get(url)  # первый ответ ставит CSRF-cookie, она входит в ETag
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(3):  # сессия, пользователь, ETag
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertFalse(resp.content)
+
+        DefectComment.objects.create(defect=self.defect, author=self.manager, body="новый")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Логин автора показан на карточке — его смена тоже меняет ETag.
+        etag = self.client.get(url)["ETag"]
+        self.manager.username = "manager"
+        self.manager.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_depends_on_viewer(self):
+        url = reverse("defects:detail", args=[self.defect.id])
+        etag = self.client.get(url)["ETag"]
+        User.objects.create_user(username="o", password="pass", role=UserRole.OBSERVER)
+        self.client.login(username="o", password="pass")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_answers_304_until_defects_change(self):
+        url = reverse("defects:list")
+        self.client.get(url)
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Defect.objects.create(project=self.project, title="Д2", description="О", created_by=self.manager)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Комментарии попадают в поиск: новый комментарий меняет выдачу ?q= и её ETag.
+        search = {"q": "герметик"}
+        etag = self.client.get(url, search)["ETag"]
+        DefectComment.objects.create(defect=self.defect, author=self.manager, body="Нужен герметик")
+        resp = self.client.get(url, search, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([d.pk for d in resp.context["defects"]], [self.defect.pk])
+
+    def test_no_etag_while_messages_are_pending(self):
+        User.objects.create_user(username="e", password="pass", role=UserRole.ENGINEER)
+        self.client.login(username="e", password="pass")
+        url = reverse("defects:detail", args=[self.defect.id])
+        resp = self.client.post(reverse("defects:comment", args=[self.defect.id]), {"body": "x"}, follow=True)
+        self.assertContains(resp, "нет прав")
+        self.assertFalse(resp.has_header("ETag"))
+        self.assertTrue(self.client.get(url).has_header("ETag"))
+
+    def test_older_comments_are_loaded_as_fragment(self):
+        self._add_thread(30)
+        resp = self.client.get(reverse("defects:detail", args=[self.defect.id]))
+        before = resp.context["comments"]["before"]
+        fragment = self.client.get(reverse("defects:comments", args=[self.defect.id]), {"before": before})
+        self.assertContains(fragment, "c0")
+        self.assertNotContains(fragment, "c29")
+        for url in (reverse("defects:comments", args=[self.defect.id]), reverse("defects:history", args=[self.defect.id])):
+            self.assertEqual(self.client.get(url, {"before": "²"}).status_code, 200)
+
+
 class DefectIntegrationTests(TestCase):
     def setUp(self):
         self.manager = User.objects.create_user(username="m", password="pass", role=UserRole.MANAGER)
@@ -90,6 +374,187 @@ class DefectIntegrationTests(TestCase):
         self.assertEqual(d.status, DefectStatus.CLOSED)
         self.assertTrue(d.history.count() >= 3)
 
+    def test_counters_follow_create_edit_and_status_change(self):
+        self.client.login(username="m", password="pass")
+        data = {"project": self.project.id, "stage": "", "title": "Д1", "description": "О1", "priority": DefectPriority.MEDIUM}
+        self.client.post(reverse("defects:create"), data=data)
+        d = Defect.objects.get(title="Д1")
+        self.client.post(reverse("defects:edit", args=[d.id]), data={**data, "priority": DefectPriority.HIGH})
+        self.client.post(reverse("defects:status", args=[d.id]), data={"status": DefectStatus.IN_PROGRESS, "comment": ""})
+
+        live = {
+            (c.status, c.priority): c.count for c in DefectCounter.objects.exclude(count=0)
+        }
+        self.assertEqual(live, {(DefectStatus.IN_PROGRESS, DefectPriority.HIGH): 1})
+        call_command("rebuild_defect_counters", stdout=StringIO())
+        rebuilt = {(c.status, c.priority): c.count for c in DefectCounter.objects.all()}
+        self.assertEqual(rebuilt, live)
+
+        # Сохранение в обход представлений (shell, миграция данных) тоже учитывается.
+        d = Defect.objects.create(project=self.project, title="Д2", description="x", created_by=self.manager)
+        partial = Defect.objects.only("pk").get(pk=d.pk)
+        partial.status = DefectStatus.CANCELLED
+        partial.save()
+        d = Defect.objects.get(pk=d.pk)
+        d.priority = DefectPriority.LOW
+        d.save()
+        d.delete()
+        live = {(c.status, c.priority): c.count for c in DefectCounter.objects.exclude(count=0)}
+        self.assertEqual(live, {(DefectStatus.IN_PROGRESS, DefectPriority.HIGH): 1})
+
+        with self.assertNumQueries(4):  # сессия, пользователь, счётчики, просроченные по объектам
+            resp = self.client.get(reverse("reports:dashboard"))
+        self.assertEqual(resp.context["total"], 1)
+
+    def test_list_rows_follow_defect_and_name_changes(self):
+        stage = Stage.objects.create(project=self.project, name="Этап A")
+        d = Defect.objects.create(
+            project=self.project, stage=stage, title="Д1", description="О1", assignee=self.engineer, created_by=self.manager
+        )
+        d.status = DefectStatus.CANCELLED
+        d.save(update_fields=["status", "updated_at"])
+        self.project.name = "Объект 2"
+        self.project.save()
+        stage.name = "Этап B"
+        stage.save()
+        self.engineer.username = "e2"
+        self.engineer.save()
+
+        row = DefectListRow.objects.get(pk=d.pk)
+        self.assertEqual(
+            (row.project_name, row.stage_name, row.assignee_name, row.status_label, row.is_open),
+            ("Объект 2", "Этап B", "e2", "Отменена", False),
+        )
+        DefectListRow.objects.all().delete()
+        call_command("rebuild_defect_list_rows", stdout=StringIO())
+        self.assertEqual(DefectListRow.objects.get(pk=d.pk).project_name, "Объект 2")
+
+        self.client.login(username="m", password="pass")
+        with self.assertNumQueries(6):  # сессия, пользователь, строки списка, фасеты, объекты, исполнители для массовых действий
+            resp = self.client.get(reverse("defects:list"))
+        self.assertContains(resp, "Этап B")
+
+    def test_overdue_filter_and_nightly_listing(self):
+        today = timezone.localdate()
+        cases = [
+            ("Вчера", DefectStatus.IN_PROGRESS, today - timedelta(days=1)),
+            ("Давно", DefectStatus.NEW, today - timedelta(days=30)),
+            ("Закрыт", DefectStatus.CLOSED, today - timedelta(days=1)),
+            ("Сегодня", DefectStatus.NEW, today),
+        ]
+        for title, status, due in cases:
+            Defect.objects.create(
+                project=self.project, title=title, description="x", status=status, due_date=due, created_by=self.manager
+            )
+        self.client.login(username="m", password="pass")
+        resp = self.client.get(reverse("defects:list"), {"overdue": "1"})
+        self.assertEqual(sorted(d.title for d in resp.context["defects"]), ["Вчера", "Давно"])
+
+        out = StringIO()
+        call_command("list_overdue_defects", stdout=out, stderr=StringIO())
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn("Вчера", lines[1])
+
+    def test_bulk_status_and_assignment(self):
+        defects = [
+            Defect.objects.create(project=self.project, title=f"Д{i}", description="x", created_by=self.manager)
+            for i in range(5)
+        ]
+        ids = [d.id for d in defects]
+        url = reverse("defects:bulk")
+        self.client.login(username="m", password="pass")
+
+        # Закрыть новый дефект нельзя — не меняется вся выборка.
+        self.client.post(url, {"ids": ids, "status": DefectStatus.CLOSED})
+        self.assertFalse(Defect.objects.exclude(status=DefectStatus.NEW).exists())
+
+        # Число запросов не зависит от размера выборки: по одному UPDATE/INSERT на шаг.
+        with self.assertNumQueries(14):
+            self.client.post(url, {"ids": ids, "status": DefectStatus.IN_PROGRESS, "assignee": self.engineer.id})
+        self.assertEqual(
+            set(Defect.objects.values_list("status", "assignee_id")), {(DefectStatus.IN_PROGRESS, self.engineer.id)}
+        )
+        self.assertEqual(DefectHistory.objects.filter(defect_id__in=ids).count(), 10)
+        self.assertEqual(
+            {(c.status, c.count) for c in DefectCounter.objects.exclude(count=0)}, {(DefectStatus.IN_PROGRESS, 5)}
+        )
+        self.assertEqual(set(DefectListRow.objects.values_list("assignee_name", flat=True)), {"e"})
+        self.client.login(username="e", password="pass")
+        self.assertEqual(len(self.client.get(reverse("defects:list")).context["defects"]), 5)
+
+    def test_engineer_cannot_use_bulk_action(self):
+        d = Defect.objects.create(project=self.project, title="Д", description="x", assignee=self.engineer, created_by=self.manager)
+        self.client.login(username="e", password="pass")
+        self.client.post(reverse("defects:bulk"), {"ids": [d.id], "status": DefectStatus.IN_PROGRESS})
+        d.refresh_from_db()
+        self.assertEqual(d.status, DefectStatus.NEW)
+
+    def test_bulk_action_rejects_malformed_ids(self):
+        self.client.login(username="m", password="pass")
+        resp = self.client.post(reverse("defects:bulk"), {"ids": ["²"], "status": DefectStatus.IN_PROGRESS})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_import_csv_upload_reports_row_errors(self):
+        Stage.objects.create(project=self.project, name="Этап A")
+        content = (
+            "Заголовок;Описание;Объект;Этап;Приоритет;Исполнитель;Срок\n"
+            "Трещина;Стена;Объект 1;Этап A;Высокий;e;01.02.2030\n"
+            ";Без заголовка;Объект 1;;;;\n"
+            "Скол;Плитка;Объект 1;;critical;;2030-03-01\n"
+            "Протечка;Кровля;Нет такого;;;;\n"
+        ).encode("utf-8")
+        self.client.login(username="m", password="pass")
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            resp = self.client.post(reverse("defects:import"), {"file": SimpleUploadedFile("defects.csv", content)})
+            job = ImportJob.objects.get()
+            self.assertRedirects(resp, reverse("defects:import_job", args=[job.id]))
+            # Запрос только ставит файл в очередь — дефекты создаёт воркер.
+            self.assertFalse(Defect.objects.exists())
+            call_command("run_import_jobs", "--once", stdout=StringIO())
+            job.refresh_from_db()
+            self.assertFalse(job.file)
+        self.assertEqual((job.status, job.rows_created, job.error_count), (ImportJobStatus.DONE, 2, 2))
+        self.assertEqual([line for line, _ in job.errors], [3, 5])
+        self.assertContains(self.client.get(reverse("defects:import_job", args=[job.id])), "Нет такого")
+
+        d = Defect.objects.get(title="Трещина")
+        self.assertEqual((d.priority_rank, d.assignee_id, str(d.due_date)), (3, self.engineer.id, "2030-02-01"))
+        self.assertEqual(DefectListRow.objects.get(pk=d.pk).stage_name, "Этап A")
+        self.assertEqual(d.history.count(), 1)
+        self.assertEqual(sum(DefectCounter.objects.values_list("count", flat=True)), 2)
+        self.assertContains(self.client.get(reverse("defects:list"), {"q": "трещины"}), "Трещина")
+        self.client.login(username="e", password="pass")
+        self.assertEqual(len(self.client.get(reverse("defects:list")).context["defects"]), 1)
+
+    def test_stale_import_jobs_are_failed(self):
+        long_ago = timezone.now() - timedelta(hours=2)
+        waiting = ImportJob.objects.create(uploaded_by=self.manager, original_name="a.csv")
+        running = ImportJob.objects.create(uploaded_by=self.manager, original_name="b.csv", status=ImportJobStatus.RUNNING)
+        fresh = ImportJob.objects.create(uploaded_by=self.manager, original_name="c.csv", status=ImportJobStatus.RUNNING)
+        ImportJob.objects.filter(pk=waiting.pk).update(created_at=long_ago)
+        ImportJob.objects.filter(pk=running.pk).update(started_at=long_ago)
+        ImportJob.objects.filter(pk=fresh.pk).update(started_at=timezone.now())
+        self.client.login(username="m", password="pass")
+        self.assertContains(self.client.get(reverse("defects:import_job", args=[waiting.id])), "Воркер не завершил импорт")
+        self.assertEqual(
+            dict(ImportJob.objects.values_list("original_name", "status")),
+            {"a.csv": ImportJobStatus.FAILED, "b.csv": ImportJobStatus.FAILED, "c.csv": ImportJobStatus.RUNNING},
+        )
+
+    def test_import_xlsx_command(self):
+        wb = Workbook()
+        wb.active.append(["Заголовок", "Объект", "Срок"])
+        wb.active.append(["Д1", "Объект 1", date(2030, 1, 1)])
+        wb.active.append(["Д2", "Объект 1", "завтра"])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = f"{tmp}/defects.xlsx"
+            wb.save(path)
+            err = StringIO()
+            call_command("import_defects", path, "--user", "m", stdout=StringIO(), stderr=err)
+        self.assertEqual(list(Defect.objects.values_list("title", "due_date")), [("Д1", date(2030, 1, 1))])
+        self.assertIn("строка 3", err.getvalue())
+
     def test_engineer_cannot_close(self):
         d = Defect.objects.create(
             project=self.project,
@@ -101,6 +566,7 @@ class DefectIntegrationTests(TestCase):
         )
         self.client.login(username="e", password="pass")
         resp = self.client.post(reverse("defects:status", args=[d.id]), data={"status": DefectStatus.CLOSED, "comment": ""}, follow=True)
+        self.assertContains(resp, "Инженер может менять статус только у назначенных ему дефектов.")
         d.refresh_from_db()
         self.assertNotEqual(d.status, DefectStatus.CLOSED)
 
@@ -129,4 +595,272 @@ class DefectIntegrationTests(TestCase):
         self.assertContains(resp, "Mine")
         self.assertNotContains(resp, "NotMine")
 
+    def test_reassigning_moves_defect_between_engineer_lists(self):
+        other = User.objects.create_user(username="e2", password="pass", role=UserRole.ENGINEER)
+        d = Defect.objects.create(project=self.project, title="Д", description="x", assignee=self.engineer, created_by=self.manager)
+        d.assignee = other
+        d.save()
+        self.assertEqual(
+            set(DefectParticipant.objects.filter(defect=d).values_list("user_id", "role")),
+            {(self.manager.id, ParticipantRole.AUTHOR), (other.id, ParticipantRole.ASSIGNEE)},
+        )
+        self.client.login(username="e", password="pass")
+        self.assertEqual(len(self.client.get(reverse("defects:list")).context["defects"]), 0)
+        self.client.login(username="e2", password="pass")
+        self.assertEqual(len(self.client.get(reverse("defects:list")).context["defects"]), 1)
+
+    def test_rebuild_participants_writes_in_chunks(self):
+        for i in range(3):
+            Defect.objects.create(project=self.project, title=f"Д{i}", description="x", assignee=self.engineer, created_by=self.manager)
+        DefectParticipant.objects.all().delete()
+        with mock.patch("defects.services.LIST_ROWS_CHUNK", 2):
+            self.assertEqual(rebuild_participants(), 6)
+        self.assertEqual(DefectParticipant.objects.filter(role=ParticipantRole.ASSIGNEE, user=self.engineer).count(), 3)
+
+
+class DefectApiTests(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username="m", password="pass", role=UserRole.MANAGER)
+        self.engineer = User.objects.create_user(username="e", password="pass", role=UserRole.ENGINEER)
+        self.project = Project.objects.create(name="Объект 1")
+        self.mine = Defect.objects.create(
+            project=self.project, title="Mine", description="x", assignee=self.engineer, created_by=self.manager
+        )
+        for i in range(4):
+            Defect.objects.create(project=self.project, title=f"Other {i}", description="y", created_by=self.manager)
+
+    def test_requires_login(self):
+        self.assertEqual(self.client.get(reverse("defects:api_defects")).status_code, 401)
+
+    def test_list_selects_fields_and_pages_by_cursor(self):
+        self.client.login(username="m", password="pass")
+        url = reverse("defects:api_defects")
+        data = self.client.get(url, {"fields": "id,title", "limit": 2}).json()
+        self.assertEqual(set(data["results"][0]), {"id", "title"})
+        seen = [r["id"] for r in data["results"]]
+        while data["next_cursor"]:
+            data = self.client.get(url, {"fields": "id,title", "limit": 2, "cursor": data["next_cursor"]}).json()
+            seen += [r["id"] for r in data["results"]]
+        self.assertEqual(sorted(seen), sorted(Defect.objects.values_list("id", flat=True)))
+        self.assertEqual(self.client.get(url, {"fields": "id,secret"}).status_code, 400)
+        for limit in ("²", "-1", "x"):
+            self.assertEqual(len(self.client.get(url, {"limit": limit}).json()["results"]), 5)
+
+    def test_list_answers_304_until_defects_change(self):
+        self.client.login(username="m", password="pass")
+        url = reverse("defects:api_defects")
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.mine.title = "Mine, renamed"
+        self.mine.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_engineer_sees_only_own_defects(self):
+        self.client.login(username="e", password="pass")
+        data = self.client.get(reverse("defects:api_defects")).json()
+        self.assertEqual([r["id"] for r in data["results"]], [self.mine.id])
+        other = Defect.objects.exclude(pk=self.mine.pk).first()
+        self.assertEqual(self.client.get(reverse("defects:api_defect", args=[other.id])).status_code, 404)
+
+    def test_patch_changes_fields_and_status_with_history(self):
+        self.client.login(username="e", password="pass")
+        url = reverse("defects:api_defect", args=[self.mine.id])
+        resp = self.client.patch(
+            url, {"title": "Mine (fixed)", "status": DefectStatus.IN_PROGRESS}, content_type="application/json"
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["status"], DefectStatus.IN_PROGRESS)
+        self.mine.refresh_from_db()
+        self.assertEqual(self.mine.title, "Mine (fixed)")
+        self.assertEqual(
+            list(self.mine.history.order_by("id").values_list("action", flat=True)),
+            ["Изменены поля дефекта", "Изменён статус"],
+        )
+        # Закрывать может только менеджер — и отказ не сохраняет остальные поля запроса.
+        resp = self.client.patch(
+            url, {"title": "CHANGED", "status": DefectStatus.CANCELLED}, content_type="application/json"
+        )
+        self.assertEqual(resp.status_code, 403)
+        self.mine.refresh_from_db()
+        self.assertEqual(self.mine.title, "Mine (fixed)")
 
+    def test_list_has_no_last_modified_and_hidden_defect_has_no_etag(self):
+        self.client.login(username="m", password="pass")
+        resp = self.client.get(reverse("defects:api_defects"))
+        self.assertFalse(resp.has_header("Last-Modified"))
+
+        self.client.login(username="e", password="pass")
+        other = Defect.objects.exclude(pk=self.mine.pk).first()
+        resp = self.client.get(reverse("defects:api_defect", args=[other.id]), HTTP_IF_NONE_MATCH="*")
+        self.assertEqual(resp.status_code, 404)
+
+    def test_comment_post_and_list(self):
+        self.client.login(username="e", password="pass")
+        url = reverse("defects:api_comments", args=[self.mine.id])
+        resp = self.client.post(url, {"body": "Проверил"}, content_type="application/json")
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(self.client.get(url).json()["results"][0]["body"], "Проверил")
+
+
+class DefectAttachmentStorageTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        override = override_settings(MEDIA_ROOT=self.media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(self.media.cleanup)
+        self.manager = User.objects.create_user(username="m", password="pass", role=UserRole.MANAGER)
+        self.project = Project.objects.create(name="Объект 1")
+        self.defects = [
+            Defect.objects.create(project=self.project, title=f"Д{i}", description="О", created_by=self.manager)
+            for i in range(2)
+        ]
+
+    def _attach(self, defect, name="photo.jpg", data=b"same bytes"):
+        return DefectAttachment.objects.create(
+            defect=defect, uploaded_by=self.manager, file=SimpleUploadedFile(name, data, content_type="text/html")
+        )
+
+    def test_same_content_is_stored_once_with_metadata(self):
+        first = self._attach(self.defects[0])
+        second = self._attach(self.defects[1], name="other.jpg")
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(first.sha256, hashlib.sha256(b"same bytes").hexdigest())
+        self.assertTrue(first.file.name.endswith(first.sha256))
+        self.assertEqual((second.original_name, second.size), ("other.jpg", 10))
+        # Тип — по расширению, а не со слов браузера.
+        self.assertEqual(second.content_type, "image/jpeg")
+
+    def test_blob_is_deleted_with_last_reference(self):
+        first = self._attach(self.defects[0])
+        second = self._attach(self.defects[1])
+        path = first.file.path
+        os.utime(path, (0, 0))  # старше окна, в котором блоб может ждать коммита чужой загрузки
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(path))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.defect.delete()
+        self.assertFalse(os.path.exists(path))
+
+    def test_download_checks_access_and_serves_ranges(self):
+        att = self._attach(self.defects[0], name="plan.pdf", data=b"0123456789")
+        url = reverse("defects:attachment", args=[att.id])
+        User.objects.create_user(username="e", password="pass", role=UserRole.ENGINEER)
+        self.client.login(username="e", password="pass")
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        self.client.login(username="m", password="pass")
+        resp = self.client.get(url)
+        self.assertEqual(b"".join(resp.streaming_content), b"0123456789")
+        self.assertEqual(resp["Accept-Ranges"], "bytes")
+        self.assertIn('inline; filename="plan.pdf"', resp["Content-Disposition"])
+
+        resp = self.client.get(url, HTTP_RANGE="bytes=2-5")
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(resp["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(b"".join(resp.streaming_content), b"2345")
+        resp = self.client.get(url, HTTP_RANGE="bytes=-3")
+        self.assertEqual(b"".join(resp.streaming_content), b"789")
+        self.assertEqual(self.client.get(url, HTTP_RANGE="bytes=20-").status_code, 416)
+        empty = self._attach(self.defects[1], name="empty.pdf", data=b"")
+        resp = self.client.get(reverse("defects:attachment", args=[empty.id]), HTTP_RANGE="bytes=-500")
+        self.assertEqual(resp.status_code, 416)
+        # Файл сменился (другой ETag) — отдаём целиком.
+        resp = self.client.get(url, HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(resp.status_code, 200)
+
+    @override_settings(ATTACHMENT_SENDFILE_HEADER="X-Accel-Redirect")
+    def test_download_is_handed_to_front_server(self):
+        att = self._attach(self.defects[0], name="page.html", data=b"<script>")
+        self.client.login(username="m", password="pass")
+        resp = self.client.get(reverse("defects:attachment", args=[att.id]))
+        self.assertEqual(resp["X-Accel-Redirect"], f"/protected-media/{att.file.name}")
+        self.assertFalse(resp.content)
+        # HTML не открывается в браузере с нашего домена — только скачивание.
+        self.assertTrue(resp["Content-Disposition"].startswith("attachment"))
+
+    def test_gc_removes_unreferenced_blobs(self):
+        att = self._attach(self.defects[0])
+        orphan = self._attach(self.defects[1], data=b"orphan")
+        orphan_path = orphan.file.path
+        DefectAttachment.objects.filter(pk=orphan.pk).delete()  # в обход сигналов
+        self.assertEqual(collect_garbage(min_age=0), (1, 6))
+        self.assertFalse(os.path.exists(orphan_path))
+        self.assertTrue(os.path.exists(att.file.path))
+
+
+class DefectArchiveTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        override = override_settings(MEDIA_ROOT=self.media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(self.media.cleanup)
+        self.manager = User.objects.create_user(username="m", password="pass", role=UserRole.MANAGER)
+        self.project = Project.objects.create(name="Объект 1")
+        self.old = self._defect("Трещина в фундаменте", DefectStatus.CLOSED, days=400)
+        self.recent = self._defect("Трещина в стене", DefectStatus.CLOSED, days=10)
+        self.open = self._defect("Трещина в перекрытии", DefectStatus.IN_PROGRESS, days=400)
+        DefectComment.objects.create(defect=self.old, author=self.manager, body="Залито раствором")
+        DefectHistory.objects.create(defect=self.old, actor=self.manager, action="Закрыт")
+        self.attachment = DefectAttachment.objects.create(
+            defect=self.old, uploaded_by=self.manager, file=SimpleUploadedFile("photo.jpg", b"old photo")
+        )
+
+    def _defect(self, title, status, days):
+        defect = Defect.objects.create(
+            project=self.project, title=title, description="-", status=status, created_by=self.manager
+        )
+        Defect.objects.filter(pk=defect.pk).update(updated_at=timezone.now() - timedelta(days=days))
+        return defect
+
+    def _archive(self):
+        out = StringIO()
+        call_command("archive_defects", "--older-than", "365", "--batch-size", "1", stdout=out)
+        return out.getvalue()
+
+    def test_moves_old_closed_defect_with_children(self):
+        self.assertIn("Перенесено в архив дефектов: 1", self._archive())
+        self.assertFalse(Defect.objects.filter(pk=self.old.pk).exists())
+        self.assertFalse(DefectListRow.objects.filter(defect_id=self.old.pk).exists())
+        self.assertFalse(DefectComment.objects.filter(defect_id=self.old.pk).exists())
+        self.assertEqual(set(Defect.objects.values_list("pk", flat=True)), {self.recent.pk, self.open.pk})
+
+        archived = ArchivedDefect.objects.get(defect_id=self.old.pk)
+        self.assertEqual((archived.title, archived.project_name), ("Трещина в фундаменте", "Объект 1"))
+        self.assertEqual([c.body for c in archived.comments.all()], ["Залито раствором"])
+        self.assertEqual([h.action for h in archived.history.all()], ["Закрыт"])
+        self.assertEqual(sum(DefectCounter.objects.values_list("count", flat=True)), 2)
+
+        # Файл вложения остаётся: на блоб ссылается архивное вложение.
+        att = ArchivedDefectAttachment.objects.get(pk=self.attachment.pk)
+        os.utime(att.file.path, (0, 0))
+        collect_garbage(min_age=0)
+        self.assertTrue(os.path.exists(att.file.path))
+        self.assertEqual(archive_defects(timezone.now() - timedelta(days=365)), 0)
+
+    def test_list_search_and_api_read_archive_only_by_switch(self):
+        self._archive()
+        self.client.login(username="m", password="pass")
+        resp = self.client.get(reverse("defects:list"), {"q": "трещина"})
+        self.assertEqual({d.pk for d in resp.context["defects"]}, {self.recent.pk, self.open.pk})
+        resp = self.client.get(reverse("defects:list"), {"q": "трещина", "archive": "1"})
+        self.assertEqual({d.pk for d in resp.context["defects"]}, {self.old.pk, self.recent.pk, self.open.pk})
+        self.assertContains(resp, reverse("defects:archived", args=[self.old.pk]))
+
+        url = reverse("defects:api_defects")
+        data = self.client.get(url, {"fields": "id", "archive": "1"}).json()
+        self.assertEqual({r["id"] for r in data["results"]}, {self.old.pk, self.recent.pk, self.open.pk})
+        self.assertNotIn(self.old.pk, [r["id"] for r in self.client.get(url).json()["results"]])
+
+    def test_old_link_opens_read_only_archive_card(self):
+        self._archive()
+        self.client.login(username="m", password="pass")
+        resp = self.client.get(reverse("defects:detail", args=[self.old.pk]))
+        self.assertRedirects(resp, reverse("defects:archived", args=[self.old.pk]))
+        resp = self.client.get(resp["Location"])
+        self.assertContains(resp, "Залито раствором")
+        att_url = reverse("defects:archived_attachment", args=[self.attachment.pk])
+        self.assertContains(resp, att_url)
+        self.assertEqual(b"".join(self.client.get(att_url).streaming_content), b"old photo")
@@ -1,17 +1,29 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 app_name = "defects"
 
 urlpatterns = [
     path("", views.list_defects, name="list"),
     path("defects/create/", views.create_defect, name="create"),
+    path("defects/bulk/", views.bulk_action, name="bulk"),
+    path("defects/import/", views.import_defects_view, name="import"),
+    path("defects/import/<int:job_id>/", views.import_job_view, name="import_job"),
     path("defects/<int:defect_id>/", views.defect_detail, name="detail"),
     path("defects/<int:defect_id>/edit/", views.edit_defect, name="edit"),
+    path("defects/<int:defect_id>/comments/", views.defect_comments, name="comments"),
+    path("defects/<int:defect_id>/history/", views.defect_history, name="history"),
     path("defects/<int:defect_id>/comment/", views.add_comment, name="comment"),
     path("defects/<int:defect_id>/attach/", views.add_attachment, name="attach"),
+    path("attachments/<int:attachment_id>/", views.download_attachment, name="attachment"),
+    path("archive/<int:defect_id>/", views.archived_defect_detail, name="archived"),
+    path("archive/attachments/<int:attachment_id>/", views.download_archived_attachment, name="archived_attachment"),
     path("defects/<int:defect_id>/status/", views.change_status, name="status"),
+    path("api/defects/", api.defects, name="api_defects"),
+    path("api/defects/<int:defect_id>/", api.defect, name="api_defect"),
+    path("api/defects/<int:defect_id>/comments/", api.comments, name="api_comments"),
+    path("api/defects/<int:defect_id>/history/", api.history, name="api_history"),
 ]
 
 
@@ -2,17 +2,54 @@ from __future__ import annotations
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from django.db.models import Q
-from django.http import HttpRequest, HttpResponse
+from django.db.models import Prefetch, QuerySet
+from django.http import Http404, HttpRequest, HttpResponse, HttpResponseBadRequest
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 
 from accounts.models import UserRole
+from core import cache
+from core.downloads import serve_file
+from core.replicas import read_replica
 from projects.models import Project
 
-from .forms import AttachmentForm, CommentForm, DefectForm, StatusChangeForm
-from .models import Defect, DefectPriority, DefectStatus
-from .services import log_defect_action
+from .archive import list_sources
+from .conditional import defect_etag, list_etag
+from .facets import facet_counts
+from .filters import apply_defect_filters, read_filters, resolve_sort, visible_to_engineer
+from .forms import AttachmentForm, BulkActionForm, CommentForm, DefectForm, ImportForm, StatusChangeForm
+from .imports import COLUMNS, fail_stale_imports, queue_import
+from .models import (
+    ArchivedDefect,
+    ArchivedDefectAttachment,
+    ArchivedDefectComment,
+    ArchivedDefectHistory,
+    Defect,
+    DefectAttachment,
+    DefectComment,
+    DefectHistory,
+    DefectListRow,
+    DefectPriority,
+    DefectStatus,
+    ImportJob,
+)
+from .pagination import KeysetPaginator
+from .services import (
+    BULK_LIMIT,
+    apply_status_change,
+    bulk_update_defects,
+    defect_snapshot,
+    log_defect_action,
+    save_defect_changes,
+    save_new_defect,
+    status_change_error,
+)
+
+
+# Сколько комментариев/записей истории показывать сразу; остальное подгружается фрагментами.
+THREAD_PAGE_SIZE = 20
 
 
 def _is_manager(request: HttpRequest) -> bool:
@@ -23,6 +60,10 @@ def _is_engineer(request: HttpRequest) -> bool:
     return request.user.is_authenticated and request.user.role == UserRole.ENGINEER
 
 
+def _is_observer(request: HttpRequest) -> bool:
+    return request.user.is_authenticated and request.user.role == UserRole.OBSERVER
+
+
 def _can_work_with_defect(request: HttpRequest, defect: Defect) -> bool:
     if _is_manager(request):
         return True
@@ -31,50 +72,41 @@ def _can_work_with_defect(request: HttpRequest, defect: Defect) -> bool:
     return False
 
 
+def _can_view_defect(request: HttpRequest, defect: Defect) -> bool:
+    # Как в списке: менеджер и наблюдатель видят всё, инженер — свои дефекты.
+    return not _is_engineer(request) or _can_work_with_defect(request, defect)
+
+
+def project_choices() -> list[dict]:
+    return cache.get_or_build(
+        cache.PROJECT_CHOICES, [cache.PROJECTS], lambda: list(Project.objects.values("id", "name"))
+    )
+
+
 @login_required
+# Наблюдатель только читает — его список не нагружает основную БД.
+@read_replica(when=_is_observer)
+# Браузер хранит страницу, но перед показом переспрашивает; неизменившаяся — 304 без рендера.
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=list_etag)
 def list_defects(request: HttpRequest) -> HttpResponse:
-    qs = (
-        Defect.objects.select_related("project", "stage", "assignee", "created_by")
-        .all()
-    )
+    # Список читается из денормализованной таблицы: названия и подписи уже в строке, без JOIN-ов.
+    qs = DefectListRow.objects.all()
 
     # Наблюдатель видит всё (read-only). Инженер — только свои (назначенные или созданные).
     if _is_engineer(request):
-        qs = qs.filter(Q(assignee_id=request.user.id) | Q(created_by_id=request.user.id))
-
-    status = request.GET.get("status") or ""
-    priority = request.GET.get("priority") or ""
-    project_id = request.GET.get("project") or ""
-    q = request.GET.get("q") or ""
-    sort = request.GET.get("sort") or "-created_at"
-
-    if status:
-        qs = qs.filter(status=status)
-    if priority:
-        qs = qs.filter(priority=priority)
-    if project_id.isdigit():
-        qs = qs.filter(project_id=int(project_id))
-    if q:
-        qs = qs.filter(Q(title__icontains=q) | Q(description__icontains=q))
-
-    allowed_sorts = {
-        "-created_at": "-created_at",
-        "created_at": "created_at",
-        "due_date": "due_date",
-        "-due_date": "-due_date",
-        "priority": "priority",
-        "-priority": "-priority",
-        "status": "status",
-        "-status": "-status",
-    }
-    qs = qs.order_by(allowed_sorts.get(sort, "-created_at"))
+        qs = visible_to_engineer(qs, request.user.id)
+
+    filters = read_filters(request.GET)
+    qs = apply_defect_filters(qs, filters)
+    sources = list_sources(qs, filters, request.user.id if _is_engineer(request) else None)
 
-    paginator = Paginator(qs, 25)
-    page_obj = paginator.get_page(request.GET.get("page") or 1)
+    page_obj = KeysetPaginator(sources, resolve_sort(filters)).page(request.GET.get("cursor"))
 
-    projects = Project.objects.all()
+    facets = facet_counts(filters, request.user.id if _is_engineer(request) else None)
+    projects = [{**p, "count": facets["project"][p["id"]]} for p in project_choices()]
     qs_params = request.GET.copy()
-    qs_params.pop("page", None)
+    qs_params.pop("cursor", None)
     filters_qs = qs_params.urlencode()
 
     return render(
@@ -84,19 +116,61 @@ def list_defects(request: HttpRequest) -> HttpResponse:
             "defects": page_obj.object_list,
             "page_obj": page_obj,
             "projects": projects,
-            "status_choices": DefectStatus.choices,
-            "priority_choices": DefectPriority.choices,
-            "filters": {"status": status, "priority": priority, "project": project_id, "q": q, "sort": sort},
+            "status_choices": [(v, label, facets["status"][v]) for v, label in DefectStatus.choices],
+            "priority_choices": [(v, label, facets["priority"][v]) for v, label in DefectPriority.choices],
+            "filters": filters,
             "filters_qs": filters_qs,
+            "bulk_form": BulkActionForm() if _is_manager(request) else None,
         },
     )
 
 
+def _recent_comments() -> QuerySet:
+    # Последние комментарии (новые сверху в запросе, в шаблоне переворачиваются); +1 — признак «есть ещё».
+    return DefectComment.objects.select_related("author").order_by("-id")[: THREAD_PAGE_SIZE + 1]
+
+
+def _recent_history() -> QuerySet:
+    return DefectHistory.objects.select_related("actor").order_by("-id")[: THREAD_PAGE_SIZE + 1]
+
+
+def _thread_page(rows: list, oldest_first: bool) -> dict:
+    """Порция ленты (комментарии/история) и id для подгрузки более ранних записей."""
+    has_more = len(rows) > THREAD_PAGE_SIZE
+    rows = rows[:THREAD_PAGE_SIZE]
+    return {
+        "items": rows[::-1] if oldest_first else rows,
+        "before": rows[-1].id if has_more else None,
+    }
+
+
+def _before_id(request: HttpRequest) -> int | None:
+    """Курсор ``?before=`` подгрузки ленты; нечисловой (в т.ч. «²») — как без курсора."""
+    try:
+        return int(request.GET.get("before") or "")
+    except ValueError:
+        return None
+
+
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=defect_etag)
 def defect_detail(request: HttpRequest, defect_id: int) -> HttpResponse:
-    defect = get_object_or_404(
-        Defect.objects.select_related("project", "stage", "assignee", "created_by"), id=defect_id
+    defect = (
+        Defect.objects.select_related("project", "stage", "assignee", "created_by")
+        .prefetch_related(
+            Prefetch("comments", queryset=_recent_comments(), to_attr="recent_comments"),
+            Prefetch("history", queryset=_recent_history(), to_attr="recent_history"),
+            "attachments",
+        )
+        .filter(id=defect_id)
+        .first()
     )
+    if defect is None:
+        # Старые ссылки на перенесённый в архив дефект ведут на его архивную карточку.
+        if ArchivedDefect.objects.filter(pk=defect_id).exists():
+            return redirect("defects:archived", defect_id=defect_id)
+        raise Http404("Дефект не найден.")
 
     can_manage = _is_manager(request)
     can_edit = can_manage or (_is_engineer(request) and _can_work_with_defect(request, defect))
@@ -127,10 +201,59 @@ def defect_detail(request: HttpRequest, defect_id: int) -> HttpResponse:
             "status_form": status_form,
             "allowed_next": allowed_next,
             "allowed_next_labels": [status_labels.get(s, s) for s in allowed_next],
+            "comments": _thread_page(defect.recent_comments, oldest_first=True),
+            "history": _thread_page(defect.recent_history, oldest_first=False),
         },
     )
 
 
+@login_required
+def archived_defect_detail(request: HttpRequest, defect_id: int) -> HttpResponse:
+    """Карточка архивного дефекта — только просмотр."""
+    defect = get_object_or_404(
+        ArchivedDefect.objects.prefetch_related(
+            Prefetch("comments", queryset=ArchivedDefectComment.objects.select_related("author").order_by("id")),
+            Prefetch("history", queryset=ArchivedDefectHistory.objects.select_related("actor").order_by("-id")),
+            "attachments",
+        ),
+        pk=defect_id,
+    )
+    if not _can_view_defect(request, defect):
+        raise Http404("Дефект не найден.")
+    return render(
+        request,
+        "defects/archived_detail.html",
+        {
+            "defect": defect,
+            # Архив не растёт — ленты показываются целиком, без подгрузки.
+            "comments": {"items": defect.comments.all(), "before": None},
+            "history": {"items": defect.history.all(), "before": None},
+        },
+    )
+
+
+@login_required
+def defect_comments(request: HttpRequest, defect_id: int) -> HttpResponse:
+    """Фрагмент с более ранними комментариями (подгружается со страницы дефекта)."""
+    before = _before_id(request)
+    rows = DefectComment.objects.select_related("author").filter(defect_id=defect_id)
+    if before is not None:
+        rows = rows.filter(id__lt=before)
+    page = _thread_page(list(rows.order_by("-id")[: THREAD_PAGE_SIZE + 1]), oldest_first=True)
+    return render(request, "defects/_comments.html", {"defect_id": defect_id, "comments": page})
+
+
+@login_required
+def defect_history(request: HttpRequest, defect_id: int) -> HttpResponse:
+    """Фрагмент с более ранними записями истории."""
+    before = _before_id(request)
+    rows = DefectHistory.objects.select_related("actor").filter(defect_id=defect_id)
+    if before is not None:
+        rows = rows.filter(id__lt=before)
+    page = _thread_page(list(rows.order_by("-id")[: THREAD_PAGE_SIZE + 1]), oldest_first=False)
+    return render(request, "defects/_history.html", {"defect_id": defect_id, "history": page})
+
+
 @login_required
 def create_defect(request: HttpRequest) -> HttpResponse:
     if request.user.role == UserRole.OBSERVER:
@@ -145,8 +268,7 @@ def create_defect(request: HttpRequest) -> HttpResponse:
                 # Инженер создаёт дефект, но назначение исполнителя/срока — менеджер.
                 defect.assignee = None
                 defect.due_date = None
-            defect.save()
-            log_defect_action(defect=defect, actor=request.user, action="Создан дефект", from_status=None, to_status=defect.status)
+            save_new_defect(defect, request.user)
             messages.success(request, "Дефект создан.")
             return redirect("defects:detail", defect_id=defect.id)
     else:
@@ -165,7 +287,7 @@ def edit_defect(request: HttpRequest, defect_id: int) -> HttpResponse:
         messages.error(request, "У вас нет прав на редактирование этого дефекта.")
         return redirect("defects:detail", defect_id=defect_id)
 
-    old = {"title": defect.title, "description": defect.description, "priority": defect.priority, "assignee_id": defect.assignee_id, "due_date": str(defect.due_date) if defect.due_date else None}
+    old = defect_snapshot(defect)
     old_assignee_id = defect.assignee_id
     old_due_date = defect.due_date
 
@@ -176,11 +298,7 @@ def edit_defect(request: HttpRequest, defect_id: int) -> HttpResponse:
             if request.user.role != UserRole.MANAGER:
                 defect.assignee_id = old_assignee_id
                 defect.due_date = old_due_date
-            defect.save()
-            new = {"title": defect.title, "description": defect.description, "priority": defect.priority, "assignee_id": defect.assignee_id, "due_date": str(defect.due_date) if defect.due_date else None}
-            changes = {k: {"from": old[k], "to": new[k]} for k in old.keys() if old[k] != new[k]}
-            if changes:
-                log_defect_action(defect=defect, actor=request.user, action="Изменены поля дефекта", changes=changes)
+            save_defect_changes(defect, old, request.user)
             messages.success(request, "Изменения сохранены.")
             return redirect("defects:detail", defect_id=defect.id)
     else:
@@ -229,6 +347,36 @@ def add_attachment(request: HttpRequest, defect_id: int) -> HttpResponse:
     return redirect("defects:detail", defect_id=defect_id)
 
 
+@login_required
+def download_attachment(request: HttpRequest, attachment_id: int) -> HttpResponse:
+    return _serve_attachment(request, DefectAttachment, attachment_id)
+
+
+@login_required
+def download_archived_attachment(request: HttpRequest, attachment_id: int) -> HttpResponse:
+    return _serve_attachment(request, ArchivedDefectAttachment, attachment_id)
+
+
+def _serve_attachment(request: HttpRequest, model, attachment_id: int) -> HttpResponse:
+    attachment = get_object_or_404(
+        model.objects.select_related("defect").only(
+            "file", "size", "content_type", "original_name", "sha256", "defect__assignee_id", "defect__created_by_id"
+        ),
+        id=attachment_id,
+    )
+    if not _can_view_defect(request, attachment.defect):
+        raise Http404("Вложение не найдено.")
+    return serve_file(
+        request,
+        name=attachment.file.name,
+        path=attachment.file.path,
+        size=attachment.size,
+        content_type=attachment.content_type,
+        filename=attachment.original_name,
+        etag=attachment.sha256,
+    )
+
+
 @login_required
 def change_status(request: HttpRequest, defect_id: int) -> HttpResponse:
     if request.user.role == UserRole.OBSERVER:
@@ -248,22 +396,75 @@ def change_status(request: HttpRequest, defect_id: int) -> HttpResponse:
     if new_status == defect.status:
         return redirect("defects:detail", defect_id=defect_id)
 
-    if new_status not in defect.allowed_next_statuses():
-        messages.error(request, "Недопустимый переход статуса.")
-        return redirect("defects:detail", defect_id=defect_id)
-
-    # Менеджер может закрывать/отменять. Инженер — только рабочие статусы.
-    if not _is_manager(request) and new_status in (DefectStatus.CLOSED, DefectStatus.CANCELLED):
-        messages.error(request, "Недостаточно прав для закрытия/отмены.")
+    error = status_change_error(request.user, defect, new_status)
+    if error:
+        messages.error(request, error)
         return redirect("defects:detail", defect_id=defect_id)
 
-    from_status = defect.status
-    defect.status = new_status
-    defect.save(update_fields=["status", "updated_at"])
-    log_defect_action(defect=defect, actor=request.user, action="Изменён статус", from_status=from_status, to_status=new_status)
-    if comment:
-        defect.comments.create(author=request.user, body=comment)
+    apply_status_change(defect, new_status, request.user, comment)
     messages.success(request, "Статус обновлён.")
     return redirect("defects:detail", defect_id=defect_id)
 
 
+@login_required
+def bulk_action(request: HttpRequest) -> HttpResponse:
+    """Массовая смена статуса/исполнителя для выбранных на странице списка дефектов (только менеджер)."""
+    back = f"{reverse('defects:list')}?{request.POST.get('filters_qs', '')}"
+    if request.method != "POST" or not _is_manager(request):
+        return redirect(back)
+
+    raw_ids = request.POST.getlist("ids")
+    # isdigit() пропускает «²» и другие не-ASCII цифры, на которых int() падает.
+    if not all(v.isascii() and v.isdigit() for v in raw_ids):
+        return HttpResponseBadRequest("Некорректные id дефектов.")
+    ids = sorted({int(v) for v in raw_ids})
+    form = BulkActionForm(request.POST)
+    if not ids:
+        messages.error(request, "Не выбрано ни одного дефекта.")
+    elif len(ids) > BULK_LIMIT:
+        messages.error(request, f"За раз можно изменить не больше {BULK_LIMIT} дефектов.")
+    elif not form.is_valid():
+        messages.error(request, " ".join(form.non_field_errors()) or "Некорректные параметры.")
+    else:
+        updated, invalid = bulk_update_defects(
+            ids, actor=request.user, status=form.cleaned_data["status"], assignee=form.cleaned_data["assignee"]
+        )
+        if invalid:
+            shown = ", ".join(f"#{pk}" for pk in invalid[:10]) + (" …" if len(invalid) > 10 else "")
+            messages.error(request, f"Недопустимый переход статуса для дефектов {shown}. Ничего не изменено.")
+        else:
+            messages.success(request, f"Изменено дефектов: {updated}.")
+    return redirect(back)
+
+
+def _render_import(request: HttpRequest, form: ImportForm, job: ImportJob | None = None) -> HttpResponse:
+    return render(
+        request,
+        "defects/import.html",
+        {"form": form, "job": job, "columns": [name.capitalize() for name in COLUMNS]},
+    )
+
+
+@login_required
+def import_defects_view(request: HttpRequest) -> HttpResponse:
+    if not _is_manager(request):
+        return redirect("defects:list")
+
+    if request.method == "POST":
+        form = ImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            # Строки сохраняет воркер run_import_jobs — запрос только кладёт файл в очередь.
+            job = queue_import(form.cleaned_data["file"], request.user)
+            return redirect("defects:import_job", job_id=job.id)
+    else:
+        form = ImportForm()
+    return _render_import(request, form)
+
+
+@login_required
+def import_job_view(request: HttpRequest, job_id: int) -> HttpResponse:
+    if not _is_manager(request):
+        return redirect("defects:list")
+    fail_stale_imports()
+    job = get_object_or_404(ImportJob, id=job_id)
+    return _render_import(request, ImportForm(), job)
@@ -4,7 +4,9 @@ import sys
 
 
 def main() -> None:
-    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "sistemakontrolya.settings")
+    # Тесты — со своими настройками (кэш в памяти, зеркало реплики); явный DJANGO_SETTINGS_MODULE важнее.
+    settings = "sistemakontrolya.test_settings" if sys.argv[1:2] == ["test"] else "sistemakontrolya.settings"
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
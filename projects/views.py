@@ -1,5 +1,6 @@
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db import transaction
 from django.db.models.deletion import ProtectedError
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
@@ -42,7 +43,9 @@ def edit_project(request: HttpRequest, project_id: int) -> HttpResponse:
     if request.method == "POST":
         form = ProjectForm(request.POST, instance=project)
         if form.is_valid():
-            form.save()
+            # Вместе с названием в той же транзакции обновляются строки списка дефектов.
+            with transaction.atomic():
+                form.save()
             return redirect("projects:list")
     else:
         form = ProjectForm(instance=project)
@@ -96,7 +99,8 @@ def edit_stage(request: HttpRequest, stage_id: int) -> HttpResponse:
     if request.method == "POST":
         form = StageForm(request.POST, instance=stage)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                form.save()
             messages.success(request, "Этап обновлён.")
             return redirect("projects:stages")
     else:
@@ -0,0 +1,10 @@
+from django.contrib import admin
+
+from .models import ExportJob
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "format", "status", "rows_done", "rows_total", "requested_by", "created_at", "finished_at")
+    list_filter = ("status", "format")
+    readonly_fields = ("filters_hash", "data_version", "started_at", "finished_at")
@@ -1,41 +1,43 @@
 from __future__ import annotations
 
+import tempfile
+from collections.abc import Iterable
 from datetime import datetime
 
-from django.http import HttpResponse
+from django.http import FileResponse
 from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
 
-from defects.models import Defect
-
-
-def defects_to_xlsx(qs) -> HttpResponse:
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Дефекты"
-
-    ws.append(["ID", "Заголовок", "Объект", "Этап", "Статус", "Приоритет", "Исполнитель", "Срок", "Создано"])
-    for d in qs:
-        ws.append(
-            [
-                d.id,
-                d.title,
-                d.project.name,
-                d.stage.name if d.stage else "",
-                d.get_status_display(),
-                d.get_priority_display(),
-                d.assignee.username if d.assignee else "",
-                d.due_date.isoformat() if d.due_date else "",
-                d.created_at.strftime("%Y-%m-%d %H:%M"),
-            ]
-        )
-
-    response = HttpResponse(
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
-    response["Content-Disposition"] = (
-        f'attachment; filename="defects_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx"'
-    )
-    wb.save(response)
-    return response
+from .export import export_header, export_rows
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Ширина колонок задаётся один раз на колонку, а не на каждую ячейку.
+COLUMN_WIDTHS = (8, 50, 30, 25, 14, 14, 20, 12, 17)
 
 
+def write_defects_xlsx(rows: Iterable[list], fileobj) -> None:
+    """Записать выгрузку в ``fileobj`` в режиме write-only: строки не держатся в памяти."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Дефекты")
+    for idx, width in enumerate(COLUMN_WIDTHS, start=1):
+        ws.column_dimensions[get_column_letter(idx)].width = width
+
+    ws.append(export_header())
+    for row in rows:
+        # Даты пишутся как типизированные ячейки (формат ставит openpyxl).
+        ws.append(row)
+    wb.save(fileobj)
+
+
+def defects_to_xlsx(*sources) -> FileResponse:
+    # Файл собирается на диске и отдаётся потоком; временный файл удалится при закрытии ответа.
+    tmp = tempfile.TemporaryFile(suffix=".xlsx")
+    write_defects_xlsx(export_rows(*sources), tmp)
+    tmp.seek(0)
+    return FileResponse(
+        tmp,
+        as_attachment=True,
+        filename=f"defects_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+        content_type=XLSX_CONTENT_TYPE,
+    )
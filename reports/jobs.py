@@ -0,0 +1,138 @@
+"""Фоновые выгрузки: запрос ставит задание в очередь, файл собирает команда ``run_export_jobs``."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from collections.abc import Iterable, Iterator
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from core import cache
+from defects.archive import list_sources
+from defects.filters import apply_defect_filters
+from defects.models import DefectListRow
+
+from .excel import write_defects_xlsx
+from .export import CHUNK_SIZE, csv_lines, export_rows
+from .models import ExportFormat, ExportJob, ExportJobStatus
+
+EXPORTS_DIR = "exports"
+
+# Задание дольше этого в статусе «выполняется» — воркер упал; его не ждут, а ставят новое.
+JOB_TIMEOUT = timedelta(hours=1)
+
+
+def filters_hash(filters: dict[str, str]) -> str:
+    return hashlib.sha256(json.dumps(filters, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def data_version(filters: dict[str, str]) -> str:
+    """Отпечаток данных выгрузки без запросов к БД — по версиям кэша.
+
+    Версии меняются при любом изменении дефектов, переименовании объектов, этапов и
+    исполнителей (названия берутся из строк списка) и переносе в архив. Отметка «просрочен»
+    зависит ещё и от даты.
+    """
+    parts = [f"{ns}{v}" for ns, v in cache.versions([cache.DEFECTS, cache.PROJECTS, cache.ARCHIVE]).items()]
+    if filters.get("overdue"):
+        parts.append(timezone.localdate().isoformat())
+    return hashlib.sha1(":".join(parts).encode("utf-8")).hexdigest()
+
+
+def fail_stale_jobs() -> int:
+    """Пометить упавшими задания, которые выполняются дольше ``JOB_TIMEOUT``."""
+    now = timezone.now()
+    return ExportJob.objects.filter(status=ExportJobStatus.RUNNING, started_at__lt=now - JOB_TIMEOUT).update(
+        status=ExportJobStatus.FAILED, error="Воркер не завершил выгрузку.", finished_at=now
+    )
+
+
+def find_or_create_job(*, user, fmt: str, filters: dict[str, str]) -> ExportJob:
+    """Готовое или уже поставленное задание с теми же фильтрами и данными переиспользуется."""
+    key = filters_hash(filters)
+    version = data_version(filters)
+    fail_stale_jobs()
+    job = (
+        ExportJob.objects.filter(filters_hash=key, format=fmt, data_version=version)
+        .exclude(status=ExportJobStatus.FAILED)
+        .order_by("-created_at")
+        .first()
+    )
+    if job is None:
+        job = ExportJob.objects.create(
+            requested_by=user, format=fmt, filters=filters, filters_hash=key, data_version=version
+        )
+    return job
+
+
+def claim_next_job() -> ExportJob | None:
+    """Взять следующее задание из очереди; безопасно при нескольких воркерах."""
+    while True:
+        job = ExportJob.objects.filter(status=ExportJobStatus.PENDING).order_by("created_at").first()
+        if job is None:
+            return None
+        claimed = ExportJob.objects.filter(pk=job.pk, status=ExportJobStatus.PENDING).update(
+            status=ExportJobStatus.RUNNING, started_at=timezone.now()
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def _tracked(rows: Iterable[list], job: ExportJob) -> Iterator[list]:
+    done = 0
+    for done, row in enumerate(rows, start=1):
+        if done % CHUNK_SIZE == 0:
+            ExportJob.objects.filter(pk=job.pk).update(rows_done=done)
+        yield row
+    job.rows_done = done
+
+
+def run_job(job: ExportJob) -> None:
+    sources = list_sources(apply_defect_filters(DefectListRow.objects.all(), job.filters), job.filters)
+    job.rows_total = sum(qs.count() for qs in sources)
+    ExportJob.objects.filter(pk=job.pk).update(rows_total=job.rows_total)
+
+    name = f"{EXPORTS_DIR}/defects_{job.pk}_{job.created_at.strftime('%Y%m%d_%H%M%S')}.{job.format}"
+    path = Path(settings.MEDIA_ROOT) / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix(path.suffix + ".part")
+    try:
+        rows = _tracked(export_rows(*sources), job)
+        if job.format == ExportFormat.XLSX:
+            with open(partial, "wb") as fh:
+                write_defects_xlsx(rows, fh)
+        else:
+            with open(partial, "w", encoding="utf-8", newline="") as fh:
+                fh.writelines(csv_lines(rows))
+        partial.replace(path)
+    except Exception as exc:
+        partial.unlink(missing_ok=True)
+        job.status = ExportJobStatus.FAILED
+        job.error = str(exc)
+        job.finished_at = timezone.now()
+        job.save(update_fields=["status", "error", "finished_at"])
+        raise
+
+    job.file.name = name
+    job.status = ExportJobStatus.DONE
+    job.finished_at = timezone.now()
+    job.save(update_fields=["file", "status", "rows_done", "finished_at"])
+
+
+def purge_jobs(older_than) -> int:
+    """Удалить завершённые задания старше ``older_than`` вместе с файлами."""
+    jobs = ExportJob.objects.filter(
+        status__in=[ExportJobStatus.DONE, ExportJobStatus.FAILED], created_at__lt=older_than
+    )
+    count = 0
+    for job in jobs.iterator():
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        count += 1
+    return count
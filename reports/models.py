@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.db import models
+
+
+class ExportFormat(models.TextChoices):
+    CSV = "csv", "CSV"
+    XLSX = "xlsx", "Excel"
+
+
+class ExportJobStatus(models.TextChoices):
+    PENDING = "pending", "В очереди"
+    RUNNING = "running", "Формируется"
+    DONE = "done", "Готово"
+    FAILED = "failed", "Ошибка"
+
+
+class ExportJob(models.Model):
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="export_jobs",
+        verbose_name="Запросил",
+    )
+    format = models.CharField(max_length=10, choices=ExportFormat.choices, verbose_name="Формат")
+    filters = models.JSONField(verbose_name="Фильтры")
+    filters_hash = models.CharField(max_length=64, verbose_name="Хэш фильтров")
+    data_version = models.CharField(max_length=64, verbose_name="Версия данных")
+    status = models.CharField(
+        max_length=20,
+        choices=ExportJobStatus.choices,
+        default=ExportJobStatus.PENDING,
+        verbose_name="Статус",
+    )
+    rows_total = models.PositiveIntegerField(null=True, blank=True, verbose_name="Всего строк")
+    rows_done = models.PositiveIntegerField(default=0, verbose_name="Выгружено строк")
+    file = models.FileField(upload_to="exports/", blank=True, verbose_name="Файл")
+    error = models.TextField(blank=True, verbose_name="Ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Начато")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Завершено")
+
+    class Meta:
+        verbose_name = "Задание выгрузки"
+        verbose_name_plural = "Задания выгрузки"
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["filters_hash", "format", "data_version"], name="exportjob_reuse"),
+            models.Index(fields=["status", "created_at"], name="exportjob_queue"),
+        ]
+
+    def __str__(self) -> str:
+        return f"Выгрузка #{self.id} ({self.get_format_display()}, {self.get_status_display()})"
@@ -1,9 +1,19 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import UTC, date, datetime, timedelta
+from io import BytesIO, StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
 
 from accounts.models import User, UserRole
+from core import cache
 from projects.models import Project
-from defects.models import Defect, DefectPriority, DefectStatus
+from defects.models import Defect, DefectListRow, DefectPriority, DefectStatus
+from .models import ExportJob, ExportJobStatus
 
 
 class ReportTests(TestCase):
@@ -17,6 +27,7 @@ class ReportTests(TestCase):
             description="О1",
             priority=DefectPriority.MEDIUM,
             status=DefectStatus.NEW,
+            due_date=date(2030, 1, 1),
             created_by=self.manager,
         )
 
@@ -26,9 +37,151 @@ class ReportTests(TestCase):
         self.assertEqual(resp.status_code, 200)
         self.assertIn("text/csv", resp["Content-Type"])
 
+    def test_csv_export_is_streamed_with_labels(self):
+        self.client.login(username="o", password="pass")
+        resp = self.client.get(reverse("reports:export_csv"))
+        self.assertTrue(resp.streaming)
+        with self.assertNumQueries(1):
+            content = b"".join(resp.streaming_content).decode("utf-8")
+        lines = content.strip().splitlines()
+        self.assertEqual(lines[0].split(",")[:3], ["ID", "Заголовок", "Объект"])
+        self.assertIn("Объект 1,,Новая,Средний,", lines[1])
+
+    def test_xlsx_export_has_typed_date_cells(self):
+        self.client.login(username="m", password="pass")
+        resp = self.client.get(reverse("reports:export_xlsx"))
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("attachment", resp["Content-Disposition"])
+        ws = load_workbook(BytesIO(b"".join(resp.streaming_content))).active
+        header, row = list(ws.iter_rows(values_only=True))
+        self.assertEqual(header[0], "ID")
+        self.assertEqual(row[4], "Новая")
+        self.assertEqual(row[7], datetime(2030, 1, 1))
+        self.assertIsInstance(row[8], datetime)
+
+    def test_csv_and_xlsx_write_the_same_local_time(self):
+        created = datetime(2030, 1, 1, 21, 30, tzinfo=UTC)
+        Defect.objects.update(created_at=created)
+        DefectListRow.objects.update(created_at=created)
+        self.client.login(username="m", password="pass")
+        csv_lines = b"".join(self.client.get(reverse("reports:export_csv")).streaming_content).decode().splitlines()
+        ws = load_workbook(BytesIO(b"".join(self.client.get(reverse("reports:export_xlsx")).streaming_content))).active
+        header, row = list(ws.iter_rows(values_only=True))
+        # Europe/Moscow — UTC+3.
+        self.assertEqual(header[8], "Создано (Europe/Moscow)")
+        self.assertEqual(csv_lines[0].split(",")[8], header[8])
+        self.assertEqual(row[8], datetime(2030, 1, 2, 0, 30))
+        self.assertEqual(csv_lines[1].split(",")[8], "2030-01-02 00:30")
+
+    def test_csv_export_includes_archive_by_switch(self):
+        closed = Defect.objects.create(
+            project=self.project, title="Д2", description="О2", status=DefectStatus.CLOSED, created_by=self.manager
+        )
+        Defect.objects.filter(pk=closed.pk).update(updated_at=timezone.now() - timedelta(days=400))
+        call_command("archive_defects", stdout=StringIO())
+        self.client.login(username="o", password="pass")
+        titles = lambda resp: [line.split(",")[1] for line in b"".join(resp.streaming_content).decode().splitlines()[1:]]
+        self.assertEqual(titles(self.client.get(reverse("reports:export_csv"))), ["Д1"])
+        self.assertEqual(titles(self.client.get(reverse("reports:export_csv"), {"archive": "1"})), ["Д1", "Д2"])
+
     def test_dashboard_accessible_for_manager(self):
         self.client.login(username="m", password="pass")
         resp = self.client.get(reverse("reports:dashboard"))
         self.assertEqual(resp.status_code, 200)
 
 
+class ExportJobTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.observer = User.objects.create_user(username="o", password="pass", role=UserRole.OBSERVER)
+        self.project = Project.objects.create(name="Объект 1")
+        self.defect = Defect.objects.create(
+            project=self.project, title="Д1", description="О1", created_by=self.observer
+        )
+        self.client.login(username="o", password="pass")
+
+    def _request(self, **params):
+        url = reverse("reports:export_job_create")
+        return self.client.post(url + "?status=new", data={"format": "csv", **params})
+
+    def test_job_is_built_by_worker_and_reused_until_data_changes(self):
+        resp = self._request()
+        self.assertEqual(resp.status_code, 202)
+        job = resp.json()
+        self.assertEqual(job["status"], "pending")
+
+        call_command("run_export_jobs", "--once", stdout=StringIO())
+
+        status = self.client.get(job["status_url"]).json()
+        self.assertEqual(status["status"], "done")
+        self.assertEqual(status["rows_done"], 1)
+        download = self.client.get(status["download_url"])
+        self.assertIn("Д1", b"".join(download.streaming_content).decode("utf-8"))
+
+        again = self._request()
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.json()["id"], job["id"])
+
+        self.defect.title = "Д1 (изм.)"
+        self.defect.save()
+        changed = self._request().json()["id"]
+        self.assertNotEqual(changed, job["id"])
+
+        # Переименование объекта меняет строки выгрузки, хотя дефекты не сохранялись.
+        self.project.name = "Объект 2"
+        self.project.save()
+        self.assertNotEqual(self._request().json()["id"], changed)
+
+    def test_stuck_running_job_is_not_reused(self):
+        job = ExportJob.objects.get(pk=self._request().json()["id"])
+        ExportJob.objects.filter(pk=job.pk).update(
+            status=ExportJobStatus.RUNNING, started_at=timezone.now() - timedelta(hours=2)
+        )
+        self.assertNotEqual(self._request().json()["id"], job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJobStatus.FAILED)
+
+    def test_engineer_cannot_request_export(self):
+        User.objects.create_user(username="e", password="pass", role=UserRole.ENGINEER)
+        self.client.login(username="e", password="pass")
+        self.assertEqual(self._request().status_code, 403)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username="m", password="pass", role=UserRole.MANAGER)
+        self.project = Project.objects.create(name="Объект 1")
+        self.client.login(username="m", password="pass")
+        cache.reset_stats()
+
+    def test_dashboard_is_cached_until_a_defect_changes(self):
+        url = reverse("reports:dashboard")
+        self.client.get(url)
+        with self.assertNumQueries(2):  # сессия и пользователь, счётчики — из кэша
+            self.client.get(url)
+
+        self.client.post(
+            reverse("defects:create"),
+            data={"project": self.project.id, "title": "Д", "description": "О", "priority": DefectPriority.LOW},
+        )
+        self.assertEqual(self.client.get(url).context["total"], 1)
+        self.assertEqual(cache.stats([cache.DASHBOARD_STATUS])[cache.DASHBOARD_STATUS], {"hits": 1, "misses": 2})
+
+    def test_dashboard_shows_overdue_per_project(self):
+        past = timezone.localdate() - timedelta(days=3)
+        for status in (DefectStatus.NEW, DefectStatus.IN_REVIEW, DefectStatus.CLOSED):
+            Defect.objects.create(
+                project=self.project, title="Д", description="О", status=status, due_date=past, created_by=self.manager
+            )
+        Defect.objects.create(project=self.project, title="Д", description="О", created_by=self.manager)
+        resp = self.client.get(reverse("reports:dashboard"))
+        self.assertEqual(resp.context["overdue_total"], 2)
+        self.assertEqual(
+            resp.context["overdue_by_project"], [{"project_id": self.project.id, "project_name": "Объект 1", "cnt": 2}]
+        )
@@ -8,6 +8,9 @@ urlpatterns = [
     path("dashboard/", views.dashboard, name="dashboard"),
     path("export/csv/", views.export_csv, name="export_csv"),
     path("export/xlsx/", views.export_xlsx, name="export_xlsx"),
+    path("export/jobs/", views.export_job_create, name="export_job_create"),
+    path("export/jobs/<int:job_id>/", views.export_job_status, name="export_job"),
+    path("export/jobs/<int:job_id>/download/", views.export_job_download, name="export_job_download"),
 ]
 
 
@@ -1,62 +1,68 @@
 from __future__ import annotations
 
-import csv
 from datetime import datetime
 
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count
-from django.db.models import Q
-from django.http import HttpRequest, HttpResponse
-from django.shortcuts import redirect, render
+from django.db.models import Count, Sum
+from django.http import FileResponse, Http404, HttpRequest, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.http import require_GET, require_POST
 
 from accounts.models import UserRole
-from defects.models import Defect, DefectStatus
+from core import cache
+from core.replicas import read_replica
+from defects.archive import list_sources
+from defects.filters import apply_defect_filters, read_filters
+from defects.models import DefectCounter, DefectListRow, DefectStatus, overdue_q
 from .excel import defects_to_xlsx
+from .export import csv_lines, export_rows
+from .jobs import find_or_create_job
+from .models import ExportFormat, ExportJob, ExportJobStatus
 
 
 def _is_report_viewer(request: HttpRequest) -> bool:
     return request.user.is_authenticated and request.user.role in (UserRole.MANAGER, UserRole.OBSERVER)
 
-def _filtered_defects(request: HttpRequest):
-    qs = Defect.objects.select_related("project", "stage", "assignee").order_by("-created_at")
-    status = request.GET.get("status") or ""
-    priority = request.GET.get("priority") or ""
-    project_id = request.GET.get("project") or ""
-    q = request.GET.get("q") or ""
-    if status:
-        qs = qs.filter(status=status)
-    if priority:
-        qs = qs.filter(priority=priority)
-    if project_id.isdigit():
-        qs = qs.filter(project_id=int(project_id))
-    if q:
-        qs = qs.filter(Q(title__icontains=q) | Q(description__icontains=q))
-    sort = request.GET.get("sort") or "-created_at"
-    allowed_sorts = {
-        "-created_at": "-created_at",
-        "created_at": "created_at",
-        "due_date": "due_date",
-        "-due_date": "-due_date",
-        "priority": "priority",
-        "-priority": "-priority",
-        "status": "status",
-        "-status": "-status",
-    }
-    qs = qs.order_by(allowed_sorts.get(sort, "-created_at"))
-    return qs
+def _filtered_defects(request: HttpRequest) -> list:
+    filters = read_filters(request.GET)
+    return list_sources(apply_defect_filters(DefectListRow.objects.all(), filters), filters)
+
+
+def _status_counts() -> dict[str, int]:
+    # Счётчики ведутся при изменении дефектов — здесь читаем несколько строк, а не всю таблицу.
+    by_status = DefectCounter.objects.values("status").annotate(cnt=Sum("count")).order_by("status")
+    status_map = {k: 0 for k, _ in DefectStatus.choices}
+    for row in by_status:
+        status_map[row["status"]] = row["cnt"]
+    return status_map
+
+
+def _overdue_by_project() -> list[dict]:
+    # Выборка по индексу (status, due_date); название объекта уже лежит в строке списка.
+    return list(
+        DefectListRow.objects.filter(overdue_q())
+        .values("project_id", "project_name")
+        .annotate(cnt=Count("pk"))
+        .order_by("-cnt", "project_name")
+    )
 
 
 @login_required
+@read_replica
 def dashboard(request: HttpRequest) -> HttpResponse:
     if not _is_report_viewer(request):
         return redirect("defects:list")
 
-    by_status = list(
-        Defect.objects.values("status").annotate(cnt=Count("id")).order_by("status")
+    status_map = cache.get_or_build(cache.DASHBOARD_STATUS, [cache.DEFECTS], _status_counts)
+    # Просрочка меняется со сменой даты, а не только при изменении данных.
+    overdue = cache.get_or_build(
+        cache.DASHBOARD_OVERDUE,
+        [cache.DEFECTS, cache.PROJECTS],
+        _overdue_by_project,
+        variant=timezone.localdate().isoformat(),
     )
-    status_map = {k: 0 for k, _ in DefectStatus.choices}
-    for row in by_status:
-        status_map[row["status"]] = row["cnt"]
 
     return render(
         request,
@@ -64,44 +70,81 @@ def dashboard(request: HttpRequest) -> HttpResponse:
         {
             "status_labels": [label for _, label in DefectStatus.choices],
             "status_values": [status_map[k] for k, _ in DefectStatus.choices],
-            "total": Defect.objects.count(),
+            "total": sum(status_map.values()),
+            "overdue_by_project": overdue,
+            "overdue_total": sum(row["cnt"] for row in overdue),
         },
     )
 
 
 @login_required
+@read_replica
 def export_csv(request: HttpRequest) -> HttpResponse:
     if not _is_report_viewer(request):
         return redirect("defects:list")
 
-    qs = _filtered_defects(request)
-    response = HttpResponse(content_type="text/csv; charset=utf-8")
+    sources = _filtered_defects(request)
+    response = StreamingHttpResponse(csv_lines(export_rows(*sources)), content_type="text/csv; charset=utf-8")
     response["Content-Disposition"] = f'attachment; filename="defects_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow(["ID", "Заголовок", "Объект", "Этап", "Статус", "Приоритет", "Исполнитель", "Срок", "Создано"])
-    for d in qs:
-        writer.writerow(
-            [
-                d.id,
-                d.title,
-                d.project.name,
-                d.stage.name if d.stage else "",
-                d.get_status_display(),
-                d.get_priority_display(),
-                d.assignee.username if d.assignee else "",
-                d.due_date.isoformat() if d.due_date else "",
-                d.created_at.strftime("%Y-%m-%d %H:%M"),
-            ]
-        )
     return response
 
 
 @login_required
+@read_replica
 def export_xlsx(request: HttpRequest) -> HttpResponse:
     if not _is_report_viewer(request):
         return redirect("defects:list")
-    qs = _filtered_defects(request)
-    return defects_to_xlsx(qs)
+    return defects_to_xlsx(*_filtered_defects(request))
+
+
 
 
+def _job_payload(job: ExportJob) -> dict:
+    payload = {
+        "id": job.id,
+        "format": job.format,
+        "status": job.status,
+        "status_label": job.get_status_display(),
+        "rows_done": job.rows_done,
+        "rows_total": job.rows_total,
+        "status_url": reverse("reports:export_job", args=[job.id]),
+        "download_url": None,
+        "error": job.error,
+    }
+    if job.status == ExportJobStatus.DONE:
+        payload["download_url"] = reverse("reports:export_job_download", args=[job.id])
+    return payload
+
+
+@login_required
+@require_POST
+def export_job_create(request: HttpRequest) -> HttpResponse:
+    if not _is_report_viewer(request):
+        return JsonResponse({"error": "Недостаточно прав для выгрузки."}, status=403)
+    fmt = request.POST.get("format") or ExportFormat.CSV
+    if fmt not in ExportFormat.values:
+        return JsonResponse({"error": "Неизвестный формат."}, status=400)
+    job = find_or_create_job(user=request.user, fmt=fmt, filters=read_filters(request.GET))
+    return JsonResponse(_job_payload(job), status=202 if job.status != ExportJobStatus.DONE else 200)
+
+
+@login_required
+@require_GET
+def export_job_status(request: HttpRequest, job_id: int) -> HttpResponse:
+    if not _is_report_viewer(request):
+        return JsonResponse({"error": "Недостаточно прав для выгрузки."}, status=403)
+    job = get_object_or_404(ExportJob, id=job_id)
+    return JsonResponse(_job_payload(job))
+
+
+@login_required
+@require_GET
+def export_job_download(request: HttpRequest, job_id: int) -> HttpResponse:
+    if not _is_report_viewer(request):
+        return redirect("defects:list")
+    job = get_object_or_404(ExportJob, id=job_id, status=ExportJobStatus.DONE)
+    try:
+        fh = job.file.open("rb")
+    except FileNotFoundError:
+        raise Http404("Файл выгрузки удалён.")
+    return FileResponse(fh, as_attachment=True, filename=job.file.name.rsplit("/", 1)[-1])
@@ -6,13 +6,13 @@ $Coverage = Join-Path $ProjectRoot ".venv\Scripts\coverage.exe"
 
 Set-Location $ProjectRoot
 
-& $Python -m pip install -r requirements.txt
+& $Python -m pip install -r requirements-dev.txt
 
 Write-Host "== Django tests ==" -ForegroundColor Cyan
 & $Python manage.py test
 
 Write-Host "== Coverage ==" -ForegroundColor Cyan
-& $Coverage run -m django test --settings=sistemakontrolya.settings
+& $Coverage run -m django test --settings=sistemakontrolya.test_settings
 & $Coverage report -m
 & $Coverage html
 Write-Host "HTML coverage report: htmlcov\\index.html" -ForegroundColor Green
@@ -0,0 +1,31 @@
+param(
+  # Пусто — тесты идут на временном PostgreSQL из пакета pgserver (без установки сервера).
+  [string]$DatabaseUrl = $env:DATABASE_URL
+)
+
+$ErrorActionPreference = "Stop"
+
+$ProjectRoot = Split-Path -Parent $PSScriptRoot
+$Python = Join-Path $ProjectRoot ".venv\Scripts\python.exe"
+
+Set-Location $ProjectRoot
+
+if ($DatabaseUrl) {
+  Write-Host "== Django tests on $DatabaseUrl ==" -ForegroundColor Cyan
+  $env:DATABASE_URL = $DatabaseUrl
+  & $Python manage.py test --noinput
+  exit $LASTEXITCODE
+}
+
+Write-Host "== Django tests on a temporary PostgreSQL (pgserver) ==" -ForegroundColor Cyan
+$Code = @"
+import os, subprocess, sys, tempfile
+import pgserver
+
+with tempfile.TemporaryDirectory() as pgdata:
+    with pgserver.get_server(pgdata, cleanup_mode='delete') as server:
+        env = dict(os.environ, DATABASE_URL=server.get_uri())
+        sys.exit(subprocess.call([sys.executable, 'manage.py', 'test', '--noinput'], env=env))
+"@
+& $Python -c $Code
+exit $LASTEXITCODE
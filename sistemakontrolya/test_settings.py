@@ -0,0 +1,12 @@
+"""Настройки тестов: ``manage.py test`` берёт их сам, другим запускам — ``--settings`` или
+``DJANGO_SETTINGS_MODULE=sistemakontrolya.test_settings`` (для pytest — в pytest.ini)."""
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES
+
+# Тесты не должны видеть кэш разработческого сервера (и засорять его).
+CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+# Реплика в тестах — зеркало тестовой БД; чтение с неё включают только тесты маршрутизации.
+DATABASES["replica"] = {**DATABASES.get("replica", DATABASES["default"]), "TEST": {"MIRROR": "default"}}
+REPLICA_READS = False